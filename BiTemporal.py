@@ -1,24 +1,37 @@
-﻿from turtle import title
-import pyodbc
+﻿import numpy as np
 import pandas as pd
 import matplotlib
-matplotlib.use("TkAgg")  # ensure TkAgg backend for Tkinter embedding
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from matplotlib.patches import Rectangle
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+import matplotlib.colors as mcolors
+from matplotlib.collections import PolyCollection
+from matplotlib.image import AxesImage
+from matplotlib.patches import Patch
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import tkinter as tk
-from tkinter import ttk, messagebox
-from sqlalchemy import create_engine, text
+from tkinter import ttk, messagebox, simpledialog
 from enum import Enum
 import json
-from datetime import datetime
-from sqlalchemy.orm import keyfunc_mapping
+from datetime import datetime, timezone
 import os
+import hashlib
+import shutil
+import sqlite3
+import time
+import uuid
+import threading
+import re
+import weakref
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from PIL import Image, ImageTk
 
 APP_TITLE = "Bi-Temporal Example"
+DEPT_ID = 10  # Department shown by the app
+POLL_MS = 20  # How often the UI checks on background loads
+DEBOUNCE_MS = 250  # Change notifications closer together than this make one refresh
 
 class DbProduct(Enum): 
     SQLSERVER = "SqlServer"
@@ -38,12 +51,19 @@ if DB_PRODUCT == DbProduct.POSTGRESQL.value:
 else: # Defaults to 'SqlServer'
     CONNECTION_STRING = f"mssql+pyodbc://{host}/{db_name}?driver={driver}&trusted_connection=yes"
 
+# Local columnar cache of fetched frames, used to draw immediately on launch
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots"))
+
+# Hot-path timings are also written here, one JSON object per line, when set
+METRICS_FILE = os.getenv("METRICS_FILE")
+STATS_MS = 1000  # How often the stats panel refreshes
+
 DEPT_COLUMNS = ["dept_hist_id","dept_id","dept_name","location","valid_from","valid_to","tran_from","tran_to"]
 EMP_COLUMNS = ["emp_hist_id","emp_id","dept_id", "first_name","last_name","job_title","hire_date","term_date","valid_from","valid_to","tran_from","tran_to"]
 
-class SqlCommands(Enum):    
-    RESET = "CALL dbo.reset_data()" if DB_PRODUCT == DbProduct.POSTGRESQL.value else "EXEC dbo.reset_data"
-    FETCH_DEPT = """
+# History selects shared by the fixed app queries and the multi-key fetch API; the
+# *_history views add archived versions to the live tables
+DEPT_SELECT = """
         SELECT
             d.dept_hist_id,
             d.dept_id,
@@ -64,13 +84,14 @@ class SqlCommands(Enum):
 		        ELSE 'Historical'
 	        END record_status
         FROM 
-	        dbo.department d
+	        dbo.department_history d
         WHERE 
-	        d.dept_id = 10
+	        {filter}
         ORDER BY 
 	        d.dept_hist_id
         """
-    FETCH_EMP = """
+
+EMP_SELECT = """
         SELECT
             e.emp_hist_id,
             e.emp_id,
@@ -95,12 +116,97 @@ class SqlCommands(Enum):
 		        ELSE 'Historical'
 	        END record_status
         FROM 
-	        dbo.employee e
+	        dbo.employee_history e
+        WHERE 
+	        {filter}
+        ORDER BY 
+	        e.emp_hist_id
+        """
+
+# Joined department/employee snapshot through the server-side as-of functions
+AS_OF_SELECT = """
+        SELECT
+            d.dept_id,
+            d.dept_hist_id,
+            d.dept_name,
+            e.emp_hist_id,
+            e.emp_id,
+            e.first_name,
+            e.last_name,
+            e.job_title,
+            e.hire_date,
+            e.term_date
+        FROM 
+	        dbo.fn_as_of_department(:valid_date, :tran_date) d
+        LEFT JOIN
+	        dbo.fn_as_of_employee(:valid_date, :tran_date) e
+        ON 
+	        e.dept_id = d.dept_id
         WHERE 
-	        e.dept_id = 10
+	        {filter}
         ORDER BY 
+	        d.dept_hist_id,
 	        e.emp_hist_id
         """
+
+# Cheap change probe for servers without LISTEN/NOTIFY: history is append-only, so any
+# write moves the max hist_id or the row count of its table
+CHANGE_PROBE = """
+        SELECT
+            (SELECT MAX(dept_hist_id) FROM dbo.department) AS department_max_id,
+            (SELECT COUNT(*) FROM dbo.department) AS department_rows,
+            (SELECT MAX(emp_hist_id) FROM dbo.employee) AS employee_max_id,
+            (SELECT COUNT(*) FROM dbo.employee) AS employee_rows
+        """
+
+AS_OF_COLUMNS = ["tran_date", "valid_date", "dept_id", "dept_hist_id", "dept_name", "emp_hist_id", "emp_id",
+                 "first_name", "last_name", "job_title", "hire_date", "term_date"]
+
+class HistoryTable(Enum):
+    # (alias, key column, filterable columns, select template)
+    DEPARTMENT = ("d", "dept_hist_id", ("dept_id",), DEPT_SELECT)
+    EMPLOYEE = ("e", "emp_hist_id", ("emp_id", "dept_id"), EMP_SELECT)
+
+    @property
+    def alias(self):
+        return self.value[0]
+
+    @property
+    def key(self):
+        return self.value[1]
+
+    @property
+    def columns(self):
+        return self.value[2]
+
+    @property
+    def select(self):
+        return self.value[3]
+
+# Batch corrections: entity key, correctable attributes, staging table and the
+# set-based procedure that applies a staged batch
+Correction = namedtuple("Correction", ["entity", "attributes", "staging", "procedure"])
+
+CORRECTIONS = {
+    HistoryTable.DEPARTMENT: Correction("dept_id", ("dept_name", "location"),
+                                        "dbo.department_staging", "dbo.apply_department_corrections"),
+    HistoryTable.EMPLOYEE: Correction("emp_id", ("first_name", "last_name", "job_title", "hire_date", "term_date"),
+                                      "dbo.employee_staging", "dbo.apply_employee_corrections"),
+}
+
+# Offline compaction: live history table, its archive and the stored columns
+Archive = namedtuple("Archive", ["table", "archive", "columns"])
+
+ARCHIVES = {
+    HistoryTable.DEPARTMENT: Archive("dbo.department", "dbo.department_archive", DEPT_COLUMNS),
+    HistoryTable.EMPLOYEE: Archive("dbo.employee", "dbo.employee_archive", EMP_COLUMNS),
+}
+
+class SqlCommands(Enum):    
+    RESET = "CALL dbo.reset_data()" if DB_PRODUCT == DbProduct.POSTGRESQL.value else "EXEC dbo.reset_data"
+    FETCH_DEPT = DEPT_SELECT.format(filter="d.dept_id = :dept_id")
+    FETCH_EMP = EMP_SELECT.format(filter="e.dept_id = :dept_id")
+    DEPT_IDS = "SELECT DISTINCT dept_id FROM dbo.department ORDER BY dept_id"
     UPDATE1 = """
         UPDATE	
             dbo.department
@@ -129,22 +235,1559 @@ class SqlCommands(Enum):
 	        emp_id = 100
     """
 
+# High-water mark of a cached history frame: largest *_hist_id, latest known
+# tran_from/tran_to instant (any later closure must be after it) and row count
+Watermark = namedtuple("Watermark", ["max_id", "max_tran", "row_count"])
+
+def strip_order_by(sql):
+    """Split a trailing ORDER BY off a query so it can be wrapped as a derived table"""
+    match = re.search(r"\border\s+by\s+[^()]*$", sql, flags=re.IGNORECASE)
+    if match is None:
+        return sql, ""
+    return sql[:match.start()], sql[match.start():]
+
+# --- Instrumentation ---
+class Metrics:
+    """Timers and counters around the hot paths, cheap enough to leave on.
+
+    Each name aggregates calls, total/max/last time and any rows or bytes reported with it.
+    With a log open, every timing is also written as a JSON line with its other fields, so a
+    session can be profiled afterwards. Safe to use from the loader threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # name -> [calls, total_ns, max_ns, last_ns, rows, bytes]
+        self._log = None
+        self._engines = weakref.WeakSet()
+        self.started = time.monotonic()
+
+    def record(self, name, elapsed_ns=0, **fields):
+        with self._lock:
+            stat = self._stats.get(name)
+            if stat is None:
+                stat = self._stats[name] = [0, 0, 0, 0, 0, 0]
+            stat[0] += 1
+            stat[1] += elapsed_ns
+            stat[2] = max(stat[2], elapsed_ns)
+            stat[3] = elapsed_ns
+            stat[4] += fields.get("rows", 0)
+            stat[5] += fields.get("bytes", 0)
+            if self._log is not None:
+                self._log.write(json.dumps({"ts": time.time(), "name": name, "ms": elapsed_ns / 1e6, **fields},
+                                           default=str) + "\n")
+
+    def count(self, name):
+        self.record(name)
+
+    @contextmanager
+    def timer(self, name, **fields):
+        """Time the block; rows, bytes or other fields can be added to the yielded dict"""
+        started = time.perf_counter_ns()
+        try:
+            yield fields
+        except Exception as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, time.perf_counter_ns() - started, **fields)
+
+    def timed(self, name):
+        """Decorator timing every call of a function under name"""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter_ns()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter_ns() - started)
+            return wrapper
+        return decorate
+
+    def watch_engine(self, engine):
+        """Time every statement the engine runs, via SQLAlchemy's cursor execute events"""
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("metrics_started", []).append(time.perf_counter_ns())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["metrics_started"].pop()
+            self.record("db.statement", time.perf_counter_ns() - started, rows=max(cursor.rowcount, 0),
+                        statement=" ".join(statement.split())[:200], executemany=executemany)
+
+        @event.listens_for(engine, "handle_error")
+        def error(context):
+            stack = context.connection.info.get("metrics_started") if context.connection is not None else None
+            if stack:
+                stack.pop()
+
+    def snapshot(self):
+        """Return one dict per name: calls, total/mean/max/last milliseconds, rows and bytes"""
+        with self._lock:
+            stats = {name: list(stat) for name, stat in self._stats.items()}
+        return [{"name": name, "calls": calls, "total_ms": total / 1e6, "mean_ms": total / calls / 1e6,
+                 "max_ms": longest / 1e6, "last_ms": last / 1e6, "rows": rows, "bytes": size}
+                for name, (calls, total, longest, last, rows, size) in sorted(stats.items())]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started = time.monotonic()
+
+    def open_log(self, path):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            self._log = open(path, "a", encoding="utf-8", buffering=1)  # line buffered: whole records on disk
+
+    def close_log(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+METRICS = Metrics()
+if METRICS_FILE:
+    METRICS.open_log(METRICS_FILE)
+
+class SnapshotStore:
+    """On-disk columnar cache of fetched frames, one directory per (connection, query, params).
+
+    Every column is a .npy file that is memory-mapped on load: numbers as-is,
+    datetimes as int64 nanoseconds, the ingest schema's categoricals as codes and
+    other strings as fixed-width text, so a loaded frame has the dtypes ingest gives. meta.json
+    names the current generation directory and holds the frame's Watermark, so
+    a rewrite never touches files another reader may still have mapped.
+    """
+    def __init__(self, directory, target):
+        self.directory = directory
+        self.target = target
+
+    def path_for(self, cache_key):
+        digest = hashlib.sha1(repr((self.target, cache_key)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:16])
+
+    def save(self, cache_key, df, mark):
+        path = self.path_for(cache_key)
+        generation = f"g{time.time_ns()}"
+        os.makedirs(os.path.join(path, generation))
+
+        columns = []
+        for i, name in enumerate(df.columns):
+            col = df[name]
+            entry = {"name": name}
+            if pd.api.types.is_datetime64_any_dtype(col):
+                entry["kind"] = "datetime"
+                entry["tz"] = str(col.dt.tz) if col.dt.tz is not None else None
+                naive = col.dt.tz_convert("UTC").dt.tz_localize(None) if col.dt.tz is not None else col
+                values = naive.astype("datetime64[ns]").to_numpy().view(np.int64)
+            elif name in CATEGORY_COLUMNS:
+                entry["kind"] = "category"
+                cat = col if isinstance(col.dtype, pd.CategoricalDtype) else col.astype("category")
+                entry["categories"] = cat.cat.categories.tolist()
+                values = cat.cat.codes.to_numpy()
+            elif not (pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col)):
+                entry["kind"] = "string"
+                entry["dtype"] = str(col.dtype)
+                nulls = col.isna().to_numpy()
+                if nulls.any():
+                    entry["nulls"] = True
+                    np.save(os.path.join(path, generation, f"{i}_nulls.npy"), nulls, allow_pickle=False)
+                values = np.array(col.astype(object).where(~nulls, "").tolist(), dtype=str)
+            else:
+                entry["kind"] = "array"
+                values = col.to_numpy()
+            np.save(os.path.join(path, generation, f"{i}.npy"), values, allow_pickle=False)
+            columns.append(entry)
+
+        max_tran = mark.max_tran.isoformat() if isinstance(mark.max_tran, datetime) else mark.max_tran
+        meta = {
+            "generation": generation,
+            "columns": columns,
+            "watermark": {"max_id": mark.max_id, "max_tran": max_tran,
+                          "max_tran_is_datetime": isinstance(mark.max_tran, datetime), "row_count": mark.row_count},
+        }
+        with open(os.path.join(path, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+
+        # Older generations are removed when nothing holds them open
+        for entry in os.listdir(path):
+            if entry.startswith("g") and entry != generation:
+                shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+    def load(self, cache_key):
+        """Return (frame, Watermark) for cache_key, or None when there is no usable snapshot"""
+        path = self.path_for(cache_key)
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+
+            data = {}
+            for i, entry in enumerate(meta["columns"]):
+                values = np.load(os.path.join(path, meta["generation"], f"{i}.npy"), mmap_mode="r")
+                if entry["kind"] == "datetime":
+                    col = pd.Series(values.view("datetime64[ns]"), copy=False)
+                    if entry["tz"] is not None:
+                        col = col.dt.tz_localize("UTC").dt.tz_convert(entry["tz"])
+                elif entry["kind"] == "category":
+                    col = pd.Series(pd.Categorical.from_codes(values, entry["categories"]))
+                    if entry["name"] not in CATEGORY_COLUMNS:
+                        # Written when every string was a category: back to the plain strings read_sql gives
+                        col = pd.Series(col.astype(object).where(col.notna(), None).tolist())
+                elif entry["kind"] == "string":
+                    strings = values.astype(object)
+                    if entry.get("nulls"):
+                        strings[np.load(os.path.join(path, meta["generation"], f"{i}_nulls.npy"))] = None
+                    col = pd.Series(strings, dtype=entry["dtype"])
+                else:
+                    col = pd.Series(values, copy=False)
+                data[entry["name"]] = col
+        except (OSError, ValueError, KeyError):
+            return None
+
+        mark = meta["watermark"]
+        max_tran = mark["max_tran"]
+        if mark["max_tran_is_datetime"] and max_tran is not None:
+            max_tran = datetime.fromisoformat(max_tran)
+        return pd.DataFrame(data, copy=False), Watermark(mark["max_id"], max_tran, mark["row_count"])
+
+class RTreeStore:
+    """Local SQLite copy of the history tables, every version indexed as a (valid, tran) rectangle.
+
+    Each table has a row table keyed by its hist id and an integer R*Tree over the version's valid
+    and transaction intervals in whole minutes, rounded outwards. A version whose box lies inside
+    the query by a minute matches without looking further; only those at the edges are rechecked
+    against the exact nanosecond intervals in the row table. indexed=False runs the plain range
+    predicates of fn_as_of_* instead, for comparison. count=True returns the number of matching
+    versions without reading them, keys=True only their hist ids.
+    """
+    MINUTE = 60 * 10**9
+    OPEN_END = 2**31 - 1  # minutes stored for an open end (and beyond year 6053), the rtree_i32 limit
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            for table in HistoryTable:
+                name = table.name.lower()
+                columns = ARCHIVES[table].columns
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {name} ({columns[0]} INTEGER PRIMARY KEY, "
+                                   f"{', '.join(columns[1:])})")
+                # The only secondary index the server schemas have
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{name}_version "
+                                   f"ON {name} ({CORRECTIONS[table].entity}, valid_from, tran_from)")
+                self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_rtree "
+                                   f"USING rtree_i32(id, valid_min, valid_max, tran_min, tran_max)")
+
+    def load(self, table, df, replace=False):
+        """Insert or update the versions in df, an ingested history frame; replace drops the rest first"""
+        name = table.name.lower()
+        columns = ARCHIVES[table].columns
+        data = []
+        for column in columns:
+            values = df[column]
+            if column in DATE_COLUMNS:
+                values = values.dt.strftime("%Y-%m-%d")
+            data.append(values.astype(object).where(values.notna(), None).tolist())
+
+        def minutes(column, ceil):
+            ns = df[column].to_numpy()
+            rounded = -(-ns // self.MINUTE) if ceil else ns // self.MINUTE
+            return np.where(ns == INFINITY_NS, self.OPEN_END, rounded.clip(-self.OPEN_END, self.OPEN_END)).tolist()
+
+        boxes = zip(df[table.key].tolist(), minutes("valid_from", False), minutes("valid_to", True),
+                    minutes("tran_from", False), minutes("tran_to", True))
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute(f"DELETE FROM {name}")
+                self._conn.execute(f"DELETE FROM {name}_rtree")
+            self._conn.executemany(f"INSERT OR REPLACE INTO {name} VALUES ({', '.join('?' * len(columns))})",
+                                   zip(*data))
+            self._conn.executemany(f"INSERT OR REPLACE INTO {name}_rtree VALUES (?, ?, ?, ?, ?)", boxes)
+
+    def as_of(self, table, tran_ns, valid_ns, column=None, ids=None, indexed=True, count=False, keys=False):
+        """Return the versions of table in effect at (tran_ns, valid_ns), optionally where column is in ids"""
+        # from <= point < to is the window [point, point + 1ns)
+        valid_ns, tran_ns = int(valid_ns), int(tran_ns)
+        return self.window(table, (valid_ns, valid_ns + 1, tran_ns, tran_ns + 1), column, ids, indexed, count, keys)
+
+    def window(self, table, view, column=None, ids=None, indexed=True, count=False, keys=False):
+        """Return the versions of table whose rectangle meets view (valid_from, valid_to, tran_from, tran_to)"""
+        name = table.name.lower()
+        x0, x1, y0, y1 = (int(v) for v in view)
+        params = {"x0": x0, "x1": x1, "y0": y0, "y1": y1}
+        exact = "t.valid_from < :x1 AND t.valid_to > :x0 AND t.tran_from < :y1 AND t.tran_to > :y0"
+        where = []
+        if column is not None:
+            if column not in table.columns:
+                raise ValueError(f"{table.name} history cannot be filtered by {column}")
+            where.append(f"t.{column} IN (SELECT value FROM json_each(:ids))")
+            params["ids"] = json.dumps([int(i) for i in ids])
+
+        if not indexed:
+            return self._select(table, f"{name} t", [exact, *where], params, count, keys)
+
+        # Candidates: boxes meeting the view at all. Inside: boxes meeting it by a whole minute
+        # each way, which the exact intervals cannot miss
+        def edge(ns, ceil, inward):
+            if ns == INFINITY_NS:
+                return self.OPEN_END
+            rounded = -(-ns // self.MINUTE) if ceil else ns // self.MINUTE
+            return min(max(rounded + inward, -self.OPEN_END), self.OPEN_END)
+
+        params.update(cx0=edge(x0, False, 1), cx1=edge(x1, True, -1), cy0=edge(y0, False, 1), cy1=edge(y1, True, -1),
+                      sx0=edge(x0, True, 1), sx1=edge(x1, False, -1), sy0=edge(y0, True, 1), sy1=edge(y1, False, -1))
+        candidate = ("r.valid_min <= :cx1 AND r.valid_max >= :cx0 "
+                     "AND r.tran_min <= :cy1 AND r.tran_max >= :cy0")
+        inside = ("r.valid_min <= :sx1 AND r.valid_max >= :sx0 "
+                  "AND r.tran_min <= :sy1 AND r.tran_max >= :sy0")
+        if count and column is None:
+            with self._lock:
+                return self._conn.execute(
+                    f"SELECT (SELECT COUNT(*) FROM {name}_rtree r WHERE {candidate} AND {inside}) + "
+                    f"(SELECT COUNT(*) FROM {name}_rtree r CROSS JOIN {name} t ON t.{table.key} = r.id "
+                    f"WHERE {candidate} AND NOT ({inside}) AND {exact})", params).fetchone()[0]
+
+        # CROSS JOIN keeps the R*Tree as the outer loop
+        source = f"{name}_rtree r CROSS JOIN {name} t ON t.{table.key} = r.id"
+        return self._select(table, source, [candidate, f"(({inside}) OR ({exact}))", *where], params, count, keys)
+
+    def _select(self, table, source, where, params, count, keys=False):
+        with self._lock:
+            if count:
+                return self._conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(where)}",
+                                          params).fetchone()[0]
+            if keys:
+                rows = self._conn.execute(f"SELECT t.{table.key} FROM {source} WHERE {' AND '.join(where)}",
+                                          params).fetchall()
+                return np.array([row[0] for row in rows], dtype=np.int64)
+            df = pd.read_sql_query(f"SELECT t.* FROM {source} WHERE {' AND '.join(where)} ORDER BY t.{table.key}",
+                                   self._conn, params=params)
+        df["record_status"] = np.where(df["tran_to"] == INFINITY_NS, "Current", "Historical")
+        return ingest(df)
+
+    def close(self):
+        self._conn.close()
+
 class DataEngine:
-    def __init__(self, connection_string):
-        self._engine = create_engine(connection_string)
+    # Bound-key chunk sizes; SqlServer caps a statement at 2100 parameters
+    CHUNK_SIZE = 1000
 
-    def sql_execute(self, sql):
-        with self._engine.connect() as conn:
-            conn.execute(text(sql))
+    # Rows per chunk when full histories are streamed from a server-side cursor
+    STREAM_ROWS = 50_000
+
+    # Number of as-of snapshots kept, one per version region
+    AS_OF_CACHE_SIZE = 1024
+
+    # Change feed: the channel the PostgreSql triggers notify, and how often other servers are probed
+    CHANGE_CHANNEL = "bitemporal_changes"
+    WATCH_SECONDS = 2.0
+
+    def __init__(self, connection_string, snapshot_dir=None, rtree_path=None, stream=False):
+        # SQLAlchemy loads the dialect's driver on create_engine, so only the one in use is imported
+        from sqlalchemy import create_engine
+        from sqlalchemy.engine import Engine
+
+        if isinstance(connection_string, Engine):
+            self._engine = connection_string  # a pre-configured engine, e.g. the synthetic SQLite database
+        else:
+            options = {}
+            if connection_string.startswith("mssql+pyodbc"):
+                options["fast_executemany"] = True  # array-bound inserts for staged batches
+            self._engine = create_engine(connection_string, **options)
+        self._snapshots = None
+        if snapshot_dir is not None:
+            self._snapshots = SnapshotStore(snapshot_dir, self._engine.url.render_as_string(hide_password=True))
+        self._rtree = RTreeStore(rtree_path) if rtree_path is not None else None
+        self._rtree_loaded = {}  # HistoryTable -> (Watermark, frame) of the history last copied into the R*Tree store
+        self._history_checked = {}  # HistoryTable -> monotonic time its full history's watermark was last checked
+        self._stream = stream  # full reloads stream in chunks instead of one read_sql
+        self._cache = {}  # (sql, params) -> (frame, key, Watermark)
+        self._fetch_locks = {}  # (sql, params) -> lock held while that cache entry is checked and updated
+        self._fetch_locks_guard = threading.Lock()
+        self._persisted = {}  # (sql, params) -> Watermark of the snapshot on disk
+        self._statements = {}  # sql -> compiled-once text() construct
+        self._regions = {}  # entities -> (history Watermarks, VersionRegions)
+        self._as_of_cache = OrderedDict()  # (entities, history Watermarks, region) -> snapshot
+        # Unknown until the as-of functions are first tried; SQLite has no table-valued functions
+        self._server_as_of = False if self._engine.dialect.name == "sqlite" else None
+        self._memory = {}  # (sql, params) -> (key, rows, bytes as fetched, bytes after ingest)
+        self._subscribers = []
+        self._watch_lock = threading.Lock()
+        self._watcher = None
+        self._watch_stop = None
+        METRICS.watch_engine(self._engine)
+
+    def _statement(self, sql, expanding=()):
+        # text() constructs are reused so SQLAlchemy's compiled cache hits on every call
+        stmt = self._statements.get((sql, expanding))
+        if stmt is None:
+            from sqlalchemy import text, bindparam
+
+            stmt = text(sql)
+            if expanding:
+                stmt = stmt.bindparams(*(bindparam(name, expanding=True) for name in expanding))
+            self._statements[(sql, expanding)] = stmt
+        return stmt
+
+    def sql_execute(self, sql, params=None):
+        with METRICS.timer("db.execute") as fields, self._engine.connect() as conn:
+            result = conn.execute(self._statement(sql), params or {})
+            fields["rows"] = max(result.rowcount, 0)
             conn.commit() 
 
     # --- Fetch data ---
-    def sql_fetch(self, sql):
-        df = pd.read_sql(sql, self._engine)
+    def sql_fetch(self, sql, params=None):
+        with METRICS.timer("db.fetch") as fields:
+            df = pd.read_sql(self._statement(sql), self._engine, params=params)
+            fields.update(rows=len(df), bytes=int(df.memory_usage(index=False).sum()))  # shallow: no string sizing
+        return df
+
+    # --- Streaming fetch ---
+    def stream(self, sql, params=None, chunk_rows=None, stats=None):
+        """Yield the rows of sql as ingest-schema frames of up to chunk_rows rows
+
+        A server-side cursor is used where the driver has one, so neither the driver nor pandas
+        ever holds more than a chunk. stats, if given, collects the rows, chunks and bytes fetched.
+        """
+        chunk_rows = chunk_rows or self.STREAM_ROWS
+        with self._engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(
+                self._statement(sql), params or {})
+            columns = list(result.keys())
+            chunks = 0
+            for rows in result.partitions(chunk_rows):
+                raw = pd.DataFrame.from_records(rows, columns=columns)
+                del rows
+                chunks += 1
+                if stats is not None:
+                    stats["rows"] = stats.get("rows", 0) + len(raw)
+                    stats["chunks"] = chunks
+                    stats["fetched_bytes"] = stats.get("fetched_bytes", 0) + memory_bytes(raw)
+                yield ingest(raw)
+            if not chunks:
+                yield ingest(pd.DataFrame(columns=columns))
+
+    def fetch_streamed(self, sql, params=None, preallocate=True, chunk_rows=None, stats=None):
+        """Return sql's rows in the ingest schema, streamed into arrays sized by a COUNT(*) first
+
+        Peak memory is the final frame plus one chunk; without preallocate the arrays grow by doubling.
+        """
+        rows = None
+        if preallocate:
+            inner, _ = strip_order_by(sql)
+            count = pd.read_sql(self._statement(f"SELECT COUNT(*) AS row_count FROM ({inner}) q"),
+                                self._engine, params=params)
+            rows = int(count.iloc[0]["row_count"])
+        builder, = pipeline(self.stream(sql, params, chunk_rows, stats), FrameBuilder(rows))
+        return builder.frame()
+
+    # --- Multi-key fetch ---
+    def fetch_entities(self, table, column, ids, chunk_size=None):
+        """Return the history of every row in table whose column is in ids, in batched round trips"""
+        if column not in table.columns:
+            raise ValueError(f"{table.name} history cannot be filtered by {column}")
+
+        ids = sorted({int(i) for i in ids})
+        if not ids:
+            return ingest(self.sql_fetch(table.select.format(filter="1 = 0")))
+
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        postgres = self._engine.dialect.name == "postgresql"
+        if postgres:
+            # One array parameter: a single statement shape whatever the key count
+            stmt = self._statement(table.select.format(filter=f"{table.alias}.{column} = ANY(:ids)"))
+        else:
+            stmt = self._statement(table.select.format(filter=f"{table.alias}.{column} IN :ids"), ("ids",))
+
+        frames = []
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            if not postgres:
+                # Pad to a power of two so the server only ever sees a few IN-list shapes
+                size = min(chunk_size, 1 << (len(chunk) - 1).bit_length())
+                chunk = chunk + [chunk[-1]] * (size - len(chunk))
+            frames.append(pd.read_sql(stmt, self._engine, params={"ids": chunk}))
+
+        if len(frames) == 1:
+            return ingest(frames[0])
+        return ingest(pd.concat(frames, ignore_index=True).sort_values(table.key, kind="stable", ignore_index=True))
+
+    # --- Batch corrections ---
+    def apply_corrections(self, table, changes):
+        """Apply a frame of (key, attributes, valid_from) corrections set-based in one transaction
+
+        Attributes left out or null keep their current value. Returns per-row outcomes and throughput stats.
+        """
+        spec = CORRECTIONS[table]
+        if spec.entity not in changes.columns or "valid_from" not in changes.columns:
+            raise ValueError(f"{table.name} corrections need {spec.entity} and valid_from columns")
+
+        columns = [spec.entity] + [c for c in spec.attributes if c in changes.columns] + ["valid_from"]
+        staged = changes[columns].reset_index(drop=True)
+        staged["valid_from"] = pd.to_datetime(staged["valid_from"])
+        staged = staged.astype(object).where(staged.notna(), None)
+        batch_id = str(uuid.uuid4())
+        rows = [
+            {name: value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for name, value in row.items()}
+            | {"batch_id": batch_id, "row_no": i}
+            for i, row in enumerate(staged.to_dict("records"))
+        ]
+
+        names = ["batch_id", "row_no"] + columns
+        insert = (f"INSERT INTO {spec.staging} ({', '.join(names)}) "
+                  f"VALUES ({', '.join(':' + n for n in names)})")
+        if self._engine.dialect.name == "postgresql":
+            apply = f"CALL {spec.procedure}(:batch_id)"
+        else:
+            apply = f"EXEC {spec.procedure} :batch_id"
+        outcome_sql = (f"SELECT row_no, outcome, affect_hist_id FROM {spec.staging} "
+                       f"WHERE batch_id = :batch_id ORDER BY row_no")
+        cleanup = f"DELETE FROM {spec.staging} WHERE batch_id = :batch_id"
+
+        started = time.perf_counter()
+        with self._engine.begin() as conn:
+            if rows:
+                conn.execute(self._statement(insert), rows)
+            loaded = time.perf_counter()
+            conn.execute(self._statement(apply), {"batch_id": batch_id})
+            result = conn.execute(self._statement(outcome_sql), {"batch_id": batch_id})
+            outcomes = pd.DataFrame(result.fetchall(), columns=["row_no", "outcome", "affect_hist_id"])
+            conn.execute(self._statement(cleanup), {"batch_id": batch_id})
+        finished = time.perf_counter()
+
+        if (outcomes["outcome"] == "applied").any():
+            self._history_changed()
+
+        outcomes = changes.reset_index(drop=True).join(outcomes.set_index("row_no"))
+        applied = int((outcomes["outcome"] == "applied").sum())
+        elapsed = finished - started
+        stats = {
+            "batch_id": batch_id,
+            "rows": len(rows),
+            "applied": applied,
+            "rejected": len(rows) - applied,
+            "load_seconds": loaded - started,
+            "apply_seconds": finished - loaded,
+            "rows_per_second": len(rows) / elapsed if elapsed else 0.0,
+        }
+        return outcomes, stats
+
+    # --- Offline compaction ---
+    def compact_history(self, table, before):
+        """Coalesce the versions recorded before `before` and move the closed ones to the archive table
+
+        Works in one transaction with writers to the live table blocked. The entities' archived
+        versions are coalesced again with them, so repeated runs keep merging; current versions stay
+        in the live table, keeping their key unless they were merged. As-of answers are unchanged.
+        Returns coalesce stats for the versions rewritten, plus how many were archived and timings.
+        """
+        spec = ARCHIVES[table]
+        key = table.key
+        entity = CORRECTIONS[table].entity
+        dialect = self._engine.dialect.name
+
+        before = pd.Timestamp(before)
+        if before.tzinfo is not None:
+            before = before.tz_convert("UTC").tz_localize(None)
+        cutoff = before.to_pydatetime()
+        params = {"before": cutoff.replace(tzinfo=timezone.utc) if dialect == "postgresql" else cutoff}
+
+        columns = ", ".join(
+            f"CASE WHEN {c} = dbo.fn_infinity() THEN NULL ELSE {c} END AS {c}" if c in ("valid_to", "tran_to") else c
+            for c in spec.columns
+        )
+        recorded = "tran_from < :before"
+        entities = f"{entity} IN (SELECT {entity} FROM {spec.table} WHERE {recorded})"
+        values = ", ".join(f"COALESCE(:{c}, dbo.fn_infinity())" if c in ("valid_to", "tran_to") else f":{c}"
+                           for c in spec.columns)
+        names = ", ".join(spec.columns)
+        archive_insert = f"INSERT INTO {spec.archive} ({names}) VALUES ({values})"
+        live_insert = f"INSERT INTO {spec.table} ({names}) VALUES ({values})"
+        if dialect == "postgresql":
+            lock = f"LOCK TABLE {spec.table} IN SHARE ROW EXCLUSIVE MODE"
+            live_insert = f"INSERT INTO {spec.table} ({names}) OVERRIDING SYSTEM VALUE VALUES ({values})"
+        elif dialect == "mssql":
+            lock = f"SELECT COUNT(*) FROM {spec.table} WITH (TABLOCK, UPDLOCK, HOLDLOCK)"
+        else:
+            lock = None
+
+        def records(frame):
+            rows = frame[spec.columns].copy()
+            for name in INTERVAL_COLUMNS:
+                rows[name] = from_naive_ns(rows[name].to_numpy())
+            rows = rows.astype(object).where(rows.notna(), None)
+            return [{name: bind(name, value) for name, value in row.items()} for row in rows.to_dict("records")]
+
+        def bind(name, value):
+            if isinstance(value, pd.Timestamp):
+                if name in DATE_COLUMNS:
+                    return value.date()
+                value = value.to_pydatetime()
+                return value.replace(tzinfo=timezone.utc) if dialect == "postgresql" else value
+            return value
+
+        def delete(conn, source, keys):
+            stmt = self._statement(f"DELETE FROM {source} WHERE {key} IN :keys", ("keys",))
+            for start in range(0, len(keys), self.CHUNK_SIZE):
+                conn.execute(stmt, {"keys": keys[start:start + self.CHUNK_SIZE]})
+
+        started = time.perf_counter()
+        with self._engine.begin() as conn:
+            if lock:
+                conn.execute(self._statement(lock))
+            live = ingest(pd.read_sql(self._statement(f"SELECT {columns} FROM {spec.table} WHERE {recorded}"), conn,
+                                      params=params))
+            archived = ingest(pd.read_sql(self._statement(f"SELECT {columns} FROM {spec.archive} WHERE {entities}"),
+                                          conn, params=params))
+            merged, stats = coalesce(pd.concat([archived, live], ignore_index=True), key)
+
+            # Versions that came through unmerged and belong where they are stay untouched
+            same = [key, *INTERVAL_COLUMNS]
+            current = merged[merged["tran_to"] == INFINITY_NS]
+            closed = merged[merged["tran_to"] != INFINITY_NS]
+            kept_live = current.merge(live[same], on=same)[key]
+            kept_archived = closed.merge(archived[same], on=same)[key]
+            current = current[~current[key].isin(kept_live)]
+            closed = closed[~closed[key].isin(kept_archived)]
+
+            delete(conn, spec.archive, archived.loc[~archived[key].isin(kept_archived), key].astype(int).tolist())
+            delete(conn, spec.table, live.loc[~live[key].isin(kept_live), key].astype(int).tolist())
+            if len(closed):
+                conn.execute(self._statement(archive_insert), records(closed))
+            if len(current):
+                # Merged current versions keep their lowest key
+                if dialect == "mssql":
+                    conn.execute(self._statement(f"SET IDENTITY_INSERT {spec.table} ON"))
+                conn.execute(self._statement(live_insert), records(current))
+                if dialect == "mssql":
+                    conn.execute(self._statement(f"SET IDENTITY_INSERT {spec.table} OFF"))
+            if dialect == "postgresql":
+                payload = json.dumps({"table": table.name.lower(), "dept_id": None})
+                conn.execute(self._statement("SELECT pg_notify(:channel, :payload)"),
+                             {"channel": self.CHANGE_CHANNEL, "payload": payload})
+        finished = time.perf_counter()
+
+        if stats["rows"]:
+            self.invalidate()  # history was rewritten, not appended to
+        stats.update({
+            "archived": len(closed) + len(kept_archived),
+            "previously_archived": len(archived),
+            "seconds": finished - started,
+        })
+        return stats
+
+    # --- Incremental fetch of append-only history ---
+    def fetch_history(self, sql, key, params=None):
+        """Return the full history for sql, only fetching rows inserted or closed since the last call"""
+        params = dict(params or {})
+        cache_key = (sql, tuple(sorted(params.items())))
+        # Loader threads may refresh the same history at once; the second one then sees the first's watermark
+        with self._fetch_lock(cache_key):
+            return self._fetch_history(cache_key, sql, key, params)
+
+    def _fetch_lock(self, cache_key):
+        with self._fetch_locks_guard:
+            return self._fetch_locks.setdefault(cache_key, threading.Lock())
+
+    def _fetch_history(self, cache_key, sql, key, params):
+        cached = self._cache.get(cache_key)
+        if cached is None or cached[1] != key:
+            return self._reload(cache_key, key, params)
+
+        df, _, mark = cached
+        inner, _ = strip_order_by(sql)
+
+        # Cheap probe: a lower max id or fewer rows means the identity was reseeded
+        probe = pd.read_sql(
+            self._statement(f"SELECT MAX(q.{key}) AS max_id, COUNT(*) AS row_count FROM ({inner}) q"),
+            self._engine,
+            params=params,
+        )
+        max_id, row_count = probe.iloc[0]["max_id"], int(probe.iloc[0]["row_count"])
+        if row_count == 0 or pd.isna(max_id) or int(max_id) < mark.max_id or row_count < mark.row_count:
+            return self._reload(cache_key, key, params)
+
+        if int(max_id) == mark.max_id and row_count == mark.row_count and mark.max_tran is None:
+            return df
+
+        # New versions have a higher id; closed versions have tran_to at or after the watermark
+        where = f"q.{key} > :max_id"
+        delta_params = dict(params, max_id=mark.max_id)
+        if mark.max_tran is not None:
+            where += " OR q.tran_to >= :max_tran"
+            max_tran = mark.max_tran
+            if self._engine.dialect.name == "postgresql" and max_tran.tzinfo is None:
+                max_tran = max_tran.replace(tzinfo=timezone.utc)  # TIMESTAMPTZ; the watermark is UTC
+            delta_params["max_tran"] = max_tran
+        delta = ingest(pd.read_sql(self._statement(f"SELECT q.* FROM ({inner}) q WHERE {where}"), self._engine,
+                                   params=delta_params))
+
+        # The version closed at the watermark instant always matches; rows the cache already holds are not news
+        cached_rows = pd.MultiIndex.from_arrays([df[key].to_numpy(), df["tran_to"].to_numpy()])
+        delta = delta[~pd.MultiIndex.from_arrays([delta[key].to_numpy(), delta["tran_to"].to_numpy()]).isin(cached_rows)]
+        if len(delta) == 0 and len(df) == row_count:
+            return df
+
+        if len(delta):
+            # Re-ingest the merged frame so categoricals take the union of both sides' categories
+            df = pd.concat([df[~df[key].isin(delta[key])], delta], ignore_index=True)
+            df = ingest(df.sort_values(key, kind="stable", ignore_index=True))
+
+        # Anything we cannot reconcile falls back to a full load
+        if len(df) != row_count:
+            return self._reload(cache_key, key, params)
+
+        # Only new or changed rows get here, so regions and as-of answers are now stale
+        self._history_changed()
+        self._cache[cache_key] = (df, key, self._watermark(df, key))
+        self._save_snapshot(cache_key)
         return df
 
+    # --- On-disk snapshots ---
+    def load_snapshot(self, sql, key, params=None):
+        """Return the last persisted history for sql without touching the database, or None.
+
+        The snapshot seeds the incremental cache, so the next fetch_history only
+        validates it against the server watermark and fetches the delta.
+        """
+        if self._snapshots is None:
+            return None
+        cache_key = (sql, tuple(sorted(dict(params or {}).items())))
+        with self._fetch_lock(cache_key):
+            loaded = self._snapshots.load(cache_key)
+            if loaded is None:
+                return None
+            df, mark = loaded
+            df = ingest(df)  # no-op for current snapshots, converts ones written before the ingest schema
+            self._cache[cache_key] = (df, key, mark)
+            self._persisted[cache_key] = mark
+            return df
+
+    def _save_snapshot(self, cache_key):
+        if self._snapshots is None:
+            return
+        df, _, mark = self._cache[cache_key]
+        if self._persisted.get(cache_key) == mark:
+            return  # the snapshot on disk already holds this history
+        try:
+            self._snapshots.save(cache_key, df, mark)
+            self._persisted[cache_key] = mark
+        except OSError:
+            pass  # the cache is an accelerator only
+
+    def invalidate(self, sql=None):
+        """Drop cached history frames so the next fetch is a full reload"""
+        if sql is None:
+            self._cache.clear()
+        else:
+            for cache_key in [k for k in self._cache if k[0] == sql]:
+                del self._cache[cache_key]
+        self._history_changed()
+
+    def _history_changed(self):
+        # Version regions and the snapshots keyed by them are only valid for unchanged history
+        self._regions.clear()
+        self._as_of_cache.clear()
+
+    # --- Change notification ---
+    def subscribe(self, callback):
+        """Call callback({HistoryTable: dept_ids or None}) from a background thread when history changes
+
+        One watcher per engine serves every subscriber: LISTEN on PostgreSql, otherwise the
+        CHANGE_PROBE every WATCH_SECONDS. None means the departments affected are unknown.
+        Returns a function that unsubscribes.
+        """
+        with self._watch_lock:
+            self._subscribers.append(callback)
+            if self._watcher is None:
+                self._watch_stop = threading.Event()
+                self._watcher = threading.Thread(target=self._watch, args=(self._watch_stop,),
+                                                 name="history-watcher", daemon=True)
+                self._watcher.start()
+
+        def unsubscribe():
+            with self._watch_lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+                if not self._subscribers and self._watcher is not None:
+                    self._watch_stop.set()
+                    self._watcher = None
+        return unsubscribe
+
+    def _publish(self, changes):
+        # The next as-of or window query re-checks these tables rather than waiting out WATCH_SECONDS
+        for table in changes:
+            self._history_checked.pop(table, None)
+        with self._watch_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            # A failing subscriber is its own problem: the others still hear of the change
+            try:
+                callback(changes)
+            except Exception as e:
+                METRICS.record("watch.callback", error=type(e).__name__)
+
+    def _watch(self, stop):
+        listen = self._engine.dialect.name == "postgresql"
+        resumed = False
+        while not stop.is_set():
+            try:
+                if listen:
+                    listen = self._listen(stop, resumed)
+                    if not listen:
+                        continue  # driver without psycopg 3's notifies(timeout=); probe instead
+                else:
+                    self._poll(stop, resumed)
+            except Exception:
+                pass  # connection trouble; changes may be missed meanwhile
+            resumed = True
+            stop.wait(self.WATCH_SECONDS)
+
+    def _listen(self, stop, resumed):
+        """LISTEN until stop is set; return False, having published nothing, when the driver cannot"""
+        raw = self._engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            if not callable(getattr(conn, "notifies", None)):
+                return False  # e.g. psycopg2, whose notifies is a list
+            conn.autocommit = True
+            conn.execute(f"LISTEN {self.CHANGE_CHANNEL}")
+            while not stop.is_set():
+                try:
+                    notifies = conn.notifies(timeout=self.WATCH_SECONDS)
+                except TypeError:
+                    return False  # psycopg before 3.2: no timeout, so stop could never be seen
+                if resumed:
+                    self._publish(dict.fromkeys(HistoryTable))
+                    resumed = False
+                for notify in notifies:
+                    payload = json.loads(notify.payload)
+                    dept_id = payload.get("dept_id")
+                    self._publish({HistoryTable[payload["table"].upper()]: None if dept_id is None else {dept_id}})
+                    if stop.is_set():
+                        break
+            return True
+        finally:
+            raw.invalidate()  # a listening autocommit connection never goes back to the pool
+
+    def _poll(self, stop, resumed):
+        previous = None
+        while True:
+            with self._engine.connect() as conn:
+                row = conn.execute(self._statement(CHANGE_PROBE)).one()
+            current = {HistoryTable.DEPARTMENT: tuple(row[0:2]), HistoryTable.EMPLOYEE: tuple(row[2:4])}
+            if previous is None:
+                changed = dict.fromkeys(HistoryTable) if resumed else {}
+            else:
+                changed = {table: None for table in current if current[table] != previous[table]}
+            if changed:
+                self._publish(changed)
+            previous = current
+            if stop.wait(self.WATCH_SECONDS):
+                return
+
+    # --- As-of snapshots ---
+    def as_of(self, tran_date, valid_date, entities):
+        """Return the joined department/employee snapshot for dept_ids entities at (tran_date, valid_date)"""
+        entities = tuple(sorted({int(e) for e in entities}))
+        tran_ns = point_to_ns(tran_date)
+        valid_ns = point_to_ns(valid_date)
+
+        # Regions are cut from the cached full histories and only hold for the watermarks they were cut at
+        (dept, dept_mark), (emp, emp_mark) = self.history(HistoryTable.DEPARTMENT), self.history(HistoryTable.EMPLOYEE)
+        marks = (dept_mark, emp_mark)
+        cached = self._regions.get(entities)
+        if cached is None or cached[0] != marks:
+            regions = VersionRegions(
+                dept[dept["dept_id"].isin(entities)].reset_index(drop=True),
+                emp[emp["dept_id"].isin(entities)].reset_index(drop=True),
+            )
+            self._regions[entities] = (marks, regions)
+        else:
+            regions = cached[1]
+
+        # Every point of a region has the same answer, so nearby probes share one entry
+        cache_key = (entities, marks, regions.locate(tran_ns, valid_ns))
+        snapshot = self._as_of_cache.get(cache_key)
+        if snapshot is not None:
+            self._as_of_cache.move_to_end(cache_key)
+        else:
+            snapshot = None
+            if self._rtree is not None:
+                # The index finds the versions; their rows are already in the frames the regions hold
+                self.sync_rtree()
+                snapshot = as_of_join(*(
+                    df[df[table.key].isin(self._rtree.as_of(table, tran_ns, valid_ns, "dept_id", entities, keys=True))]
+                    for table, df in ((HistoryTable.DEPARTMENT, regions.dept_df), (HistoryTable.EMPLOYEE, regions.emp_df))
+                ))
+            elif self._server_as_of is not False:
+                snapshot = self._as_of_server(tran_ns, valid_ns, entities)
+            if snapshot is None:
+                snapshot = regions.evaluate(tran_ns, valid_ns)
+
+            self._as_of_cache[cache_key] = snapshot
+            if len(self._as_of_cache) > self.AS_OF_CACHE_SIZE:
+                self._as_of_cache.popitem(last=False)
+
+        return snapshot.assign(tran_date=pd.Timestamp(tran_ns), valid_date=pd.Timestamp(valid_ns))
+
+    def history(self, table):
+        """Return (frame, Watermark) of table's full history, as cached by fetch_history
+
+        The watermark is checked on the watch tick, not per query: at most every WATCH_SECONDS, or
+        on the next call after the change watcher reports the table.
+        """
+        sql = table.select.format(filter="1 = 1")
+        cache_key = (sql, ())
+        with self._fetch_lock(cache_key):
+            checked = self._history_checked.get(table)
+            if cache_key not in self._cache or checked is None or time.monotonic() - checked >= self.WATCH_SECONDS:
+                self._fetch_history(cache_key, sql, table.key, {})
+                self._history_checked[table] = time.monotonic()
+            df, _, mark = self._cache[cache_key]
+            return df, mark
+
+    # --- R*Tree store ---
+    def sync_rtree(self):
+        """Bring the local R*Tree store up to date with the full history of every table
+
+        Only versions inserted or closed since the last sync are written; a history that lost
+        versions, e.g. to compaction, is reloaded whole.
+        """
+        if self._rtree is None:
+            raise ValueError("No R*Tree store: create the DataEngine with an rtree_path")
+        for table in HistoryTable:
+            df, mark = self.history(table)
+            # Every insert or closure moves the watermark; otherwise the store is already current
+            loaded = self._rtree_loaded.get(table)
+            if loaded is not None and loaded[0] == mark:
+                continue
+            if loaded is None or not loaded[1][table.key].isin(df[table.key]).all():
+                self._rtree.load(table, df, replace=True)
+            else:
+                same = [table.key, *INTERVAL_COLUMNS]
+                changed = ~pd.MultiIndex.from_frame(df[same]).isin(pd.MultiIndex.from_frame(loaded[1][same]))
+                self._rtree.load(table, df[changed])
+            self._rtree_loaded[table] = (mark, df)
+
+    def window(self, table, view, column=None, ids=None):
+        """Return the versions of table whose rectangle meets view (valid_from, valid_to, tran_from, tran_to)
+
+        view holds naive nanoseconds or datetimes, e.g. a chart's visible limits, and is answered
+        through the R*Tree store; column and ids optionally restrict it to some entities.
+        """
+        self.sync_rtree()
+        return self._rtree.window(table, [point_to_ns(v) for v in view], column, ids)
+
+    def diff(self, table, dept_ids, tran_before, tran_after):
+        """Return history_diff of table for dept_ids: what changed between two transaction times"""
+        return history_diff(self.fetch_entities(table, "dept_id", dept_ids), table.key,
+                            CORRECTIONS[table].entity, tran_before, tran_after)
+
+    def _as_of_server(self, tran_ns, valid_ns, entities):
+        if self._engine.dialect.name == "postgresql":
+            stmt = self._statement(AS_OF_SELECT.format(filter="d.dept_id = ANY(:ids)"))
+        else:
+            stmt = self._statement(AS_OF_SELECT.format(filter="d.dept_id IN :ids"), ("ids",))
+        params = {
+            "tran_date": pd.Timestamp(tran_ns).to_pydatetime(),
+            "valid_date": pd.Timestamp(valid_ns).to_pydatetime(),
+            "ids": list(entities),
+        }
+
+        from sqlalchemy.exc import DBAPIError, ProgrammingError
+
+        try:
+            with self._engine.connect() as conn:
+                result = conn.execute(stmt, params)
+                df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        except ProgrammingError:
+            # Undefined function / invalid object name: no fn_as_of_* on this server, evaluate locally from now on
+            self._server_as_of = False
+            return None
+        except DBAPIError:
+            return None  # e.g. a dropped connection: evaluate locally this time and try the server again next time
+
+        self._server_as_of = True
+        return df.reindex(columns=AS_OF_COLUMNS)
+
+    def _reload(self, cache_key, key, params):
+        if self._stream:
+            stats = {}
+            df = self.fetch_streamed(cache_key[0], params, stats=stats)
+            fetched = stats.get("fetched_bytes", 0)
+        else:
+            raw = self.sql_fetch(cache_key[0], params)
+            df = ingest(raw)
+            fetched = memory_bytes(raw)
+            del raw
+        self._memory[cache_key] = (key, len(df), fetched, memory_bytes(df))
+        self._history_changed()
+        self._cache[cache_key] = (df, key, self._watermark(df, key))
+        self._save_snapshot(cache_key)
+        return df
+
+    def memory_report(self):
+        """Rows and memory of each fully loaded history frame, as fetched and after ingest"""
+        report = pd.DataFrame(
+            [(key, dict(params), rows, fetched, ingested)
+             for (_, params), (key, rows, fetched, ingested) in self._memory.items()],
+            columns=["key", "params", "rows", "fetched_bytes", "ingested_bytes"],
+        )
+        report["saving"] = 1 - report["ingested_bytes"] / report["fetched_bytes"]
+        return report
+
+    @staticmethod
+    def _watermark(df, key):
+        if len(df) == 0:
+            return Watermark(0, None, 0)
+        instants = np.concatenate([to_naive_ns(df["tran_from"]), to_naive_ns(df["tran_to"])])
+        instants = instants[instants != INFINITY_NS]
+        max_tran = pd.Timestamp(instants.max()).to_pydatetime() if len(instants) else None
+        return Watermark(int(df[key].max()), max_tran, len(df))
+
+# Sentinel used for open-ended (NULL / fn_infinity()) interval ends
+INFINITY_NS = np.iinfo(np.int64).max
+
+def to_naive_ns(values):
+    """Convert a datetime column to int64 nanoseconds since the UTC epoch, NaT -> INFINITY_NS
+
+    Columns already in the ingest schema (int64) pass through without a copy.
+    """
+    if getattr(values, "dtype", None) == np.int64:
+        return np.asarray(values)
+    dt = pd.to_datetime(pd.Series(values), errors="coerce")
+    if dt.dt.tz is not None:
+        dt = dt.dt.tz_convert("UTC").dt.tz_localize(None)
+    ns = dt.astype("datetime64[ns]").to_numpy().view(np.int64).copy()
+    ns[dt.isna().to_numpy()] = INFINITY_NS
+    return ns
+
+def from_naive_ns(ns):
+    """Convert naive int64 nanoseconds back to a datetime64 array, INFINITY_NS -> NaT"""
+    ns = np.asarray(ns, dtype=np.int64)
+    return np.where(ns == INFINITY_NS, np.datetime64("NaT"), ns.view("datetime64[ns]"))
+
+def point_to_ns(dt):
+    """Convert a single datetime (tz-aware or naive) to int64 nanoseconds since the UTC epoch; ints pass through"""
+    if isinstance(dt, (int, np.integer)):
+        return int(dt)
+    ts = pd.Timestamp(dt)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.as_unit("ns").value
+
+# --- Ingest schema ---
+# History frames are normalized once, as they are fetched, so chart, table and hover code
+# never re-parse them: interval ends as int64 nanoseconds since the UTC epoch with
+# INFINITY_NS for open ends, narrow integer ids and categorical repeated strings
+INTERVAL_COLUMNS = ("valid_from", "valid_to", "tran_from", "tran_to")
+DATE_COLUMNS = ("hire_date", "term_date")
+ID_DTYPES = {"dept_hist_id": np.int64, "emp_hist_id": np.int64, "dept_id": np.int32, "emp_id": np.int32}
+CATEGORY_COLUMNS = ("dept_name", "location", "job_title", "record_status")
+
+def ingest(df):
+    """Return a history frame in the ingest schema; columns already in it are not copied"""
+    data = {}
+    for name in df.columns:
+        col = df[name]
+        if name in INTERVAL_COLUMNS:
+            if col.dtype != np.int64:
+                col = pd.Series(to_naive_ns(col), index=df.index)
+        elif name in DATE_COLUMNS:
+            if col.dtype != "datetime64[ns]":
+                dt = pd.to_datetime(col, errors="coerce")
+                if dt.dt.tz is not None:
+                    dt = dt.dt.tz_convert("UTC").dt.tz_localize(None)
+                col = dt.astype("datetime64[ns]")
+        elif name in ID_DTYPES:
+            col = col.astype(ID_DTYPES[name], copy=False)
+        elif name in CATEGORY_COLUMNS:
+            if not isinstance(col.dtype, pd.CategoricalDtype):
+                col = col.astype("category")
+        data[name] = col
+    return pd.DataFrame(data, copy=False)
+
+def memory_bytes(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+# --- Streamed chunks ---
+# DataEngine.stream yields ingest-schema chunks; sinks take them one at a time through add()
+def pipeline(chunks, *sinks):
+    """Feed every chunk to each sink in one pass and return the sinks"""
+    for chunk in chunks:
+        for sink in sinks:
+            sink.add(chunk)
+    return sinks
+
+def reserve(array, size, needed):
+    """Return array, or a copy of its first size items with room for needed more, doubling capacity"""
+    if size + needed <= len(array):
+        return array
+    grown = np.empty(max(2 * len(array), size + needed), dtype=array.dtype)
+    grown[:size] = array[:size]
+    return grown
+
+class FrameBuilder:
+    """Assembles streamed chunks into one frame in arrays allocated up front.
+
+    rows sizes the arrays (they grow by doubling past it); categoricals are kept as codes
+    against categories gathered across chunks, so no chunk is kept and nothing is concatenated.
+    columns optionally keeps a subset, e.g. a key and the intervals for an index.
+    """
+    def __init__(self, rows=None, columns=None):
+        self.capacity = rows or 0
+        self.columns = columns
+        self.size = 0
+        self._arrays = None  # name -> array
+        self._dtypes = {}  # name -> dtype restored on frame()
+        self._categories = {}  # name -> {category: code}
+
+    def add(self, chunk):
+        n = len(chunk)
+        if self._arrays is None:
+            self._arrays = {}
+            for name in self.columns or chunk.columns:
+                dtype = chunk[name].dtype
+                if isinstance(dtype, pd.CategoricalDtype):
+                    self._categories[name] = {}
+                    dtype = np.dtype(np.int32)
+                elif not isinstance(dtype, np.dtype):
+                    self._dtypes[name] = dtype  # e.g. strings: held as objects until the end
+                    dtype = np.dtype(object)
+                self._arrays[name] = np.empty(max(self.capacity, n), dtype=dtype)
+
+        for name, array in self._arrays.items():
+            array = self._arrays[name] = reserve(array, self.size, n)
+            col = chunk[name]
+            if name in self._categories:
+                lookup = self._categories[name]
+                mapping = np.array([lookup.setdefault(c, len(lookup)) for c in col.cat.categories] + [-1],
+                                   dtype=np.int32)
+                array[self.size:self.size + n] = mapping[col.cat.codes.to_numpy()]  # code -1 -> -1
+            else:
+                array[self.size:self.size + n] = col.to_numpy()
+        self.size += n
+
+    def frame(self):
+        """Return the assembled frame; arrays filled exactly to rows are used without a copy"""
+        data = {}
+        for name, array in (self._arrays or {}).items():
+            array = array[:self.size] if self.size == len(array) else array[:self.size].copy()
+            if name in self._categories:
+                # Sorted categories, as ingest gives a single frame
+                categories = pd.Index(list(self._categories[name]))
+                order = categories.argsort()
+                remap = np.empty(len(order) + 1, dtype=np.int32)
+                remap[order] = np.arange(len(order), dtype=np.int32)
+                remap[-1] = -1
+                data[name] = pd.Categorical.from_codes(remap[array], categories[order])
+            elif name in self._dtypes:
+                data[name] = pd.array(array, dtype=self._dtypes[name])
+            else:
+                data[name] = array
+        return pd.DataFrame(data, copy=False)
+
+class CsvWriter:
+    """Appends streamed chunks to a CSV file, interval ends as datetimes with open ends left empty"""
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._started = False
+
+    def add(self, chunk):
+        intervals = {name: from_naive_ns(chunk[name]) for name in INTERVAL_COLUMNS if name in chunk.columns}
+        chunk.assign(**intervals).to_csv(self.path, mode="a" if self._started else "w",
+                                         header=not self._started, index=False)
+        self._started = True
+        self.rows += len(chunk)
+
+class BiTemporalIndex:
+    """Point lookup over (tran, valid) rectangles.
+
+    A centered interval tree on the transaction axis; each node keeps the rows
+    spanning its center sorted by tran_from and by tran_to, so a query only
+    walks one root-to-leaf path and filters the valid axis on the node slices.
+    """
+    def __init__(self, ids, tran_from, tran_to, valid_from, valid_to):
+        self.ids = np.asarray(ids)
+        self.tran_from = np.asarray(tran_from, dtype=np.int64)
+        self.tran_to = np.asarray(tran_to, dtype=np.int64)
+        self.valid_from = np.asarray(valid_from, dtype=np.int64)
+        self.valid_to = np.asarray(valid_to, dtype=np.int64)
+
+        # Nodes are stored flat: center, left child, right child, rows by tran_from, rows by tran_to
+        self.centers = []
+        self.left = []
+        self.right = []
+        self.by_from = []
+        self.by_to = []
+        self.root = self._build(np.arange(len(self.ids)))
+
+    @classmethod
+    def from_frame(cls, df, key):
+        return cls(
+            df[key].to_numpy(),
+            to_naive_ns(df["tran_from"]),
+            to_naive_ns(df["tran_to"]),
+            to_naive_ns(df["valid_from"]),
+            to_naive_ns(df["valid_to"]),
+        )
+
+    def _build(self, rows):
+        if len(rows) == 0:
+            return -1
+
+        node = len(self.centers)
+        self.centers.append(0)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.by_from.append(None)
+        self.by_to.append(None)
+
+        # Median of the finite endpoints keeps the tree balanced
+        tf = self.tran_from[rows]
+        tt = self.tran_to[rows]
+        endpoints = np.concatenate([tf, tt[tt != INFINITY_NS]])
+        center = int(np.median(endpoints))
+
+        left_mask = tt <= center
+        right_mask = tf > center
+        here = rows[~(left_mask | right_mask)]
+
+        self.centers[node] = center
+        self.by_from[node] = here[np.argsort(self.tran_from[here], kind="stable")]
+        self.by_to[node] = here[np.argsort(self.tran_to[here], kind="stable")]
+
+        # Guard against a split that makes no progress
+        if len(here) == 0 and (left_mask.all() or right_mask.all()):
+            self.by_from[node] = rows[np.argsort(tf, kind="stable")]
+            self.by_to[node] = rows[np.argsort(tt, kind="stable")]
+            return node
+
+        self.left[node] = self._build(rows[left_mask])
+        self.right[node] = self._build(rows[right_mask])
+        return node
+
+    def lookup(self, tran_ns, valid_ns):
+        """Return the ids of all rows containing the point (tran_ns, valid_ns)"""
+        hits = []
+        node = self.root
+        while node != -1:
+            center = self.centers[node]
+            if tran_ns < center:
+                # Every row here ends after the center, so only tran_from needs checking
+                rows = self.by_from[node]
+                rows = rows[:np.searchsorted(self.tran_from[rows], tran_ns, side="right")]
+                node_next = self.left[node]
+            else:
+                # Every row here starts at or before the center, so only tran_to needs checking
+                rows = self.by_to[node]
+                rows = rows[np.searchsorted(self.tran_to[rows], tran_ns, side="right"):]
+                node_next = self.right[node]
+
+            if len(rows):
+                rows = rows[(self.tran_from[rows] <= tran_ns) & (self.tran_to[rows] > tran_ns) &
+                            (self.valid_from[rows] <= valid_ns) & (self.valid_to[rows] > valid_ns)]
+                hits.append(rows)
+            node = node_next
+
+        if not hits:
+            return set()
+        return set(self.ids[np.concatenate(hits)].tolist())
+
+class VersionRegions:
+    """Department and employee history for a set of departments, cut into version regions.
+
+    The unique tran and valid endpoints of all versions split the plane into
+    cells; no version starts or ends inside a cell, so every point of a cell
+    has the same as-of answer.
+    """
+    def __init__(self, dept_df, emp_df):
+        self.dept_df = dept_df
+        self.emp_df = emp_df
+
+        self.dept_ns = [to_naive_ns(dept_df[c]) for c in ("tran_from", "tran_to", "valid_from", "valid_to")]
+        self.emp_ns = [to_naive_ns(emp_df[c]) for c in ("tran_from", "tran_to", "valid_from", "valid_to")]
+
+        tran = np.concatenate([self.dept_ns[0], self.dept_ns[1], self.emp_ns[0], self.emp_ns[1]])
+        valid = np.concatenate([self.dept_ns[2], self.dept_ns[3], self.emp_ns[2], self.emp_ns[3]])
+        self.tran_edges = np.unique(tran[tran != INFINITY_NS])
+        self.valid_edges = np.unique(valid[valid != INFINITY_NS])
+
+    def locate(self, tran_ns, valid_ns):
+        """Return the (tran, valid) cell containing the point"""
+        return (int(np.searchsorted(self.tran_edges, tran_ns, side="right")),
+                int(np.searchsorted(self.valid_edges, valid_ns, side="right")))
+
+    @staticmethod
+    def _mask(ns, tran_ns, valid_ns):
+        tran_from, tran_to, valid_from, valid_to = ns
+        return (tran_from <= tran_ns) & (tran_to > tran_ns) & (valid_from <= valid_ns) & (valid_to > valid_ns)
+
+    def evaluate(self, tran_ns, valid_ns):
+        """Join the department and employee versions in effect at the point, like Queries_Multiple.sql"""
+        return as_of_join(self.dept_df.loc[self._mask(self.dept_ns, tran_ns, valid_ns)],
+                          self.emp_df.loc[self._mask(self.emp_ns, tran_ns, valid_ns)])
+
+def as_of_join(dept, emp):
+    """Join department and employee versions in effect at one point into the AS_OF_SELECT layout"""
+    dept = dept[["dept_id", "dept_hist_id", "dept_name"]]
+    emp = emp[["dept_id", "emp_hist_id", "emp_id", "first_name", "last_name", "job_title", "hire_date", "term_date"]]
+    df = dept.merge(emp, on="dept_id", how="left")
+    df = df.sort_values(["dept_hist_id", "emp_hist_id"], kind="stable", ignore_index=True)
+    return df.reindex(columns=AS_OF_COLUMNS)
+
+def bitemporal_join(dept_df, emp_df):
+    """Full bitemporal join of department and employee history on dept_id.
+
+    Returns one row per (department version, employee version) pair that is in
+    effect together somewhere, with the (valid, tran) rectangle where both
+    hold. Pairs are found with a sweep over the sorted transaction endpoints,
+    checking valid-time overlap only against versions active at the sweep line.
+    """
+    sides = []
+    for df in (dept_df, emp_df):
+        ns = [to_naive_ns(df[c]) for c in ("tran_from", "tran_to", "valid_from", "valid_to")]
+        # Empty rectangles never join anything
+        keep = np.flatnonzero((ns[0] < ns[1]) & (ns[2] < ns[3]))
+        sides.append((keep, [a[keep] for a in ns], df["dept_id"].to_numpy()[keep]))
+
+    # Events: (time, kind, side, row); closings sort before openings at the same instant
+    times, kinds, side_ids, rows = [], [], [], []
+    for side, (keep, (tran_from, tran_to, _, _), _) in enumerate(sides):
+        n = len(keep)
+        times += [tran_to, tran_from]
+        kinds += [np.zeros(n, np.int8), np.ones(n, np.int8)]
+        side_ids += [np.full(n, side, np.int8)] * 2
+        rows += [np.arange(n)] * 2
+    times = np.concatenate(times)
+    kinds = np.concatenate(kinds)
+    side_ids = np.concatenate(side_ids)
+    rows = np.concatenate(rows)
+    order = np.lexsort((kinds, times))
+
+    valid = [(ns[2].tolist(), ns[3].tolist()) for _, ns, _ in sides]
+    dept_ids = [ids.tolist() for _, _, ids in sides]
+    active = [{}, {}]  # per side: dept_id -> set of active rows
+    pairs_d, pairs_e = [], []
+
+    for kind, side, row in zip(kinds[order].tolist(), side_ids[order].tolist(), rows[order].tolist()):
+        dept_id = dept_ids[side][row]
+        if kind == 0:
+            active[side][dept_id].discard(row)
+            continue
+
+        # Pair the opening version with the other side's active versions of the same department
+        vf, vt = valid[side][0][row], valid[side][1][row]
+        other_from, other_to = valid[1 - side]
+        for other in active[1 - side].get(dept_id, ()):
+            if other_from[other] < vt and vf < other_to[other]:
+                if side == 0:
+                    pairs_d.append(row)
+                    pairs_e.append(other)
+                else:
+                    pairs_d.append(other)
+                    pairs_e.append(row)
+        active[side].setdefault(dept_id, set()).add(row)
+
+    d = np.asarray(pairs_d, dtype=np.int64)
+    e = np.asarray(pairs_e, dtype=np.int64)
+    (d_keep, d_ns, _), (e_keep, e_ns, _) = sides
+
+    dept_rows = dept_df.iloc[d_keep[d]].reset_index(drop=True)
+    emp_rows = emp_df.iloc[e_keep[e]].reset_index(drop=True)
+    df = pd.DataFrame({
+        "dept_id": dept_rows["dept_id"],
+        "dept_hist_id": dept_rows["dept_hist_id"],
+        "dept_name": dept_rows["dept_name"],
+        "emp_hist_id": emp_rows["emp_hist_id"],
+        "emp_id": emp_rows["emp_id"],
+        "first_name": emp_rows["first_name"],
+        "last_name": emp_rows["last_name"],
+        "job_title": emp_rows["job_title"],
+        "valid_from": np.maximum(d_ns[2][d], e_ns[2][e]),
+        "valid_to": np.minimum(d_ns[3][d], e_ns[3][e]),
+        "tran_from": np.maximum(d_ns[0][d], e_ns[0][e]),
+        "tran_to": np.minimum(d_ns[1][d], e_ns[1][e]),
+    })
+    return df.sort_values(["dept_hist_id", "emp_hist_id"], kind="stable", ignore_index=True)
+
+# --- Coalescing ---
+def _merge_runs(df, key, fixed, along):
+    """Merge runs of rows with the same values and fixed interval whose along intervals meet"""
+    s = df.iloc[np.lexsort((df[along[0]].to_numpy(), df[fixed[1]].to_numpy(), df[fixed[0]].to_numpy(),
+                            df["_value"].to_numpy()))]
+    value = s["_value"].to_numpy()
+    f0, f1 = s[fixed[0]].to_numpy(), s[fixed[1]].to_numpy()
+    a0, a1 = s[along[0]].to_numpy(), s[along[1]].to_numpy()
+
+    start = np.ones(len(s), dtype=bool)
+    start[1:] = (value[1:] != value[:-1]) | (f0[1:] != f0[:-1]) | (f1[1:] != f1[:-1]) | (a0[1:] != a1[:-1])
+    if start.all():
+        return df
+
+    first = np.flatnonzero(start)
+    last = np.r_[first[1:], len(s)] - 1
+    merged = s.iloc[first].copy()
+    merged[along[1]] = np.maximum.reduceat(a1, first)
+    merged[key] = np.minimum.reduceat(s[key].to_numpy(), first)
+    if "record_status" in s.columns:
+        merged["record_status"] = s["record_status"].iloc[last].array
+    return merged
+
+def coalesce(df, key):
+    """Merge adjacent versions of an entity with identical values; return (frame, stats)
+
+    Versions sharing a transaction interval whose valid intervals meet are merged, then versions
+    sharing a valid interval whose transaction intervals meet, until nothing more merges. Every
+    (transaction, valid) point keeps its values, so as-of answers do not change; a merged version
+    keeps its lowest key.
+    """
+    df = ingest(df)
+    rows = len(df)
+    merged = df
+    if rows:
+        values = [c for c in df.columns if c not in (key, "record_status", *INTERVAL_COLUMNS)]
+        merged = df.assign(_value=df.groupby(values, sort=False, dropna=False, observed=True).ngroup().to_numpy())
+        while True:
+            count = len(merged)
+            merged = _merge_runs(merged, key, ("tran_from", "tran_to"), ("valid_from", "valid_to"))
+            merged = _merge_runs(merged, key, ("valid_from", "valid_to"), ("tran_from", "tran_to"))
+            if len(merged) == count:
+                break
+        merged = merged.drop(columns="_value").sort_values(key, kind="stable", ignore_index=True)
+
+    stats = {
+        "rows": rows,
+        "coalesced": len(merged),
+        "removed": rows - len(merged),
+        "reduction": (rows - len(merged)) / rows if rows else 0.0,
+    }
+    return merged, stats
+
+# --- Transaction-time diff ---
+DIFF_CHANGES = ("added", "removed", "changed")
+
+def history_diff(df, key, entity, tran_before, tran_after, columns=None):
+    """Compare what was known at tran_before with what was known at tran_after, along valid time
+
+    Returns one row per valid-time span of an entity where the two transaction slices disagree:
+    added (only known after), removed (only known before) or changed (columns lists the attributes
+    that differ), with the {key}_before and {key}_after versions responsible. Adjacent spans with
+    the same change and versions are merged. Values default to every column but key, entity and
+    the intervals; each slice is assumed to hold one version per entity at any valid instant.
+    """
+    df = ingest(df)
+    if columns is None:
+        columns = [c for c in df.columns if c not in (key, entity, "record_status", *INTERVAL_COLUMNS)]
+    valid_from, valid_to = df["valid_from"].to_numpy(), df["valid_to"].to_numpy()
+    tran_from, tran_to = df["tran_from"].to_numpy(), df["tran_to"].to_numpy()
+
+    # Entities and valid instants as dense ranks, so (entity, instant) sorts as one int64
+    n = len(df)
+    codes, entities = pd.factorize(df[entity], sort=True)
+    instants, ranks = np.unique(np.concatenate([valid_from, valid_to]), return_inverse=True)
+    width = max(1, len(instants))
+    start = codes * width + ranks.reshape(-1)[:n]
+    end = codes * width + ranks.reshape(-1)[n:]
+
+    # Each slice: the versions known at that transaction time
+    slices = []
+    for tran_ns in (point_to_ns(tran_before), point_to_ns(tran_after)):
+        rows = np.flatnonzero((tran_from <= tran_ns) & (tran_ns < tran_to) & (start < end))
+        slices.append(rows[np.argsort(start[rows], kind="stable")])
+
+    # Elementary segments between consecutive endpoints of either slice, within one entity
+    edges = np.unique(np.concatenate([np.concatenate([start[rows], end[rows]]) for rows in slices]))
+    seg_lo, seg_hi = edges[:-1], edges[1:]
+    same = seg_lo // width == seg_hi // width
+    seg_lo, seg_hi = seg_lo[same], seg_hi[same]
+
+    # The version of each slice covering a segment: last start at or before it, if it ends after
+    found = []
+    for rows in slices:
+        pos = np.searchsorted(start[rows], seg_lo, side="right") - 1
+        row = rows[np.maximum(pos, 0)] if len(rows) else np.zeros(len(seg_lo), dtype=np.int64)
+        found.append(np.where((pos >= 0) & (end[row] > seg_lo), row, -1))
+    before, after = found
+
+    both = (before >= 0) & (after >= 0) & (before != after)
+    differs = np.zeros((len(seg_lo), len(columns)), dtype=bool)
+    for j, name in enumerate(columns):
+        values = pd.factorize(df[name])[0]  # missing values compare equal
+        differs[both, j] = values[before[both]] != values[after[both]]
+
+    change = np.full(len(seg_lo), -1, dtype=np.int8)
+    change[(before < 0) & (after >= 0)] = 0
+    change[(before >= 0) & (after < 0)] = 1
+    change[differs.any(axis=1)] = 2
+    keep = np.flatnonzero(change >= 0)
+    seg_lo, seg_hi, change, before, after, differs = (a[keep] for a in (seg_lo, seg_hi, change, before, after, differs))
+
+    # Merge runs of touching segments with the same change and versions
+    first = np.ones(len(keep), dtype=bool)
+    first[1:] = ((seg_lo[1:] != seg_hi[:-1]) | (change[1:] != change[:-1]) |
+                 (before[1:] != before[:-1]) | (after[1:] != after[:-1]))
+    first = np.flatnonzero(first)
+    last = np.r_[first[1:], len(keep)][:len(first)] - 1
+
+    # Differing attributes as text, built once per distinct pattern
+    bits = differs[first].astype(np.int64) @ (1 << np.arange(len(columns), dtype=np.int64))
+    patterns, inverse = np.unique(bits, return_inverse=True)
+    names = np.asarray([", ".join(c for j, c in enumerate(columns) if p >> j & 1) for p in patterns.tolist()],
+                       dtype=object)
+    label = names[inverse.reshape(-1)]
+
+    # Responsible versions; a span only known on one side has no version on the other
+    versions = {}
+    for side, rows in (("before", before[first]), ("after", after[first])):
+        hist_ids = pd.array(df[key].to_numpy()[rows], dtype="Int64")
+        hist_ids[rows < 0] = pd.NA
+        versions[f"{key}_{side}"] = hist_ids
+
+    return pd.DataFrame({
+        entity: entities.take(seg_lo[first] // width).to_numpy(),
+        "valid_from": instants[seg_lo[first] % width],
+        "valid_to": instants[seg_hi[last] % width],
+        "change": pd.Categorical.from_codes(change[first], DIFF_CHANGES),
+        **versions,
+        "columns": label,
+    })
+
+def format_columns(df):
+    """Pre-format every column to display strings once per frame, NaT shown as '-'"""
+    formatted = []
+    for col_name in df.columns:
+        col = df[col_name]
+        if col_name in INTERVAL_COLUMNS and col.dtype == np.int64:
+            ns = col.to_numpy()
+            values = np.char.replace(np.datetime_as_string(ns.view("datetime64[ns]"), unit="s"), "T", " ").astype(object)
+            values[ns == INFINITY_NS] = "-"
+        elif pd.api.types.is_datetime64_any_dtype(col):
+            if col.dt.tz is None:
+                values = np.char.replace(np.datetime_as_string(col.to_numpy(), unit="s"), "T", " ").astype(object)
+            else:
+                values = np.array([str(v) for v in col.tolist()], dtype=object)
+            values[col.isna().to_numpy()] = "-"  # custom replacement text
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            values = col.astype(object).where(col.notna(), None).to_numpy(dtype=object).astype(str).astype(object)
+        else:
+            values = col.to_numpy(dtype=object).astype(str).astype(object)
+        formatted.append(values)
+    return formatted
+
 class TableTreeview(ttk.Treeview):
-    def __init__(self, master=None, columns=None, **kwargs):
+    def __init__(self, master=None, columns=None, virtual=False, **kwargs):
         # Create a frame to hold Treeview + scrollbar
         super().__init__(master, columns=columns, **kwargs)
 
@@ -153,9 +1796,29 @@ class TableTreeview(ttk.Treeview):
             self.column(col, width=100)
 
         self.columns = columns
-
-        scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.yview)
-        self.configure(yscroll=scrollbar.set)
+        self.virtual = virtual
+
+        self.df = None
+        self.key = None
+        self.formatted = []
+        self.highlighted = set()
+
+        # Virtual mode: a fixed pool of item slots showing rows offset..offset+page
+        self.offset = 0
+        self.page = int(kwargs.get("height", 10))
+        self.slots = []
+        self.slot_tags = []
+
+        if virtual:
+            scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.on_scroll)
+            self.bind("<Configure>", self.on_resize)
+            self.bind("<MouseWheel>", self.on_wheel)
+            self.bind("<Button-4>", self.on_wheel)
+            self.bind("<Button-5>", self.on_wheel)
+        else:
+            scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.yview)
+            self.configure(yscroll=scrollbar.set)
+        self.scrollbar = scrollbar
         scrollbar.grid(row=0, column=1, sticky="ns")
         self.grid(row=0, column=0, sticky="nsew")
 
@@ -165,72 +1828,177 @@ class TableTreeview(ttk.Treeview):
         self.tag_configure('selected_odd', background='#42f56c')
         self.tag_configure('selected_even', background='#42f56c')
 
+    def row_tag(self, i):
+        if i in self.highlighted:
+            return "selected_even" if i % 2 == 0 else "selected_odd"
+        return "evenrow" if i % 2 == 0 else "oddrow"
+
+    def row_values(self, i):
+        return [col[i] for col in self.formatted]
+
     # --- Display table with row banding ---
-    def display_table(self, df):
+    @METRICS.timed("table.display")
+    def display_table(self, df, key=None):
 
         self.df = df
         self.row_map = {}
+        self.key = key if key is not None else df.columns[0]
+        self.highlighted = set()
+        self.formatted = format_columns(df)
 
         # Clear existing rows
         for row in self.get_children():
             self.delete(row)
+        self.slots = []
+        self.slot_tags = []
 
-        # Insert new rows with alternating colors
-        for i, row in enumerate(df.itertuples(index=False)):
-            banding_tag = 'evenrow' if i % 2 == 0 else 'oddrow'
+        if self.virtual:
+            self.offset = 0
+            self.render()
+        else:
+            # Insert new rows with alternating colors
+            for i in range(len(df)):
+                iid = self.insert("", tk.END, values=self.row_values(i), tags=(self.row_tag(i),))
+                self.row_map[i] = iid
+
+        self.build_index()
+
+    def build_index(self):
+        # Build the hover lookup once per frame, keyed on the history id
+        self.index = BiTemporalIndex.from_frame(self.df, self.key)
+        self.id_map = {hist_id: i for i, hist_id in enumerate(self.df[self.key].tolist())}
+
+    # --- Incremental update: insert new versions, refresh closed ones ---
+    def update_table(self, df, key=None):
+        key = key if key is not None else self.key
+        if self.df is None or key != self.key or len(df) < len(self.df):
+            self.display_table(df, key)
+            return
 
-            # Convert row tuple to list to modify values
-            values = list(row)
+        old_ids = self.df[key].to_numpy()
+        new_ids = df[key].to_numpy()
+        n_old = len(old_ids)
 
-            # Loop over columns and replace NaT only if column is datetime
-            for j, col_name in enumerate(df.columns):
-                if pd.api.types.is_datetime64_any_dtype(df[col_name]):
-                    if pd.isna(values[j]):
-                        values[j] = "-"  # custom replacement text
+        # Existing versions must keep their position, new ones are appended (ORDER BY *_hist_id)
+        if not np.array_equal(new_ids[:n_old], old_ids) or list(df.columns) != list(self.df.columns):
+            self.display_table(df, key)
+            return
 
-            iid = self.insert("", tk.END, values=values, tags=(banding_tag,))
-            self.row_map[i] = iid
+        formatted = format_columns(df)
+        changed = np.zeros(n_old, dtype=bool)
+        for old_col, new_col in zip(self.formatted, formatted):
+            changed |= old_col != new_col[:n_old]
 
-        # keep a copy for next comparison
-        #self.df = df.copy()
+        self.df = df
+        self.formatted = formatted
 
+        if self.virtual:
+            self.render()
+        else:
+            for i in np.flatnonzero(changed).tolist():
+                self.item(self.row_map[i], values=self.row_values(i), tags=(self.row_tag(i),))
+            for i in range(n_old, len(df)):
+                self.row_map[i] = self.insert("", tk.END, values=self.row_values(i), tags=(self.row_tag(i),))
+
+        self.build_index()
+
+    # --- Virtual mode rendering and scrolling ---
+    def render(self):
+        n = len(self.df) if self.df is not None else 0
+        self.offset = max(0, min(self.offset, n - self.page))
+        visible = min(self.page, n)
+
+        # Grow or shrink the slot pool to the visible row count
+        while len(self.slots) < visible:
+            self.slots.append(self.insert("", tk.END))
+            self.slot_tags.append(None)
+        while len(self.slots) > visible:
+            self.delete(self.slots.pop())
+            self.slot_tags.pop()
+
+        for k, iid in enumerate(self.slots):
+            i = self.offset + k
+            tag = self.row_tag(i)
+            self.item(iid, values=self.row_values(i), tags=(tag,))
+            self.slot_tags[k] = tag
+
+        if n:
+            self.scrollbar.set(self.offset / n, (self.offset + visible) / n)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def retag_visible(self):
+        # Only touch slots whose tag actually changed
+        for k, iid in enumerate(self.slots):
+            tag = self.row_tag(self.offset + k)
+            if tag != self.slot_tags[k]:
+                self.item(iid, tags=(tag,))
+                self.slot_tags[k] = tag
+
+    def scroll_to(self, offset):
+        if self.df is None or not self.virtual:
+            return
+        offset = max(0, min(int(offset), len(self.df) - self.page))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def on_scroll(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * len(self.df) if self.df is not None else 0)
+        elif args[0] == "scroll":
+            step = self.page if args[2] == "pages" else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"
+
+    def on_resize(self, event):
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        # Leave room for the heading row
+        page = max(1, event.height // rowheight - 1)
+        if page != self.page:
+            self.page = page
+            if self.df is not None:
+                self.render()
+
+    @METRICS.timed("table.select_row")
     def select_row(self, index, trans_dt, valid_dt):
+        if self.df is None:
+            return
 
-        df = self.df
-
-        # Convert DataFrame columns to naive datetime
-        df["tran_from"] = pd.to_datetime(df["tran_from"], errors="coerce").dt.tz_localize(None)
-        df["tran_to"]   = pd.to_datetime(df["tran_to"], errors="coerce").dt.tz_localize(None)
-        df["valid_from"]= pd.to_datetime(df["valid_from"], errors="coerce").dt.tz_localize(None)
-        df["valid_to"]  = pd.to_datetime(df["valid_to"], errors="coerce").dt.tz_localize(None)
-
-        # Convert input datetimes to naive as well
-        if hasattr(trans_dt, "tzinfo") and trans_dt.tzinfo is not None:
-            trans_dt = trans_dt.replace(tzinfo=None)
-        if hasattr(valid_dt, "tzinfo") and valid_dt.tzinfo is not None:
-            valid_dt = valid_dt.replace(tzinfo=None)
-
-        # Find the history_id(s) that match the date criteria in the DataFrame
-        mask = (df["tran_from"] <= trans_dt) & ((df["tran_to"] > trans_dt) | df["tran_to"].isna()) & \
-               (df["valid_from"] <= valid_dt) & ((df["valid_to"] > valid_dt) | df["valid_to"].isna())
+        # Rebuild the lookup if asked for a different key column
+        if index != self.key:
+            self.key = index
+            self.build_index()
 
-        matching_ids = df.loc[mask, index].tolist()  # or emp_hist_id for employee table
+        # Find the row position(s) that contain the hovered point
+        matching_ids = self.index.lookup(point_to_ns(trans_dt), point_to_ns(valid_dt))
+        matching = {self.id_map[hist_id] for hist_id in matching_ids}
 
-        # Loop through Treeview items
-        for i, item_id in enumerate(self.get_children()):
-            row_values = self.item(item_id, "values")
-            is_even = i % 2 == 0
+        previous = self.highlighted
+        self.highlighted = matching
+        added = matching - previous
 
-            if int(row_values[0]) in matching_ids:
-                tag = "selected_even" if is_even else "selected_odd"
-                self.see(self.row_map[i])
-            else:
-                tag = "evenrow" if is_even else "oddrow"
+        if self.virtual:
+            # Bring the first newly matched row into view, otherwise only re-tag
+            if added and not any(self.offset <= i < self.offset + self.page for i in added):
+                self.scroll_to(min(added) - self.page // 2)
+            self.retag_visible()
+            return
 
-            self.item(item_id, tags=(tag,))
+        # Only re-tag rows whose match state changed since the last hover
+        for i in (previous ^ matching):
+            self.item(self.row_map[i], tags=(self.row_tag(i),))
+        for i in added:
+            self.see(self.row_map[i])
 
 class TableContainer:
-    def __init__(self, parent, title, columns):
+    def __init__(self, parent, title, columns, virtual=False):
         self.parent = parent
         self.title = title
         self.columns = columns 
@@ -249,7 +2017,7 @@ class TableContainer:
         table_frame.rowconfigure(0, weight=1)
         table_frame.columnconfigure(0, weight=1)
 
-        tree = TableTreeview(table_frame, columns, show="headings")
+        tree = TableTreeview(table_frame, columns, virtual=virtual, show="headings")
         self.tree = tree
 
         # Attach tree to table_frame
@@ -261,10 +2029,6 @@ class TableContainer:
         # Attach to the frame to parent
         frame.grid(row=0, column=0, sticky="nsew")
 
-import tkinter as tk
-
-import tkinter as tk
-
 class BtnToolTip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -367,19 +2131,205 @@ class Tooltip:
             self.tipwindow = None
             self.label = None
 
+COLOR_PALETTE = [
+    "#1f77b4","#ff7f0e","#2ca02c","#d62728","#9467bd",
+    "#8c564b","#e377c2","#7f7f7f","#bcbd22","#17becf"
+]
+PALETTE_RGBA = mcolors.to_rgba_array(COLOR_PALETTE)
+
+# Diff spans by change, in DIFF_CHANGES order: added, removed, changed
+DIFF_COLORS = ["#2ca02c", "#d62728", "#ff7f0e"]
+DIFF_RGBA = mcolors.to_rgba_array(DIFF_COLORS)
+
+def to_num(values):
+    """Convert a datetime or ingest-schema column to matplotlib date numbers (UTC), NaT/INFINITY_NS -> NaN"""
+    if getattr(values, "dtype", None) == np.int64:
+        ns = np.asarray(values)
+        num = (ns - _EPOCH_NS) / 86_400_000_000_000
+        num[ns == INFINITY_NS] = np.nan
+        return num
+    dt = pd.to_datetime(pd.Series(values), errors="coerce")
+    if dt.dt.tz is not None:
+        dt = dt.dt.tz_convert("UTC").dt.tz_localize(None)
+    num = mdates.date2num(dt.astype("datetime64[ns]").to_numpy())
+    return np.asarray(num, dtype=float)
+
+def chart_extents(df, horizon=None):
+    """Return (x_start, x_end, y_start, y_end) arrays for every row; open ends stop at the horizon"""
+    if horizon is None:
+        horizon = mdates.date2num(pd.Timestamp.today() + pd.Timedelta(weeks=52))
+
+    x_start = to_num(df["valid_from"])
+    x_end = to_num(df["valid_to"])
+    y_start = to_num(df["tran_from"])
+    y_end = to_num(df["tran_to"])
+    x_end[np.isnan(x_end)] = horizon
+    y_end[np.isnan(y_end)] = horizon
+    return x_start, x_end, y_start, y_end
+
+# Hover work beyond the crosshair blit is coalesced to one update per frame (~60 fps)
+FRAME_MS = 16
+PLAYBACK_MS = 10_000  # One play through the whole transaction range
+
+class Playback:
+    """Versions known at a moving transaction time, kept current from precomputed events.
+
+    Every version's opening (tran_from) and closing (tran_to) is sorted once; a seek
+    only revisits the versions with an event between the old and new positions.
+    """
+    def __init__(self, y_start, y_end):
+        self.y_start = y_start
+        self.y_end = y_end
+        times = np.concatenate([y_start, y_end])
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.rows = order % max(1, len(y_start))
+        self.known = np.zeros(len(y_start), dtype=bool)
+        self.position = -np.inf
+
+    def seek(self, y):
+        """Move to transaction time y (a date number); return the rows whose state changed"""
+        lo, hi = np.searchsorted(self.times, sorted((self.position, y)), side="right")
+        rows = np.unique(self.rows[lo:hi])
+        # A version opened and closed between the two positions has two events and no change
+        rows = rows[((self.y_start[rows] <= y) & (y < self.y_end[rows])) != self.known[rows]]
+        self.known[rows] = ~self.known[rows]
+        self.position = y
+        return rows
+
+# Level of detail: with more visible rectangles than this, when most are only a few pixels
+# across, or when filling them would paint the axes over LOD_MAX_OVERDRAW times, the chart
+# shows a coverage raster sized to the axes instead of individual rectangles
+LOD_MAX_RECTS = 5000
+LOD_MIN_PIXELS = 3
+LOD_MAX_OVERDRAW = 8
+
+def raster_corners(extents, view, shape):
+    """Return the flat (rows + 1, cols + 1) difference-array indices of each rectangle's four corners
+
+    A rectangle adds at its lower left and upper right and subtracts at the other two; cumulative
+    sums of the array along both axes then count the rectangles covering each pixel.
+    """
+    x_start, x_end, y_start, y_end = extents
+    x0, x1, y0, y1 = view
+    rows, cols = shape
+
+    def pixels(values, low, high, count, round_fn):
+        return np.clip(round_fn((values - low) / (high - low) * count), 0, count).astype(np.intp)
+
+    ix0 = pixels(x_start, x0, x1, cols, np.floor)
+    ix1 = pixels(x_end, x0, x1, cols, np.ceil)
+    iy0 = pixels(y_start, y0, y1, rows, np.floor)
+    iy1 = pixels(y_end, y0, y1, rows, np.ceil)
+    width = cols + 1
+    return iy0 * width + ix0, iy0 * width + ix1, iy1 * width + ix0, iy1 * width + ix1
+
+def raster_counts(diff, shape):
+    """Return the (rows, cols) coverage counts of a raster_corners difference array"""
+    rows, cols = shape
+    return diff.reshape(rows + 1, cols + 1).cumsum(axis=0).cumsum(axis=1)[:rows, :cols]
+
+def coverage_raster(extents, view, shape):
+    """Count the rectangles covering each pixel of view (x0, x1, y0, y1) on a (rows, cols) grid"""
+    size = (shape[0] + 1) * (shape[1] + 1)
+    lower_left, lower_right, upper_left, upper_right = (np.bincount(corner, minlength=size)
+                                                        for corner in raster_corners(extents, view, shape))
+    return raster_counts(lower_left - lower_right - upper_left + upper_right, shape)
+
+def rect_verts(x_start, x_end, y_start, y_end):
+    """Return the (n, 4, 2) corner array of n rectangles for a PolyCollection"""
+    verts = np.empty((len(x_start), 4, 2))
+    verts[:, 0, 0] = verts[:, 3, 0] = x_start
+    verts[:, 1, 0] = verts[:, 2, 0] = x_end
+    verts[:, 0, 1] = verts[:, 1, 1] = y_start
+    verts[:, 2, 1] = verts[:, 3, 1] = y_end
+    return verts
+
+def show_detail(rects, density, extents, verts, colors, view, shape, max_rects=LOD_MAX_RECTS):
+    """Fill rects with the rectangles visible in view, or density with their coverage raster when
+    there are more than max_rects, most are only a few pixels across or they overlap heavily;
+    return whether it was dense"""
+    x_start, x_end, y_start, y_end = extents
+    x0, x1, y0, y1 = view
+    rows, cols = shape
+
+    visible = (x_start < x1) & (x_end > x0) & (y_start < y1) & (y_end > y0)
+    count = int(visible.sum())
+    width = (x_end[visible] - x_start[visible]) * cols / (x1 - x0)
+    height = (y_end[visible] - y_start[visible]) * rows / (y1 - y0)
+    dense = count > max_rects or (count > 0 and np.median(np.minimum(width, height)) < LOD_MIN_PIXELS)
+    if not dense and count:
+        # Open-ended versions reach the horizon, so only the part inside the view is painted
+        painted = ((np.minimum(x_end[visible], x1) - np.maximum(x_start[visible], x0)) * cols / (x1 - x0) *
+                   (np.minimum(y_end[visible], y1) - np.maximum(y_start[visible], y0)) * rows / (y1 - y0))
+        dense = painted.sum() > LOD_MAX_OVERDRAW * rows * cols
+
+    if dense:
+        counts = coverage_raster(tuple(a[visible] for a in extents), view, shape)
+        density.set_data(np.ma.masked_equal(counts, 0))
+        density.set_extent(view)
+        density.set_clim(1, max(1, counts.max()))
+        rects.set_verts([])
+    else:
+        colors = colors[visible]
+        rects.set_verts(verts[visible])
+        rects.set_facecolor(colors)
+        rects.set_edgecolor(colors)
+    rects.set_visible(not dense)
+    density.set_visible(dense)
+    return dense
+
+# Labels are only drawn on rectangles at least this many pixels wide and tall, at most one per
+# label-sized cell of the screen and LABEL_MAX in all
+LABEL_MIN_WIDTH = 60
+LABEL_MIN_HEIGHT = 30
+LABEL_MAX = 200
+
+_EPOCH_NS = np.datetime64(mdates.get_epoch(), "ns").astype(np.int64)
+
+def num_to_ns(num):
+    """Convert a matplotlib date number to naive (UTC) int64 nanoseconds"""
+    return int(_EPOCH_NS + round(num * 86_400_000_000_000))
+
 class Chart:
-    def __init__(self, parent, tooltip, title, key, labels):
+    def __init__(self, parent, tooltip, title, key, labels, blit=True):
         self.parent = parent
         self.tooltip = tooltip
         self.title = title
         self.key = key 
         self.labels = labels
-
-        fig, ax = plt.subplots(figsize=(12, 6)) 
+        self.blit = blit
+
+        # Crosshair and playback overlay state
+        self.vline = None
+        self.playback = None
+        self.known = None
+        self.known_density = None
+        self.play_line = None
+        self._dense = False  # whether update_detail last showed the coverage raster
+        self._known_layout = None  # the overlay's visible rows, as laid out by reset_known
+        self.diff_artists = []
+        self.hline = None
+        self.background = None
+        self._pending = None
+        self._flush_id = None
+        self._detail_id = None
+
+        # Never registered with pyplot's figure manager, so closing or replacing a chart frees it
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
         fig.subplots_adjust(bottom=0.15, top=0.85)
 
         self.ax = ax
+        if parent is None:
+            self.canvas = FigureCanvasAgg(fig)
+            self.canvas.draw = METRICS.timed("chart.draw")(self.canvas.draw)
+            return
+
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk  # Tk only
+
         canvas = FigureCanvasTkAgg(fig, master=parent)
+        canvas.draw = METRICS.timed("chart.draw")(canvas.draw)  # draw_idle ends up here too
         self.canvas = canvas
         canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
         parent.grid_rowconfigure(0, weight=1)
@@ -391,9 +2341,11 @@ class Chart:
 
         # Connect motion event
         canvas.mpl_connect("motion_notify_event", self.on_motion)
+        canvas.mpl_connect("draw_event", self.on_draw)
 
     # --- Display chart ---
-    def display_chart(self, df):
+    @METRICS.timed("chart.display")
+    def display_chart(self, df, draw=True):
         ax = self.ax
         title = self.title
         key = self.key
@@ -401,28 +2353,23 @@ class Chart:
         canvas = self.canvas
 
         ax.clear()
-        color_palette = [
-            "#1f77b4","#ff7f0e","#2ca02c","#d62728","#9467bd",
-            "#8c564b","#e377c2","#7f7f7f","#bcbd22","#17becf"
-        ]
+        self.diff_artists = []
+        self.playback = self.known = self.known_density = self.play_line = self._known_layout = None
 
-        for idx, row in df.iterrows():
-            valid_to = row['valid_to'] if pd.notnull(row['valid_to']) else pd.Timestamp.today() + pd.Timedelta(weeks=52)
-            tran_to  = row['tran_to']  if pd.notnull(row['tran_to']) else pd.Timestamp.today() + pd.Timedelta(weeks=52)
+        # All rectangle extents in one pass, open ends drawn up to a year from today
+        x_start, x_end, y_start, y_end = chart_extents(df)
+        self.verts = rect_verts(x_start, x_end, y_start, y_end)
+        self.colors = PALETTE_RGBA[np.asarray(df.index) % len(PALETTE_RGBA)]
 
-            x_start = mdates.date2num(row['valid_from'])
-            x_end   = mdates.date2num(valid_to)
-            y_start = mdates.date2num(row['tran_from'])
-            y_end   = mdates.date2num(tran_to)
+        # Hit-testing maps back to the key column by row position
+        self.histids = df[key].to_numpy()
+        self.extents = (x_start, x_end, y_start, y_end)
 
-            width  = x_end - x_start
-            height = y_end - y_start
-            color = color_palette[idx % len(color_palette)]
-
-            rect = Rectangle((x_start, y_start), width, height, facecolor=color, edgecolor=color, alpha=0.4)
-            rect.histid = row[key]
-            ax.add_patch(rect)
-            ax.text(x_start, y_start, "\n".join(str(row[i]) for i in labels), verticalalignment='bottom', fontsize=8)
+        # Labels sit at each rectangle's bottom-left corner and are created on demand for the view
+        self.label_source = df[labels].reset_index(drop=True)
+        self.anchor_order = np.argsort(x_start, kind="stable")
+        self.anchor_x = x_start[self.anchor_order]
+        self.label_artists = {}
 
         ax.set_xlabel("Valid Date")
         ax.set_ylabel("Transaction Date (Recorded)")
@@ -435,17 +2382,18 @@ class Chart:
         ax.tick_params(axis='x', labelsize=8)
         ax.tick_params(axis='y', labelsize=8)
 
-        ax.set_xlim(mdates.date2num(df['valid_from'].min() - pd.Timedelta(weeks=52)),
-                    mdates.date2num(pd.Timestamp.today() + pd.Timedelta(weeks=52)))
-        ax.set_ylim(mdates.date2num(df['tran_from'].min() - pd.Timedelta(weeks=52)),
-                    mdates.date2num(pd.Timestamp.today() + pd.Timedelta(weeks=52)))
+        # A year either side, in date-number days
+        x_min = x_start.min() - 52 * 7
+        y_min = y_start.min() - 52 * 7
+        ax.set_xlim(x_min, mdates.date2num(pd.Timestamp.today() + pd.Timedelta(weeks=52)))
+        ax.set_ylim(y_min, mdates.date2num(pd.Timestamp.today() + pd.Timedelta(weeks=52)))
 
         # Horizontal line for today
         now = mdates.date2num(pd.Timestamp.now())
         y_value = now
         ax.axhline(y=y_value, color="red", linestyle="--", linewidth=1)
         ax.text(
-            x=mdates.date2num(df['valid_from'].min() - pd.Timedelta(weeks=52)), 
+            x=x_min, 
             y=y_value, 
             s="Today",
             va="center", ha="right", color="red"
@@ -455,58 +2403,606 @@ class Chart:
         ax.axvline(x=x_value, color="red", linestyle="--", linewidth=1)
         ax.text(
             x=x_value,
-            y=mdates.date2num(df['tran_from'].min() - pd.Timedelta(weeks=52)),
+            y=y_min,
             s="Today",
             va="top", ha="center", color="red"
         )
 
-        # Create crosshair lines once
-        self.vline = ax.axvline(color="gray", lw=0.8, ls="--", alpha=0.6)
-        self.hline = ax.axhline(color="gray", lw=0.8, ls="--", alpha=0.6)
+        # Exact rectangles and the coverage raster; update_detail shows one of them for the current view
+        self.rects = PolyCollection([], alpha=0.4)
+        ax.add_collection(self.rects, autolim=False)
+        self.density = ax.imshow(np.zeros((1, 1)), extent=(*ax.get_xlim(), *ax.get_ylim()), origin="lower",
+                                 aspect="auto", cmap="Blues", alpha=0.6, interpolation="nearest", visible=False)
+        self.update_detail()
+        ax.callbacks.connect("xlim_changed", self.on_limits)
+        ax.callbacks.connect("ylim_changed", self.on_limits)
+
+        # Create crosshair lines once, animated so they stay out of the cached background
+        animated = self.blit and canvas.supports_blit
+        self.vline = ax.axvline(x=float("nan"), color="gray", lw=0.8, ls="--", alpha=0.6, animated=animated)
+        self.hline = ax.axhline(y=float("nan"), color="gray", lw=0.8, ls="--", alpha=0.6, animated=animated)
+
+        # Exports skip the on-screen draw; saving the figure renders it
+        if draw:
+            canvas.draw()
+
+    # --- Level of detail ---
+    def on_limits(self, ax):
+        # Zoom and pan change x and y limits separately; rebuild once, before the pending redraw
+        if self.parent is None:
+            self.update_detail()
+        elif self._detail_id is None:
+            self._detail_id = self.parent.after_idle(self.refresh_detail)
+
+    def refresh_detail(self):
+        self._detail_id = None
+        self.update_detail()
+        self.canvas.draw_idle()  # no-op when the toolbar's redraw is still pending
+
+    def view(self):
+        """Return the visible window (x0, x1, y0, y1) and its (rows, cols) pixel shape"""
+        ax = self.ax
+        x0, x1 = sorted(ax.get_xlim())
+        y0, y1 = sorted(ax.get_ylim())
+        return (x0, x1, y0, y1), (max(1, int(ax.bbox.height)), max(1, int(ax.bbox.width)))
+
+    def update_detail(self):
+        """Show exact rectangles for the visible window, or a coverage raster when they are too dense"""
+        view, shape = self.view()
+        dense = self._dense = show_detail(self.rects, self.density, self.extents, self.verts, self.colors,
+                                          view, shape)
+        self.update_labels(view, shape, dense)
+        if self.playback is not None:
+            self.reset_known()
+
+    def update_labels(self, view, shape, dense):
+        """Keep labels only on rectangles whose corner is in view and that are big enough to read"""
+        keep = set()
+        if not dense:
+            x_start, x_end, y_start, y_end = self.extents
+            x0, x1, y0, y1 = view
+            rows, cols = shape
+
+            # Anchors inside the view, through the x-sorted anchor index
+            lo, hi = np.searchsorted(self.anchor_x, (x0, x1))
+            rows_in_view = self.anchor_order[lo:hi]
+            rows_in_view = rows_in_view[(y_start[rows_in_view] >= y0) & (y_start[rows_in_view] < y1)]
+
+            # On-screen size of the part of each rectangle right of and above its anchor
+            width = (np.minimum(x_end[rows_in_view], x1) - x_start[rows_in_view]) * cols / (x1 - x0)
+            height = (np.minimum(y_end[rows_in_view], y1) - y_start[rows_in_view]) * rows / (y1 - y0)
+            readable = (width >= LABEL_MIN_WIDTH) & (height >= LABEL_MIN_HEIGHT)
+            rows_in_view = rows_in_view[readable]
+
+            # Largest rectangles first, one label per label-sized screen cell, LABEL_MAX at most
+            by_size = np.argsort(-(width[readable] * height[readable]), kind="stable")
+            rows_in_view = rows_in_view[by_size]
+            cell_x = ((x_start[rows_in_view] - x0) * cols / (x1 - x0) // LABEL_MIN_WIDTH).astype(np.int64)
+            cell_y = ((y_start[rows_in_view] - y0) * rows / (y1 - y0) // LABEL_MIN_HEIGHT).astype(np.int64)
+            _, first = np.unique(cell_y * (cols // LABEL_MIN_WIDTH + 1) + cell_x, return_index=True)
+            keep = set(rows_in_view[np.sort(first)][:LABEL_MAX].tolist())
+
+        for row in set(self.label_artists) - keep:
+            self.label_artists.pop(row).remove()
+        for row in keep - set(self.label_artists):
+            self.label_artists[row] = self.ax.text(self.extents[0][row], self.extents[2][row], self.label_text(row),
+                                                   verticalalignment='bottom', fontsize=8, clip_on=True)
+
+    def label_text(self, row):
+        return "\n".join(str(value) for value in self.label_source.iloc[row])
+
+    def histids_at(self, x, y):
+        """Return the key values of all rectangles containing the data point (x, y)"""
+        x_start, x_end, y_start, y_end = self.extents
+        mask = (x_start <= x) & (x < x_end) & (y_start <= y) & (y < y_end)
+        return self.histids[mask].tolist()
+
+    # --- Transaction-time diff ---
+    def show_diff(self, diff, tran_before, tran_after, draw=True):
+        """Shade history_diff spans between the two transaction times; a None diff clears them"""
+        for artist in self.diff_artists:
+            artist.remove()
+        self.diff_artists = []
+
+        if diff is not None:
+            ax = self.ax
+            y_before, y_after = to_num(np.array([point_to_ns(tran_before), point_to_ns(tran_after)]))
+            x_start = to_num(diff["valid_from"].to_numpy())
+            x_end = to_num(diff["valid_to"].to_numpy())
+            x_end[np.isnan(x_end)] = mdates.date2num(pd.Timestamp.today() + pd.Timedelta(weeks=52))
+            n = len(diff)
+            spans = PolyCollection(rect_verts(x_start, x_end, np.full(n, min(y_before, y_after)),
+                                              np.full(n, max(y_before, y_after))),
+                                   facecolors=DIFF_RGBA[diff["change"].cat.codes.to_numpy()], alpha=0.25,
+                                   edgecolors="none")
+            self.diff_artists.append(ax.add_collection(spans, autolim=False))
+            for y, name in ((y_before, "Before"), (y_after, "After")):
+                self.diff_artists.append(ax.axhline(y=y, color="black", linestyle=":", linewidth=1))
+                self.diff_artists.append(ax.text(ax.get_xlim()[0], y, name, va="center", ha="right"))
+
+            counts = diff["change"].value_counts()
+            handles = [Patch(color=color, alpha=0.5, label=f"{change} ({counts[change]})")
+                       for change, color in zip(DIFF_CHANGES, DIFF_COLORS)]
+            self.diff_artists.append(ax.legend(handles=handles, loc="upper left", fontsize=8))
+
+        if draw:
+            self.canvas.draw()
+
+    # --- Transaction-time playback ---
+    def start_playback(self):
+        """Fade the full history and overlay only the versions known at the playback position"""
+        ax = self.ax
+        animated = self.blit and self.canvas.supports_blit
+        self.playback = Playback(self.extents[2], self.extents[3])
+
+        # Known versions are opaque and the rest transparent, through per-version face colors
+        self.known = PolyCollection([], animated=animated)
+        ax.add_collection(self.known, autolim=False)
+        self.known_density = ax.imshow(np.zeros((1, 1)), extent=(*ax.get_xlim(), *ax.get_ylim()), origin="lower",
+                                       aspect="auto", cmap="Blues", alpha=0.9, interpolation="nearest",
+                                       visible=False, animated=animated)
+        self.play_line = ax.axhline(y=float("nan"), color="black", lw=1.2, animated=animated)
+        self.rects.set_alpha(0.1)
+        self.density.set_alpha(0.2)
+        self.reset_known()
+        self.canvas.draw()
+
+    def seek(self, y):
+        """Show the versions known at transaction time y (a date number); only the overlay is redrawn"""
+        if self.playback is None:
+            return
+        self.patch_known(self.playback.seek(y))
+        self.play_line.set_ydata([y, y])
+        self.draw_overlay()
 
-        canvas.draw()
+    def reset_known(self):
+        """Lay the overlay out over the versions visible in the current view, at the chart's level of detail
+
+        Rectangles keep a fixed vertex array and show only the known versions through their alpha;
+        the raster keeps the corner indices of every visible version and a difference array of the
+        known ones. A seek then only patches the versions that changed.
+        """
+        view, (height, width) = self.view()
+        x_start, x_end, y_start, y_end = self.extents
+        x0, x1, y0, y1 = view
+        visible = np.flatnonzero((x_start < x1) & (x_end > x0) & (y_start < y1) & (y_end > y0))
+        slots = np.full(len(x_start), -1, dtype=np.intp)  # row -> position among the visible versions
+        slots[visible] = np.arange(len(visible))
+        dense = self._dense
+        if dense:
+            # The overlay is redrawn every frame, so its raster is built at half resolution
+            shape = (max(1, height // 2), max(1, width // 2))
+            corners = raster_corners(tuple(a[visible] for a in self.extents), view, shape)
+            self._known_layout = (slots, shape, corners, np.zeros((shape[0] + 1) * (shape[1] + 1), dtype=np.int64))
+            self.known_density.set_extent(view)
+            self.known.set_verts([])
+        else:
+            colors = self.colors[visible].copy()
+            colors[:, 3] = 0.0
+            self._known_layout = (slots, None, None, colors)
+            self.known.set_verts(self.verts[visible])
+        self.known.set_visible(not dense)
+        self.known_density.set_visible(dense)
+        self.patch_known(visible[self.playback.known[visible]], force=True)
+
+    def patch_known(self, rows, force=False):
+        """Update the overlay for rows whose known state changed"""
+        slots, shape, corners, values = self._known_layout
+        slots = slots[rows]
+        inside = slots >= 0
+        if not (force or inside.any()):
+            return
+        rows, slots = rows[inside], slots[inside]
+        known = self.playback.known[rows]
+        if shape is None:
+            values[slots, 3] = np.where(known, 0.8, 0.0)
+            self.known.set_facecolor(values)
+            self.known.set_edgecolor(values)
+            return
+        sign = np.where(known, 1, -1)
+        lower_left, lower_right, upper_left, upper_right = (corner[slots] for corner in corners)
+        np.add.at(values, lower_left, sign)
+        np.subtract.at(values, lower_right, sign)
+        np.subtract.at(values, upper_left, sign)
+        np.add.at(values, upper_right, sign)
+        counts = raster_counts(values, shape)
+        density = self.known_density
+        density.set_clim(1, max(1, counts.max()))
+        density.set_data(density.to_rgba(np.ma.masked_equal(counts, 0), bytes=True))  # color-mapped here, not per draw
+
+    def stop_playback(self):
+        if self.playback is None:
+            return
+        self.known.remove()
+        self.known_density.remove()
+        self.play_line.remove()
+        self.playback = self.known = self.known_density = self.play_line = self._known_layout = None
+        self.rects.set_alpha(0.4)
+        self.density.set_alpha(0.6)
+        self.canvas.draw_idle()
+
+    # --- Crosshair overlay ---
+    def overlay(self):
+        # Playback versions under the playback line, the crosshair on top
+        return [a for a in (self.known, self.known_density, self.play_line, self.vline, self.hline) if a is not None]
+
+    def on_draw(self, event):
+        # A full draw (refresh, resize, zoom, pan) invalidates the cached background
+        if self.vline is None or not self.vline.get_animated():
+            return
+        canvas = self.canvas
+        self.background = canvas.copy_from_bbox(canvas.figure.bbox)
+        for artist in self.overlay():
+            self.ax.draw_artist(artist)
+
+    def draw_overlay(self):
+        if not self.vline.get_animated():
+            self.canvas.draw_idle()
+            return
+        if self.background is None:
+            return
+
+        # Only the overlay artists are rendered over the static chart
+        canvas = self.canvas
+        canvas.restore_region(self.background)
+        for artist in self.overlay():
+            self.ax.draw_artist(artist)
+        canvas.blit(canvas.figure.bbox)
 
     def on_motion(self, event):
+        METRICS.count("chart.motion")
+        if self.vline is None:
+            return
+
         if event.inaxes and event.guiEvent:
             x, y = event.xdata, event.ydata
 
             # Move crosshairs
             self.vline.set_xdata([x, x])
             self.hline.set_ydata([y, y])
+            self.draw_overlay()
 
-            # Redraw canvas efficiently
-            self.ax.figure.canvas.draw_idle()
-
-            # Convert values to datetime for tooltip
-            valid_dt = mdates.num2date(x)
-            trans_dt = mdates.num2date(y)
-
-            self.tooltip.showtip(
-                f"Transaction: {trans_dt:%d-%b-%Y}\nValid: {valid_dt:%d-%b-%Y}",
-                event.guiEvent.x_root,
-                event.guiEvent.y_root,
-            )
-
-            # Propagate to parent
-            self.parent._last_payload = {
-                "trans_dt": trans_dt.isoformat(),
-                "valid_dt": valid_dt.isoformat(),
-                "series": "DateDimension",
-            }
-            self.parent.event_generate("<<ChartMotion>>", when="tail")
+            # Everything else waits for the next frame, keeping only the latest position
+            self._pending = (x, y, event.guiEvent.x_root, event.guiEvent.y_root)
+            if self._flush_id is None:
+                self._flush_id = self.parent.after(FRAME_MS, self.flush_motion)
 
         else:
+            self._pending = None
             self.tooltip.hidetip()
             # Move crosshairs outside of view instead of clearing them
             self.vline.set_xdata([float("nan"), float("nan")])
             self.hline.set_ydata([float("nan"), float("nan")])
-            self.ax.figure.canvas.draw_idle()
+            self.draw_overlay()
+
+    @METRICS.timed("chart.hover")
+    def flush_motion(self):
+        self._flush_id = None
+        if self._pending is None:
+            return
+        x, y, x_root, y_root = self._pending
+        self._pending = None
+
+        # Convert values to datetime for tooltip
+        valid_dt = mdates.num2date(x)
+        trans_dt = mdates.num2date(y)
+
+        self.tooltip.showtip(
+            f"Transaction: {trans_dt:%d-%b-%Y}\nValid: {valid_dt:%d-%b-%Y}",
+            x_root,
+            y_root,
+        )
+
+        # Propagate to parent as naive nanoseconds, ready for the table index lookup
+        self.parent._last_payload = {
+            "trans_ns": num_to_ns(y),
+            "valid_ns": num_to_ns(x),
+            "series": "DateDimension",
+        }
+        self.parent.event_generate("<<ChartMotion>>", when="tail")
+
+# --- Small multiples ---
+class Panel:
+    """One entity's axes in a SmallMultiples figure and the history last drawn there"""
+    def __init__(self, ax, rects, density):
+        self.ax = ax
+        self.rects = rects
+        self.density = density
+        self.extents = None
+        self.verts = None
+        self.colors = None
+        self.fingerprint = None
+
+class SmallMultiples:
+    """A grid of bitemporal panels, one per entity, in a single figure with shared date axes
+
+    Panels are filled from one batched history frame split by the entity column. Each panel keeps a
+    fingerprint of what it shows, so a refresh redraws only the panels whose history changed. The
+    rectangle budget is shared by all panels and denser ones show coverage rasters sized to their
+    axes, so draw time and memory stay bounded by the figure size rather than the panel count.
+    """
+    def __init__(self, parent, title, key, entity="dept_id", figsize=(12, 6)):
+        self.parent = parent
+        self.title = title
+        self.key = key
+        self.entity = entity
+        self.panels = {}  # entity id -> Panel, in layout order
+        self.view = None  # (x0, x1, y0, y1) the panels were last filled for
+        self._fitted = None  # (x_min, y_min, horizon) the shared limits were last fitted to
+        self._detail_id = None
+        self._drawn = False
+        self._limiting = False
+
+        fig = Figure(figsize=figsize)
+        if parent is None:
+            self.canvas = FigureCanvasAgg(fig)
+            self.canvas.draw = METRICS.timed("dashboard.draw")(self.canvas.draw)
+            return
+
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk  # Tk only
+
+        canvas = FigureCanvasTkAgg(fig, master=parent)
+        canvas.draw = METRICS.timed("dashboard.draw")(canvas.draw)
+        self.canvas = canvas
+        canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
+        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_columnconfigure(0, weight=1)
+
+        toolbar = NavigationToolbar2Tk(canvas, parent, pack_toolbar=False)
+        toolbar.update()
+        toolbar.grid(row=1, column=0, sticky="ew")
+        canvas.mpl_connect("draw_event", self.on_draw)
+
+    def set_panels(self, ids):
+        """Lay out one empty panel per entity id on a grid matching the figure's aspect ratio"""
+        fig = self.canvas.figure
+        fig.clear()
+        self.panels = {}
+        self.view = None
+        self._fitted = None
+        self._drawn = False
+
+        count = max(1, len(ids))
+        width, height = fig.get_size_inches()
+        cols = min(count, int(np.ceil(np.sqrt(count * width / height))))
+        rows = -(-count // cols)
+        axes = fig.subplots(rows, cols, sharex=True, sharey=True, squeeze=False,
+                            gridspec_kw={"hspace": 0.4, "wspace": 0.1}).flat
+        fig.subplots_adjust(left=0.05, right=0.99, bottom=0.06, top=0.92)
+        fig.suptitle(self.title)
+
+        # Shared axes share one locator and formatter, so they are set once
+        first = axes[0]
+        first.xaxis_date()
+        first.yaxis_date()
+        for axis in (first.xaxis, first.yaxis):
+            axis.set_major_locator(mdates.AutoDateLocator(minticks=2, maxticks=3))
+            axis.set_major_formatter(mdates.DateFormatter("%Y"))
+
+        for i, entity_id in enumerate(ids):
+            ax = axes[i]
+            # Ticks only along the outer edge and fixed title positions: locating ticks and fitting
+            # titles around them is most of a panel's draw time
+            ax.set_title(str(entity_id), fontsize=7, pad=2, y=1.0)
+            ax.tick_params(labelsize=6)
+            if i + cols >= len(ids):
+                ax.xaxis.set_tick_params(labelbottom=True)  # nothing below it in a short last row
+            else:
+                ax.xaxis.set_visible(False)
+            if i % cols:
+                ax.yaxis.set_visible(False)
+            ax.set_autoscale_on(False)
+            rects = PolyCollection([], alpha=0.4)
+            ax.add_collection(rects, autolim=False)
+            # Added directly: imshow would re-fit the limits shared by every panel, once per panel
+            density = AxesImage(ax, cmap="Blues", alpha=0.6, interpolation="nearest", origin="lower")
+            density.set_data(np.zeros((1, 1)))
+            density.set_visible(False)
+            ax.add_image(density)
+            self.panels[entity_id] = Panel(ax, rects, density)
+        for ax in axes[len(ids):]:
+            ax.set_visible(False)
+
+        first.callbacks.connect("xlim_changed", self.on_limits)
+        first.callbacks.connect("ylim_changed", self.on_limits)
+
+    def display(self, df, ids=None, draw=True):
+        """Show df's history in the panels of ids (default every panel) and return the ids that changed
+
+        An id with no rows in df shows an empty panel. Only changed panels are redrawn, unless the
+        shared limits move, which redraws them all.
+        """
+        groups = dict(tuple(df.groupby(self.entity, sort=False, observed=True)))
+        empty = df.iloc[0:0]
+        # A year ahead of today, not of now, so the horizon only moves once a day
+        horizon = mdates.date2num(pd.Timestamp.today().normalize() + pd.Timedelta(weeks=52))
+        changed = []
+        for entity_id in self.panels if ids is None else ids:
+            panel = self.panels.get(entity_id)
+            if panel is None:
+                continue
+            group = groups.get(entity_id, empty)
+            fingerprint = (len(group), hash(group[self.key].to_numpy().tobytes()),
+                           hash(group["tran_to"].to_numpy().tobytes()))
+            if fingerprint == panel.fingerprint:
+                continue
+            panel.fingerprint = fingerprint
+            panel.extents = chart_extents(group, horizon)
+            panel.verts = rect_verts(*panel.extents)
+            panel.colors = PALETTE_RGBA[np.arange(len(group)) % len(PALETTE_RGBA)]
+            changed.append(entity_id)
+
+        if not changed:
+            return changed
+        if self.update_limits(horizon):
+            self.update_panels(self.panels)
+            if draw:
+                self.redraw()
+        else:
+            self.update_panels(changed)
+            if draw:
+                self.redraw(changed)
+        return changed
+
+    def update_limits(self, horizon):
+        """Widen the shared limits to every panel's history; return whether they moved
+
+        The limits are only refitted when the history reaches past them, so refreshes that stay
+        inside keep the user's zoom and pan.
+        """
+        drawn = [p.extents for p in self.panels.values() if p.extents is not None and len(p.extents[0])]
+        if not drawn:
+            return False
+
+        # A year either side, in date-number days, as in Chart
+        x_min = min(e[0].min() for e in drawn) - 52 * 7
+        y_min = min(e[2].min() for e in drawn) - 52 * 7
+        if self._fitted is not None:
+            fitted_x, fitted_y, fitted_horizon = self._fitted
+            if x_min >= fitted_x and y_min >= fitted_y and horizon <= fitted_horizon:
+                return False
+            x_min, y_min, horizon = min(x_min, fitted_x), min(y_min, fitted_y), max(horizon, fitted_horizon)
+        self._fitted = (x_min, y_min, horizon)
+        self.view = (x_min, horizon, y_min, horizon)
+        first = next(iter(self.panels.values())).ax
+        self._limiting = True
+        try:
+            first.set_xlim(x_min, horizon)
+            first.set_ylim(y_min, horizon)
+        finally:
+            self._limiting = False
+        return True
+
+    def update_panels(self, ids):
+        """Refill the panels of ids for the current view"""
+        if self.view is None:
+            return
+        max_rects = max(1, LOD_MAX_RECTS // len(self.panels))
+        for entity_id in ids:
+            panel = self.panels[entity_id]
+            if panel.extents is None:
+                continue
+            ax = panel.ax
+            shape = (max(1, int(ax.bbox.height)), max(1, int(ax.bbox.width)))
+            show_detail(panel.rects, panel.density, panel.extents, panel.verts, panel.colors,
+                        self.view, shape, max_rects)
+
+    def redraw(self, ids=None):
+        """Redraw the panels of ids in place, or the whole figure when ids is None"""
+        if self.parent is None:
+            return  # headless: saving the figure renders it
+        canvas = self.canvas
+        if ids is None or not self._drawn or not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+        for entity_id in ids:
+            ax = self.panels[entity_id].ax
+            ax.redraw_in_frame()
+            canvas.blit(ax.bbox)
+
+    def on_draw(self, event):
+        self._drawn = True
+
+    def on_limits(self, ax):
+        # Zoom and pan move all shared panels; refill them once, before the pending redraw
+        if self._limiting:
+            return
+        if self.parent is None:
+            self.refresh_detail()
+        elif self._detail_id is None:
+            self._detail_id = self.parent.after_idle(self.refresh_detail)
+
+    def refresh_detail(self):
+        self._detail_id = None
+        if not self.panels:
+            return
+        ax = next(iter(self.panels.values())).ax
+        view = (*sorted(ax.get_xlim()), *sorted(ax.get_ylim()))
+        if view == self.view:
+            return
+        self.view = view
+        self.update_panels(self.panels)
+        self.redraw()
+
+class StatsPanel:
+    """Live table of the METRICS timers and counters; per_sec is the call rate since the last refresh"""
+    COLUMNS = ["name", "calls", "per_sec", "mean_ms", "max_ms", "last_ms", "rows", "bytes"]
+
+    def __init__(self, parent, metrics):
+        self.parent = parent
+        self.metrics = metrics
+        self._previous = ({}, time.monotonic())
+        self._after_id = None
+
+        tree = ttk.Treeview(parent, columns=self.COLUMNS, show="headings")
+        for column in self.COLUMNS:
+            tree.heading(column, text=column)
+            tree.column(column, width=220 if column == "name" else 90, anchor="w" if column == "name" else "e")
+        tree.grid(row=0, column=0, sticky="nsew")
+        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_columnconfigure(0, weight=1)
+        self.tree = tree
+
+        reset_btn = tk.Button(parent, text="Reset", command=self.reset)
+        reset_btn.grid(row=1, column=0, sticky="e", padx=5, pady=5)
+        self.refresh()
+
+    def refresh(self):
+        self._after_id = None
+        calls, since = self._previous
+        now = time.monotonic()
+        stats = self.metrics.snapshot()
+        shown = set(self.tree.get_children())
+        for stat in stats:
+            name = stat["name"]
+            rate = (stat["calls"] - calls.get(name, 0)) / max(now - since, 1e-9)
+            values = (name, stat["calls"], f"{rate:.1f}", f"{stat['mean_ms']:.2f}", f"{stat['max_ms']:.2f}",
+                      f"{stat['last_ms']:.2f}", stat["rows"], stat["bytes"])
+            if name in shown:
+                self.tree.item(name, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=name, values=values)
+        stale = shown - {stat["name"] for stat in stats}
+        if stale:
+            self.tree.delete(*stale)
+        self._previous = ({stat["name"]: stat["calls"] for stat in stats}, now)
+        self._after_id = self.parent.after(STATS_MS, self.refresh)
+
+    def reset(self):
+        self.metrics.reset()
+        self._previous = ({}, time.monotonic())
+
+    def close(self):
+        if self._after_id is not None:
+            self.parent.after_cancel(self._after_id)
+            self._after_id = None
+
+def load_icon(path, size, cache_dir):
+    """Return path as a size x size Tk image, resized once and cached as a PNG Tk reads natively"""
+    cached = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{size}.png")
+    if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path):
+        from PIL import Image  # only when the cache is cold
+
+        os.makedirs(cache_dir, exist_ok=True)
+        image = Image.open(path).resize((size, size), Image.Resampling.LANCZOS)
+        image.save(f"{cached}.tmp", format="PNG")
+        os.replace(f"{cached}.tmp", cached)
+    return tk.PhotoImage(file=cached)
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
 
-        self.engine = DataEngine(CONNECTION_STRING)
+        # Created by start() once the window has painted, along with the first fetch
+        self.engine = None
+        self._unsubscribe = lambda: None
+
+        # Statements run one at a time in order; fetches run side by side on the engine's pool
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._loader = ThreadPoolExecutor(max_workers=2)
+        self._generation = 0  # numbers every fetch whose result may be displayed, in the order they start
+        self._load_gen = 0  # generation of the latest full load
+        self._pending = []
 
         self.title(APP_TITLE)
         self.geometry("1700x800")
@@ -524,10 +3020,40 @@ class App(tk.Tk):
         self.create_footer()
 
         self.bind_all("<<ChartMotion>>", self.handle_chart_motion)
-
-        # --- Initial plot ---
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # History table -> (query, chart, table) showing it, and the frame last drawn there
+        self.views = {
+            HistoryTable.DEPARTMENT: (SqlCommands.FETCH_DEPT.value, self.department_chart, self.department_table.tree),
+            HistoryTable.EMPLOYEE: (SqlCommands.FETCH_EMP.value, self.employee_chart, self.employee_table.tree),
+        }
+        self._shown = dict.fromkeys(HistoryTable)
+        self._coalesced = {}  # HistoryTable -> row reduction shown in the footer
+        self._shown_gen = dict.fromkeys(HistoryTable, 0)  # generation of the frame drawn in each view
+        self.dashboard = None
+        self.stats = None
+        self._diff = None  # (tran_before, tran_after) highlighted in the charts
+        self._playback = False  # charts show the versions known at the scrubber's transaction time
+        self._play_id = None
+
+        self._changed = {}  # HistoryTable -> dept_ids, None when unknown
+        self._changed_at = 0.0
+        self._changed_lock = threading.Lock()
+
+        # Idle callbacks run in order, so the shell's pending redraws come first
+        self.after_idle(self.start)
+
+    def start(self):
+        self.engine = DataEngine(CONNECTION_STRING, snapshot_dir=SNAPSHOT_DIR)
+
+        # --- Initial plot: cached snapshot first, then refresh in the background ---
+        self.render_snapshot()
         self.plot_data()
 
+        # --- Other writers' changes: collected off-thread, refreshed after a quiet spell ---
+        self._unsubscribe = self.engine.subscribe(self.on_history_changed)
+        self.after(DEBOUNCE_MS, self.check_changes)
+
     def create_header(self):
         header_frame = ttk.Frame(self, padding=5)
         header_frame.grid(row=0, column=0, sticky="ew")  # Sticks east-west
@@ -538,11 +3064,7 @@ class App(tk.Tk):
 
         # --- Right-aligned PNG info icon ---
         png_file = "info_icon.png"  # Path to your pre-made PNG file
-
-        image = Image.open(png_file)
-        # Resize if necessary (optional)
-        image = image.resize((24, 24), Image.Resampling.LANCZOS)
-        tk_image = ImageTk.PhotoImage(image)
+        tk_image = load_icon(png_file, 24, SNAPSHOT_DIR)
 
         info_icon_label = tk.Label(header_frame, image=tk_image, cursor="hand2")
         info_icon_label.image = tk_image  # Keep reference
@@ -583,14 +3105,14 @@ class App(tk.Tk):
         department_table_frame = tk.Frame(paned)
         department_table_frame.rowconfigure(0, weight=1)
         department_table_frame.columnconfigure(0, weight=1)
-        self.department_table = TableContainer(department_table_frame, "Department bi-temporal table", DEPT_COLUMNS)
+        self.department_table = TableContainer(department_table_frame, "Department bi-temporal table", DEPT_COLUMNS, virtual=True)
         paned.add(department_table_frame, stretch="always")
 
         # --- Employee Table Frame ---
         employee_table_frame = tk.Frame(paned)
         employee_table_frame.rowconfigure(0, weight=1)
         employee_table_frame.columnconfigure(0, weight=1)
-        self.employee_table = TableContainer(employee_table_frame, "Employee bi-temporal table", EMP_COLUMNS)
+        self.employee_table = TableContainer(employee_table_frame, "Employee bi-temporal table", EMP_COLUMNS, virtual=True)
         paned.add(employee_table_frame, stretch="always")
 
     def create_footer(self):
@@ -603,14 +3125,38 @@ class App(tk.Tk):
         update1_btn = tk.Button(footer_frame, text="Update #1")
         update2_btn = tk.Button(footer_frame, text="Update #2")
         update3_btn = tk.Button(footer_frame, text="Update #3")
+        self.play_btn = tk.Button(footer_frame, text="Play", width=5)
+        self.play_var = tk.DoubleVar()
+        self.play_scale = ttk.Scale(footer_frame, orient=tk.HORIZONTAL, length=300, variable=self.play_var)
+        self.play_label = ttk.Label(footer_frame, text="", width=11)
+        stop_btn = tk.Button(footer_frame, text="Stop")
         refresh_btn = tk.Button(footer_frame, text="Refresh")
+        dashboard_btn = tk.Button(footer_frame, text="All Departments")
+        stats_btn = tk.Button(footer_frame, text="Stats")
+        diff_btn = tk.Button(footer_frame, text="Diff")
+        self.coalesce_var = tk.BooleanVar(value=False)
+        coalesce_chk = ttk.Checkbutton(footer_frame, text="Coalesce", variable=self.coalesce_var)
 
         # --- Pack buttons ---
         reset_btn.pack(side=tk.LEFT, padx=5, pady=5)
         update1_btn.pack(side=tk.LEFT, padx=5, pady=5)
         update2_btn.pack(side=tk.LEFT, padx=5, pady=5)
         update3_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        self.play_btn.pack(side=tk.LEFT, padx=(20, 5), pady=5)
+        self.play_scale.pack(side=tk.LEFT, padx=5, pady=5)
+        self.play_label.pack(side=tk.LEFT, padx=5, pady=5)
+        stop_btn.pack(side=tk.LEFT, padx=5, pady=5)
         refresh_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+        dashboard_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+        stats_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+        diff_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+        coalesce_chk.pack(side=tk.RIGHT, padx=5, pady=5)
+
+        # --- Loading state ---
+        self.status_label = ttk.Label(footer_frame, text="")
+        self.status_label.pack(side=tk.RIGHT, padx=5, pady=5)
+        self.coalesce_label = ttk.Label(footer_frame, text="")
+        self.coalesce_label.pack(side=tk.RIGHT, padx=5, pady=5)
 
         # --- Assign commands ---
         reset_btn.config(command=lambda: [
@@ -631,40 +3177,324 @@ class App(tk.Tk):
             update3_btn.config(state="disabled"),
             self.data_change(SqlCommands.UPDATE3.value)
         ])
+        self.play_btn.config(command=self.toggle_play)
+        self.play_scale.config(command=lambda value: self.scrub(float(value)))
+        stop_btn.config(command=self.stop_playback)
         refresh_btn.config(command=self.plot_data)
+        dashboard_btn.config(command=self.open_dashboard)
+        stats_btn.config(command=self.open_stats)
+        diff_btn.config(command=self.choose_diff)
+        coalesce_chk.config(command=self.redisplay)
 
         # --- Tooltips ---
         BtnToolTip(reset_btn, "Reset the database data and refresh the charts and tables")
         BtnToolTip(update1_btn, SqlCommands.UPDATE1.value)
         BtnToolTip(update2_btn, SqlCommands.UPDATE2.value)
         BtnToolTip(update3_btn, SqlCommands.UPDATE3.value)
+        BtnToolTip(self.play_btn, "Play the history through transaction time, or pause it")
+        BtnToolTip(self.play_scale, "Drag to show the versions known at a transaction date")
+        BtnToolTip(stop_btn, "Leave playback and show the whole history again")
         BtnToolTip(refresh_btn, "Refresh the charts and tables from the database")
+        BtnToolTip(dashboard_btn, "Show every department's employee history side by side")
+        BtnToolTip(stats_btn, "Show query, drawing and table timings for this session")
+        BtnToolTip(diff_btn, "Highlight what changed in the history between two transaction dates")
+        BtnToolTip(coalesce_chk, "Merge adjacent versions with identical values in the charts and tables")
 
 
     # --- Plotting function ---
     def plot_data(self):
-        dfDept = self.engine.sql_fetch(SqlCommands.FETCH_DEPT.value)
-        dfEmp = self.engine.sql_fetch(SqlCommands.FETCH_EMP.value)
+        # A newer load supersedes anything still in flight
+        self._generation += 1
+        generation = self._load_gen = self._generation
+        for future in self._pending:
+            future.cancel()
+
+        self._pending = [
+            self._loader.submit(self.engine.fetch_history, SqlCommands.FETCH_DEPT.value, "dept_hist_id", {"dept_id": DEPT_ID}),
+            self._loader.submit(self.engine.fetch_history, SqlCommands.FETCH_EMP.value, "emp_hist_id", {"dept_id": DEPT_ID}),
+        ]
+        self.set_loading(True)
+        self.when_done(self._pending, lambda futures: self.render_data(generation, futures))
+
+    def render_data(self, generation, futures):
+        # Results of a superseded load are discarded
+        if generation != self._load_gen:
+            return
+        self.set_loading(False)
+
+        try:
+            dfDept, dfEmp = (future.result() for future in futures)
+        except Exception as e:
+            messagebox.showerror(APP_TITLE, f"Failed to load data:\n{e}")
+            return
 
-        self.department_chart.display_chart(dfDept)
-        self.employee_chart.display_chart(dfEmp)
+        self.display_data(generation, dfDept, dfEmp)
 
-        self.department_table.tree.display_table(dfDept)
-        self.employee_table.tree.display_table(dfEmp)
+    def render_snapshot(self):
+        # Draw the last session's data straight from disk; plot_data then validates it
+        dfDept = self.engine.load_snapshot(SqlCommands.FETCH_DEPT.value, "dept_hist_id", {"dept_id": DEPT_ID})
+        dfEmp = self.engine.load_snapshot(SqlCommands.FETCH_EMP.value, "emp_hist_id", {"dept_id": DEPT_ID})
+        if dfDept is not None and dfEmp is not None:
+            self._generation += 1
+            self.display_data(self._generation, dfDept, dfEmp)
+
+    def display_data(self, generation, dfDept, dfEmp):
+        self.show_result(HistoryTable.DEPARTMENT, generation, dfDept)
+        self.show_result(HistoryTable.EMPLOYEE, generation, dfEmp)
+
+    def show_result(self, table, generation, df):
+        # Loads and refreshes finish out of order; a view only ever moves on to a later fetch
+        if generation <= self._shown_gen[table]:
+            return
+        self._shown_gen[table] = generation
+        # An unchanged history comes back as the very frame already drawn
+        if df is not self._shown[table]:
+            self.show_view(table, df)
+
+    def show_view(self, table, df):
+        # _shown keeps the fetched frame; coalescing is a display option applied on the way in
+        self._shown[table] = df
+        if self.coalesce_var.get():
+            df, stats = coalesce(df, table.key)
+            self._coalesced[table] = f"{table.name.title()} {stats['rows']} -> {stats['coalesced']}"
+        else:
+            self._coalesced.pop(table, None)
+        _, chart, tree = self.views[table]
+        chart.display_chart(df, draw=self._diff is None)
+        if self._diff is not None:
+            # Against the fetched versions, so spans name the stored *_hist_id
+            diff = history_diff(self._shown[table], table.key, CORRECTIONS[table].entity, *self._diff)
+            chart.show_diff(diff, *self._diff)
+        if self._playback:
+            chart.start_playback()
+            chart.seek(self.play_var.get())
+        tree.update_table(df, table.key)
+        self.coalesce_label.config(text="Rows: " + ", ".join(self._coalesced.values()) if self._coalesced else "")
+
+    def redisplay(self):
+        for table, df in self._shown.items():
+            if df is not None:
+                self.show_view(table, df)
+
+    def choose_diff(self):
+        # Cancelling either date clears the highlight
+        today = pd.Timestamp.today()
+        before = simpledialog.askstring(APP_TITLE, "Diff from transaction date (YYYY-MM-DD):", parent=self,
+                                        initialvalue=f"{today - pd.DateOffset(years=1):%Y-%m-%d}")
+        after = before and simpledialog.askstring(APP_TITLE, "To transaction date (YYYY-MM-DD):", parent=self,
+                                                  initialvalue=f"{today:%Y-%m-%d}")
+        try:
+            self._diff = (pd.Timestamp(before), pd.Timestamp(after)) if after else None
+        except ValueError as e:
+            messagebox.showerror(APP_TITLE, f"Invalid date:\n{e}")
+            return
+        self.redisplay()
+
+    # --- Transaction-time playback ---
+    def start_playback(self):
+        # Events are sorted once per chart here; scrubbing and playing only seek
+        # Only charts with versions have a transaction range to play through
+        charts = [chart for table, (_, chart, _) in self.views.items()
+                  if self._shown[table] is not None and len(self._shown[table])]
+        if not charts:
+            return False
+        for chart in charts:
+            chart.start_playback()
+        first = min(float(chart.playback.times[0]) for chart in charts)
+        self.play_scale.config(from_=first, to=mdates.date2num(pd.Timestamp.now()))
+        self._playback = True
+        return True
+
+    def toggle_play(self):
+        if self._play_id is not None:
+            self.pause()
+        elif self._playback or self.start_playback():
+            if self.play_var.get() >= float(self.play_scale.cget("to")):
+                self.play_var.set(float(self.play_scale.cget("from")))  # replay from the start
+            self.play_btn.config(text="Pause")
+            self._play_id = self.after(FRAME_MS, self.play_step)
+
+    def play_step(self):
+        low, high = float(self.play_scale.cget("from")), float(self.play_scale.cget("to"))
+        y = min(high, self.play_var.get() + (high - low) * FRAME_MS / PLAYBACK_MS)
+        self.play_var.set(y)  # the variable, not the widget command, so this does not re-enter scrub
+        self.seek(y)
+        if y < high:
+            self._play_id = self.after(FRAME_MS, self.play_step)
+        else:
+            self._play_id = None
+            self.play_btn.config(text="Play")
+
+    def pause(self):
+        if self._play_id is not None:
+            self.after_cancel(self._play_id)
+            self._play_id = None
+        self.play_btn.config(text="Play")
+
+    def scrub(self, y):
+        if self._playback or self.start_playback():
+            self.seek(y)
+
+    def seek(self, y):
+        self.play_label.config(text=f"{mdates.num2date(y):%Y-%m-%d}")
+        for _, chart, _ in self.views.values():
+            chart.seek(y)
+
+    def stop_playback(self):
+        self.pause()
+        self._playback = False
+        self.play_label.config(text="")
+        for _, chart, _ in self.views.values():
+            chart.stop_playback()
+
+    # --- Change notifications ---
+    def on_history_changed(self, changes):
+        # Called on the engine's watcher thread; only record what changed
+        with self._changed_lock:
+            for table, dept_ids in changes.items():
+                known = self._changed.get(table, set())
+                self._changed[table] = None if known is None or dept_ids is None else known | set(dept_ids)
+            self._changed_at = time.monotonic()
+
+    def check_changes(self):
+        with self._changed_lock:
+            changes = {}
+            if self._changed and time.monotonic() - self._changed_at >= DEBOUNCE_MS / 1000:
+                changes, self._changed = self._changed, {}
+        tables = {table for table, dept_ids in changes.items() if dept_ids is None or DEPT_ID in dept_ids}
+        if tables:
+            self.refresh_views(tables)
+        if self.dashboard is not None and HistoryTable.EMPLOYEE in changes:
+            dept_ids = changes[HistoryTable.EMPLOYEE]
+            self.refresh_dashboard(None if dept_ids is None else sorted(dept_ids))
+        self.after(DEBOUNCE_MS, self.check_changes)
+
+    def refresh_views(self, tables):
+        for table in tables:
+            sql = self.views[table][0]
+            self._generation += 1
+            generation = self._generation
+            future = self._loader.submit(self.engine.fetch_history, sql, table.key, {"dept_id": DEPT_ID})
+            self.when_done([future], lambda futures, table=table, generation=generation:
+                           self.render_view(table, generation, futures[0]))
+
+    def render_view(self, table, generation, future):
+        try:
+            df = future.result()
+        except Exception:
+            return  # the next notification or Refresh tries again
+        self.show_result(table, generation, df)
+
+    # --- All departments ---
+    def open_dashboard(self):
+        if self.dashboard is not None:
+            self.dashboard.parent.winfo_toplevel().lift()
+            return
+        window = tk.Toplevel(self)
+        window.title(f"{APP_TITLE} - All Departments")
+        window.geometry("1700x900")
+        window.grid_rowconfigure(0, weight=1)
+        window.grid_columnconfigure(0, weight=1)
+        frame = tk.Frame(window)
+        frame.grid(row=0, column=0, sticky="nsew")
+        self.dashboard = SmallMultiples(frame, "Employee history by department", "emp_hist_id", figsize=(17, 9))
+        window.protocol("WM_DELETE_WINDOW", self.close_dashboard)
+        self.refresh_dashboard()
+
+    def close_dashboard(self):
+        window = self.dashboard.parent.winfo_toplevel()
+        self.dashboard = None
+        window.destroy()
+
+    def open_stats(self):
+        if self.stats is not None:
+            self.stats.parent.winfo_toplevel().lift()
+            return
+        window = tk.Toplevel(self)
+        window.title(f"{APP_TITLE} - Stats")
+        window.geometry("900x400")
+        window.grid_rowconfigure(0, weight=1)
+        window.grid_columnconfigure(0, weight=1)
+        frame = tk.Frame(window)
+        frame.grid(row=0, column=0, sticky="nsew")
+        self.stats = StatsPanel(frame, METRICS)
+        window.protocol("WM_DELETE_WINDOW", self.close_stats)
+
+    def close_stats(self):
+        window = self.stats.parent.winfo_toplevel()
+        self.stats.close()
+        self.stats = None
+        window.destroy()
+
+    def refresh_dashboard(self, dept_ids=None):
+        # None reloads every department, picking up new ones; otherwise only dept_ids are fetched
+        future = self._loader.submit(self.fetch_dashboard, dept_ids)
+        self.when_done([future], lambda futures: self.render_dashboard(dept_ids, futures[0]))
+
+    def fetch_dashboard(self, dept_ids):
+        if dept_ids is None:
+            dept_ids = self.engine.sql_fetch(SqlCommands.DEPT_IDS.value)["dept_id"].tolist()
+        return dept_ids, self.engine.fetch_entities(HistoryTable.EMPLOYEE, "dept_id", dept_ids)
+
+    def render_dashboard(self, requested, future):
+        dashboard = self.dashboard
+        if dashboard is None:
+            return
+        try:
+            dept_ids, df = future.result()
+        except Exception as e:
+            if not dashboard.panels:
+                messagebox.showerror(APP_TITLE, f"Failed to load departments:\n{e}")
+            return
+        if requested is None and dept_ids != list(dashboard.panels):
+            dashboard.set_panels(dept_ids)
+        dashboard.display(df, dept_ids)
 
     def data_change(self, action):
-        self.engine.sql_execute(action)
+        self.set_loading(True)
+        future = self._writer.submit(self.engine.sql_execute, action)
+        self.when_done([future], lambda futures: self.data_changed(action, futures[0]))
+
+    def data_changed(self, action, future):
+        try:
+            future.result()
+        except Exception as e:
+            messagebox.showerror(APP_TITLE, f"Failed to apply change:\n{e}")
+        if action == SqlCommands.RESET.value:
+            self.engine.invalidate()
         self.plot_data()
 
+    # --- Background work delivered back on the Tk thread ---
+    def when_done(self, futures, callback):
+        if all(future.done() for future in futures):
+            callback(futures)
+        else:
+            self.after(POLL_MS, self.when_done, futures, callback)
+
+    def set_loading(self, loading):
+        self.status_label.config(text="Loading..." if loading else "")
+        self.config(cursor="watch" if loading else "")
+
+    def on_close(self):
+        self.pause()
+        if self.stats is not None:
+            self.stats.close()
+        METRICS.close_log()
+        self._unsubscribe()
+        self._writer.shutdown(wait=False, cancel_futures=True)
+        self._loader.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
     # --- Handler for <<Chart Motion>> ---
     def handle_chart_motion(self, event):
         dates = getattr(event.widget, "_last_payload", None)
         if dates:
-            trans_dt = datetime.fromisoformat(dates['trans_dt'])
-            valid_dt = datetime.fromisoformat(dates['valid_dt'])
-            self.department_table.tree.select_row("dept_hist_id", trans_dt, valid_dt)
-            self.employee_table.tree.select_row("emp_hist_id", trans_dt, valid_dt)
+            trans_ns = dates['trans_ns']
+            valid_ns = dates['valid_ns']
+            self.department_table.tree.select_row("dept_hist_id", trans_ns, valid_ns)
+            self.employee_table.tree.select_row("emp_hist_id", trans_ns, valid_ns)
 
 if __name__ == "__main__":
+    matplotlib.use("TkAgg")  # ensure TkAgg backend for Tkinter embedding; headless use keeps the default
     app = App()
     app.mainloop()
\ No newline at end of file
@@ -82,6 +82,95 @@ CREATE TABLE dbo.employee (
         REFERENCES dbo.department_master(dept_id)
 );
 
+-- ============================================================
+-- Batch Correction Staging Tables
+-- One row per correction; NULL attributes keep the current value
+-- ============================================================
+CREATE TABLE dbo.department_staging (
+    batch_id       VARCHAR(36) NOT NULL,
+    row_no         INT NOT NULL,
+    dept_id        INT NOT NULL,
+    dept_name      VARCHAR(200),
+    location       VARCHAR(200),
+    valid_from     TIMESTAMP WITH TIME ZONE NOT NULL,
+    affect_hist_id BIGINT,
+    outcome        VARCHAR(30),
+    CONSTRAINT pk_department_staging PRIMARY KEY (batch_id, row_no)
+);
+
+CREATE TABLE dbo.employee_staging (
+    batch_id       VARCHAR(36) NOT NULL,
+    row_no         INT NOT NULL,
+    emp_id         INT NOT NULL,
+    first_name     VARCHAR(100),
+    last_name      VARCHAR(100),
+    job_title      VARCHAR(200),
+    hire_date      DATE,
+    term_date      DATE,
+    valid_from     TIMESTAMP WITH TIME ZONE NOT NULL,
+    affect_hist_id BIGINT,
+    outcome        VARCHAR(30),
+    CONSTRAINT pk_employee_staging PRIMARY KEY (batch_id, row_no)
+);
+
+-- ============================================================
+-- History Archive Tables
+-- Closed versions moved out of the live tables by the offline
+-- compaction job, with value-equivalent neighbours merged
+-- ============================================================
+CREATE TABLE dbo.department_archive (
+    dept_hist_id BIGINT PRIMARY KEY,
+    dept_id      INT NOT NULL,
+    dept_name    VARCHAR(200) NOT NULL,
+    location     VARCHAR(200),
+    valid_from   TIMESTAMP WITH TIME ZONE NOT NULL,
+    valid_to     TIMESTAMP WITH TIME ZONE NOT NULL,
+    tran_from    TIMESTAMP WITH TIME ZONE NOT NULL,
+    tran_to      TIMESTAMP WITH TIME ZONE NOT NULL,
+    CONSTRAINT uq_department_archive_version UNIQUE (dept_id, valid_from, tran_from),
+    CONSTRAINT fk_department_archive_master FOREIGN KEY (dept_id) 
+        REFERENCES dbo.department_master(dept_id)
+);
+
+CREATE TABLE dbo.employee_archive (
+    emp_hist_id  BIGINT PRIMARY KEY,
+    emp_id       INT NOT NULL,
+    dept_id      INT NOT NULL,
+    first_name   VARCHAR(100) NOT NULL,
+    last_name    VARCHAR(100) NOT NULL,
+    job_title    VARCHAR(200),
+    hire_date    DATE NOT NULL,
+    term_date    DATE,
+    valid_from   TIMESTAMP WITH TIME ZONE NOT NULL,
+    valid_to     TIMESTAMP WITH TIME ZONE NOT NULL,
+    tran_from    TIMESTAMP WITH TIME ZONE NOT NULL,
+    tran_to      TIMESTAMP WITH TIME ZONE NOT NULL,
+    CONSTRAINT uq_employee_archive_version UNIQUE (emp_id, valid_from, tran_from),
+    CONSTRAINT fk_employee_archive_department FOREIGN KEY (dept_id) 
+        REFERENCES dbo.department_master(dept_id)
+);
+
+-- ============================================================
+-- Full History Views
+-- Live and archived versions; read by the app and the as-of functions
+-- ============================================================
+CREATE VIEW dbo.department_history
+AS
+SELECT dept_hist_id, dept_id, dept_name, location, valid_from, valid_to, tran_from, tran_to
+FROM dbo.department
+UNION ALL
+SELECT dept_hist_id, dept_id, dept_name, location, valid_from, valid_to, tran_from, tran_to
+FROM dbo.department_archive;
+
+CREATE VIEW dbo.employee_history
+AS
+SELECT emp_hist_id, emp_id, dept_id, first_name, last_name, job_title, hire_date, term_date,
+       valid_from, valid_to, tran_from, tran_to
+FROM dbo.employee
+UNION ALL
+SELECT emp_hist_id, emp_id, dept_id, first_name, last_name, job_title, hire_date, term_date,
+       valid_from, valid_to, tran_from, tran_to
+FROM dbo.employee_archive;
 
 -- ============================================================
 -- Reset Data Procedure (schema-qualified)
@@ -91,6 +180,8 @@ LANGUAGE plpgsql
 AS $$
 BEGIN
     -- Delete all data
+    DELETE FROM dbo.employee_archive;
+    DELETE FROM dbo.department_archive;
     DELETE FROM dbo.employee;
     DELETE FROM dbo.department;
     DELETE FROM dbo.department_master;
@@ -122,6 +213,10 @@ BEGIN
         (100, 10, 'Alice', 'Smith', 'Sales Rep', '2017-01-01'::date, '2020-01-01'::timestamptz, '2021-01-01'::timestamptz, '2021-02-01'::timestamptz, dbo.fn_infinity()),
         (100, 10, 'Alice', 'Smith-Jones', 'Sales Rep', '2017-01-01'::date, '2021-01-01'::timestamptz, dbo.fn_infinity(), '2021-02-01'::timestamptz, dbo.fn_infinity()),
         (101, 20, 'Bob', 'Jones', 'Accountant', '2018-01-01'::date, '2019-03-01'::timestamptz, dbo.fn_infinity(), '2019-12-01'::timestamptz, dbo.fn_infinity());
+
+    -- Tell listeners every department changed
+    PERFORM pg_notify('bitemporal_changes', json_build_object('table', 'department', 'dept_id', NULL)::text);
+    PERFORM pg_notify('bitemporal_changes', json_build_object('table', 'employee', 'dept_id', NULL)::text);
 END;
 $$;
 
@@ -140,6 +235,19 @@ DECLARE
 	affect_dept_hist_id BIGINT;
 BEGIN
 
+    -- Batch corrections close versions directly, set-based: only tran_to of an open version may change
+    IF current_setting('bitemporal.batch', true) = 'on' THEN
+        IF 
+            OLD.tran_to <> dbo.fn_infinity()
+        OR
+            (NEW.dept_hist_id, NEW.dept_id, NEW.dept_name, NEW.location, NEW.valid_from, NEW.valid_to, NEW.tran_from) IS DISTINCT FROM
+            (OLD.dept_hist_id, OLD.dept_id, OLD.dept_name, OLD.location, OLD.valid_from, OLD.valid_to, OLD.tran_from)
+        THEN
+            RAISE EXCEPTION 'Batch updates may only close an open version.';
+        END IF;
+        RETURN NEW;
+    END IF;
+
     -- Disallow updates to dept_id, tran_from, tran_to & valid_to
     IF 
 		NEW.dept_id <> OLD.dept_id 
@@ -226,6 +334,9 @@ BEGIN
 	        dbo.fn_infinity()
 	    );
 	
+	    -- Tell listeners; delivered on commit, duplicates within a transaction folded
+	    PERFORM pg_notify('bitemporal_changes', json_build_object('table', 'department', 'dept_id', OLD.dept_id)::text);
+	
 	    -- 3.c Close the old version
 		NEW.dept_name = OLD.dept_name;
 		NEW.location = OLD.location;
@@ -255,6 +366,19 @@ DECLARE
 	affect_emp_hist_id BIGINT;
 BEGIN
 
+    -- Batch corrections close versions directly, set-based: only tran_to of an open version may change
+    IF current_setting('bitemporal.batch', true) = 'on' THEN
+        IF 
+            OLD.tran_to <> dbo.fn_infinity()
+        OR
+            (NEW.emp_hist_id, NEW.emp_id, NEW.dept_id, NEW.first_name, NEW.last_name, NEW.job_title, NEW.hire_date, NEW.term_date, NEW.valid_from, NEW.valid_to, NEW.tran_from) IS DISTINCT FROM
+            (OLD.emp_hist_id, OLD.emp_id, OLD.dept_id, OLD.first_name, OLD.last_name, OLD.job_title, OLD.hire_date, OLD.term_date, OLD.valid_from, OLD.valid_to, OLD.tran_from)
+        THEN
+            RAISE EXCEPTION 'Batch updates may only close an open version.';
+        END IF;
+        RETURN NEW;
+    END IF;
+
     -- Disallow updates to emp_id, tran_from, tran_to & valid_to
     IF 
 		NEW.emp_id <> OLD.emp_id 
@@ -357,6 +481,9 @@ BEGIN
 	        dbo.fn_infinity()
 	    );
 	
+	    -- Tell listeners; delivered on commit, duplicates within a transaction folded
+	    PERFORM pg_notify('bitemporal_changes', json_build_object('table', 'employee', 'dept_id', OLD.dept_id)::text);
+	
 	    -- 3.c Close the old version
 		NEW.dept_id = OLD.dept_id;
 		NEW.first_name = OLD.first_name;
@@ -378,6 +505,194 @@ BEFORE UPDATE ON dbo.employee
 FOR EACH ROW
 EXECUTE FUNCTION dbo.tr_employee_update();
 
+-- ============================================================
+-- Department Batch Corrections
+-- Applies every correction staged under batch_id in one pass with a
+-- single transaction timestamp: backfill, close old version, insert new
+-- ============================================================
+CREATE OR REPLACE PROCEDURE dbo.apply_department_corrections(batch VARCHAR(36))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    now_ts TIMESTAMP := NOW();
+BEGIN
+    -- 1. Only the first correction per department in a batch is applied
+    UPDATE dbo.department_staging s
+    SET outcome = 'duplicate'
+    WHERE s.batch_id = batch
+      AND EXISTS (
+          SELECT 1
+          FROM dbo.department_staging f
+          WHERE f.batch_id = s.batch_id AND f.dept_id = s.dept_id AND f.row_no < s.row_no
+      );
+
+    -- 2. Find the current version each correction affects
+    UPDATE dbo.department_staging s
+    SET affect_hist_id = d.dept_hist_id
+    FROM dbo.department d
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL
+      AND d.dept_id = s.dept_id
+      AND s.valid_from >= d.valid_from
+      AND s.valid_from < d.valid_to
+      AND d.tran_to = dbo.fn_infinity();
+
+    UPDATE dbo.department_staging
+    SET outcome = 'no_current_version'
+    WHERE batch_id = batch
+      AND outcome IS NULL
+      AND affect_hist_id IS NULL;
+
+    -- 3. Backfill records
+    INSERT INTO dbo.department
+        (dept_id, dept_name, location, valid_from, valid_to, tran_from, tran_to)
+    SELECT
+        d.dept_id, d.dept_name, d.location, d.valid_from, s.valid_from, now_ts, dbo.fn_infinity()
+    FROM dbo.department_staging s
+    JOIN dbo.department d ON d.dept_hist_id = s.affect_hist_id
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL
+      AND d.valid_from <> s.valid_from;
+
+    -- 4. Close old versions (the setting is local to this transaction)
+    PERFORM set_config('bitemporal.batch', 'on', true);
+
+    UPDATE dbo.department d
+    SET tran_to = now_ts
+    FROM dbo.department_staging s
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL
+      AND d.dept_hist_id = s.affect_hist_id;
+
+    PERFORM set_config('bitemporal.batch', 'off', true);
+
+    -- 5. Insert new versions
+    INSERT INTO dbo.department
+        (dept_id, dept_name, location, valid_from, valid_to, tran_from, tran_to)
+    SELECT
+        s.dept_id,
+        COALESCE(s.dept_name, d.dept_name),
+        COALESCE(s.location, d.location),
+        s.valid_from,
+        d.valid_to,
+        now_ts,
+        dbo.fn_infinity()
+    FROM dbo.department_staging s
+    JOIN dbo.department d ON d.dept_hist_id = s.affect_hist_id
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL;
+
+    UPDATE dbo.department_staging
+    SET outcome = 'applied'
+    WHERE batch_id = batch
+      AND outcome IS NULL;
+
+    -- 6. Tell listeners, once per department corrected
+    PERFORM pg_notify('bitemporal_changes', json_build_object('table', 'department', 'dept_id', a.dept_id)::text)
+    FROM (
+        SELECT DISTINCT dept_id
+        FROM dbo.department_staging
+        WHERE batch_id = batch AND outcome = 'applied'
+    ) a;
+END;
+$$;
+
+-- ============================================================
+-- Employee Batch Corrections
+-- ============================================================
+CREATE OR REPLACE PROCEDURE dbo.apply_employee_corrections(batch VARCHAR(36))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    now_ts TIMESTAMP := NOW();
+BEGIN
+    -- 1. Only the first correction per employee in a batch is applied
+    UPDATE dbo.employee_staging s
+    SET outcome = 'duplicate'
+    WHERE s.batch_id = batch
+      AND EXISTS (
+          SELECT 1
+          FROM dbo.employee_staging f
+          WHERE f.batch_id = s.batch_id AND f.emp_id = s.emp_id AND f.row_no < s.row_no
+      );
+
+    -- 2. Find the current version each correction affects
+    UPDATE dbo.employee_staging s
+    SET affect_hist_id = e.emp_hist_id
+    FROM dbo.employee e
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL
+      AND e.emp_id = s.emp_id
+      AND s.valid_from >= e.valid_from
+      AND s.valid_from < e.valid_to
+      AND e.tran_to = dbo.fn_infinity();
+
+    UPDATE dbo.employee_staging
+    SET outcome = 'no_current_version'
+    WHERE batch_id = batch
+      AND outcome IS NULL
+      AND affect_hist_id IS NULL;
+
+    -- 3. Backfill records
+    INSERT INTO dbo.employee
+        (emp_id, dept_id, first_name, last_name, job_title, hire_date, term_date, valid_from, valid_to, tran_from, tran_to)
+    SELECT
+        e.emp_id, e.dept_id, e.first_name, e.last_name, e.job_title, e.hire_date, e.term_date,
+        e.valid_from, s.valid_from, now_ts, dbo.fn_infinity()
+    FROM dbo.employee_staging s
+    JOIN dbo.employee e ON e.emp_hist_id = s.affect_hist_id
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL
+      AND e.valid_from <> s.valid_from;
+
+    -- 4. Close old versions (the setting is local to this transaction)
+    PERFORM set_config('bitemporal.batch', 'on', true);
+
+    UPDATE dbo.employee e
+    SET tran_to = now_ts
+    FROM dbo.employee_staging s
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL
+      AND e.emp_hist_id = s.affect_hist_id;
+
+    PERFORM set_config('bitemporal.batch', 'off', true);
+
+    -- 5. Insert new versions
+    INSERT INTO dbo.employee
+        (emp_id, dept_id, first_name, last_name, job_title, hire_date, term_date, valid_from, valid_to, tran_from, tran_to)
+    SELECT
+        s.emp_id,
+        e.dept_id,
+        COALESCE(s.first_name, e.first_name),
+        COALESCE(s.last_name, e.last_name),
+        COALESCE(s.job_title, e.job_title),
+        COALESCE(s.hire_date, e.hire_date),
+        COALESCE(s.term_date, e.term_date),
+        s.valid_from,
+        e.valid_to,
+        now_ts,
+        dbo.fn_infinity()
+    FROM dbo.employee_staging s
+    JOIN dbo.employee e ON e.emp_hist_id = s.affect_hist_id
+    WHERE s.batch_id = batch
+      AND s.outcome IS NULL;
+
+    UPDATE dbo.employee_staging
+    SET outcome = 'applied'
+    WHERE batch_id = batch
+      AND outcome IS NULL;
+
+    -- 6. Tell listeners, once per department whose employees were corrected
+    PERFORM pg_notify('bitemporal_changes', json_build_object('table', 'employee', 'dept_id', a.dept_id)::text)
+    FROM (
+        SELECT DISTINCT e.dept_id
+        FROM dbo.employee_staging s
+        JOIN dbo.employee e ON e.emp_hist_id = s.affect_hist_id
+        WHERE s.batch_id = batch AND s.outcome = 'applied'
+    ) a;
+END;
+$$;
+
 -- Extended functionality 
 -- ============================================================
 -- As-of Employee Function in PostgreSQL
@@ -401,7 +716,7 @@ RETURNS TABLE (
     tran_to     TIMESTAMP
 ) AS $$
     SELECT e.*
-    FROM dbo.employee e
+    FROM dbo.employee_history e
     WHERE valid_date >= e.valid_from
       AND valid_date <  e.valid_to
       AND tran_date  >= e.tran_from
@@ -426,7 +741,7 @@ RETURNS TABLE (
     tran_to      TIMESTAMP
 ) AS $$
     SELECT d.*
-    FROM dbo.department d
+    FROM dbo.department_history d
     WHERE valid_date >= d.valid_from
       AND valid_date <  d.valid_to
       AND tran_date  >= d.tran_from
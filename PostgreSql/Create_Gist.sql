@@ -0,0 +1,107 @@
+-- ============================================================
+-- Range/GiST variant of the as-of functions
+-- Run after Create.sql. Every version is indexed as a
+-- (valid, tran) rectangle of two tstzranges, so point and
+-- window queries are answered from the GiST index instead of
+-- the per-column range predicates.
+-- ============================================================
+CREATE EXTENSION IF NOT EXISTS btree_gist;  -- dept_id alongside the ranges
+
+-- ============================================================
+-- Rectangle Indexes
+-- Expression indexes: the tables, triggers and views are unchanged
+-- ============================================================
+CREATE INDEX ix_department_rect ON dbo.department USING gist (
+    dept_id, tstzrange(valid_from, valid_to, '[)'), tstzrange(tran_from, tran_to, '[)'));
+
+CREATE INDEX ix_department_archive_rect ON dbo.department_archive USING gist (
+    dept_id, tstzrange(valid_from, valid_to, '[)'), tstzrange(tran_from, tran_to, '[)'));
+
+CREATE INDEX ix_employee_rect ON dbo.employee USING gist (
+    dept_id, tstzrange(valid_from, valid_to, '[)'), tstzrange(tran_from, tran_to, '[)'));
+
+CREATE INDEX ix_employee_archive_rect ON dbo.employee_archive USING gist (
+    dept_id, tstzrange(valid_from, valid_to, '[)'), tstzrange(tran_from, tran_to, '[)'));
+
+-- ============================================================
+-- As-of Employee Function (range containment)
+-- Same signature and result as Create.sql; the predicate is
+-- pushed into both branches of dbo.employee_history
+-- ============================================================
+CREATE OR REPLACE FUNCTION dbo.fn_as_of_employee(
+    valid_date TIMESTAMP,
+    tran_date  TIMESTAMP
+)
+RETURNS TABLE (
+    emp_hist_id BIGINT,
+    emp_id      INT,
+    dept_id     INT,
+    first_name  VARCHAR(100),
+    last_name   VARCHAR(100),
+    job_title   VARCHAR(200),
+    hire_date   DATE,
+    term_date   DATE,
+    valid_from  TIMESTAMP,
+    valid_to    TIMESTAMP,
+    tran_from   TIMESTAMP,
+    tran_to     TIMESTAMP
+) AS $$
+    SELECT e.*
+    FROM dbo.employee_history e
+    WHERE tstzrange(e.valid_from, e.valid_to, '[)') @> valid_date::timestamptz
+      AND tstzrange(e.tran_from, e.tran_to, '[)')   @> tran_date::timestamptz;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================
+-- As-of Department Function (range containment)
+-- ============================================================
+CREATE OR REPLACE FUNCTION dbo.fn_as_of_department(
+    valid_date TIMESTAMP,
+    tran_date  TIMESTAMP
+)
+RETURNS TABLE (
+    dept_hist_id BIGINT,
+    dept_id      INT,
+    dept_name    VARCHAR(200),
+    location     VARCHAR(200),
+    valid_from   TIMESTAMP,
+    valid_to     TIMESTAMP,
+    tran_from    TIMESTAMP,
+    tran_to      TIMESTAMP
+) AS $$
+    SELECT d.*
+    FROM dbo.department_history d
+    WHERE tstzrange(d.valid_from, d.valid_to, '[)') @> valid_date::timestamptz
+      AND tstzrange(d.tran_from, d.tran_to, '[)')   @> tran_date::timestamptz;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================
+-- Window Functions
+-- Versions whose rectangle overlaps the chart viewport
+-- [valid_lo, valid_hi) x [tran_lo, tran_hi)
+-- ============================================================
+CREATE OR REPLACE FUNCTION dbo.fn_window_employee(
+    valid_lo TIMESTAMP WITH TIME ZONE,
+    valid_hi TIMESTAMP WITH TIME ZONE,
+    tran_lo  TIMESTAMP WITH TIME ZONE,
+    tran_hi  TIMESTAMP WITH TIME ZONE
+)
+RETURNS SETOF dbo.employee_history AS $$
+    SELECT e.*
+    FROM dbo.employee_history e
+    WHERE tstzrange(e.valid_from, e.valid_to, '[)') && tstzrange(valid_lo, valid_hi, '[)')
+      AND tstzrange(e.tran_from, e.tran_to, '[)')   && tstzrange(tran_lo, tran_hi, '[)');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION dbo.fn_window_department(
+    valid_lo TIMESTAMP WITH TIME ZONE,
+    valid_hi TIMESTAMP WITH TIME ZONE,
+    tran_lo  TIMESTAMP WITH TIME ZONE,
+    tran_hi  TIMESTAMP WITH TIME ZONE
+)
+RETURNS SETOF dbo.department_history AS $$
+    SELECT d.*
+    FROM dbo.department_history d
+    WHERE tstzrange(d.valid_from, d.valid_to, '[)') && tstzrange(valid_lo, valid_hi, '[)')
+      AND tstzrange(d.tran_from, d.tran_to, '[)')   && tstzrange(tran_lo, tran_hi, '[)');
+$$ LANGUAGE sql STABLE;
@@ -15,6 +15,18 @@ GO
 -- ============================================================
 -- Cleanup
 -- ============================================================
+IF OBJECT_ID('dbo.employee_staging', 'U') IS NOT NULL 
+    DROP TABLE dbo.employee_staging;
+IF OBJECT_ID('dbo.department_staging', 'U') IS NOT NULL 
+    DROP TABLE dbo.department_staging;
+IF OBJECT_ID('dbo.employee_history', 'V') IS NOT NULL 
+    DROP VIEW dbo.employee_history;
+IF OBJECT_ID('dbo.department_history', 'V') IS NOT NULL 
+    DROP VIEW dbo.department_history;
+IF OBJECT_ID('dbo.employee_archive', 'U') IS NOT NULL 
+    DROP TABLE dbo.employee_archive;
+IF OBJECT_ID('dbo.department_archive', 'U') IS NOT NULL 
+    DROP TABLE dbo.department_archive;
 IF OBJECT_ID('dbo.employee', 'U') IS NOT NULL 
     DROP TABLE dbo.employee;
 IF OBJECT_ID('dbo.department', 'U') IS NOT NULL 
@@ -72,6 +84,100 @@ CREATE TABLE dbo.employee (
 );
 GO
 
+-- ============================================================
+-- Batch Correction Staging Tables
+-- One row per correction; NULL attributes keep the current value
+-- ============================================================
+CREATE TABLE dbo.department_staging (
+    batch_id       VARCHAR(36) NOT NULL,
+    row_no         INT NOT NULL,
+    dept_id        INT NOT NULL,
+    dept_name      NVARCHAR(200),
+    location       NVARCHAR(200),
+    valid_from     DATETIME2(7) NOT NULL,
+    affect_hist_id BIGINT,
+    outcome        VARCHAR(30),
+    CONSTRAINT pk_department_staging PRIMARY KEY (batch_id, row_no)
+);
+GO
+
+CREATE TABLE dbo.employee_staging (
+    batch_id       VARCHAR(36) NOT NULL,
+    row_no         INT NOT NULL,
+    emp_id         INT NOT NULL,
+    first_name     NVARCHAR(100),
+    last_name      NVARCHAR(100),
+    job_title      NVARCHAR(200),
+    hire_date      DATE,
+    term_date      DATE,
+    valid_from     DATETIME2(7) NOT NULL,
+    affect_hist_id BIGINT,
+    outcome        VARCHAR(30),
+    CONSTRAINT pk_employee_staging PRIMARY KEY (batch_id, row_no)
+);
+GO
+
+-- ============================================================
+-- History Archive Tables
+-- Closed versions moved out of the live tables by the offline
+-- compaction job, with value-equivalent neighbours merged
+-- ============================================================
+CREATE TABLE dbo.department_archive (
+    dept_hist_id BIGINT PRIMARY KEY,
+    dept_id      INT NOT NULL,
+    dept_name    NVARCHAR(200) NOT NULL,
+    location     NVARCHAR(200),
+    valid_from   DATETIME2(7) NOT NULL,
+    valid_to     DATETIME2(7) NOT NULL,
+    tran_from    DATETIME2(7) NOT NULL,
+    tran_to      DATETIME2(7) NOT NULL,
+    CONSTRAINT uq_department_archive_version UNIQUE (dept_id, valid_from, tran_from),
+    CONSTRAINT fk_department_archive_master FOREIGN KEY (dept_id) REFERENCES dbo.department_master(dept_id)
+);
+GO
+
+CREATE TABLE dbo.employee_archive (
+    emp_hist_id  BIGINT PRIMARY KEY,
+    emp_id       INT NOT NULL,
+    dept_id      INT NOT NULL,
+    first_name   NVARCHAR(100) NOT NULL,
+    last_name    NVARCHAR(100) NOT NULL,
+    job_title    NVARCHAR(200),
+    hire_date    DATE NOT NULL,
+    term_date    DATE NULL,
+    valid_from   DATETIME2(7) NOT NULL,
+    valid_to     DATETIME2(7) NOT NULL,
+    tran_from    DATETIME2(7) NOT NULL,
+    tran_to      DATETIME2(7) NOT NULL,
+    CONSTRAINT uq_employee_archive_version UNIQUE (emp_id, valid_from, tran_from),
+    CONSTRAINT fk_employee_archive_department FOREIGN KEY (dept_id) REFERENCES dbo.department_master(dept_id)
+);
+GO
+
+-- ============================================================
+-- Full History Views
+-- Live and archived versions; read by the app and the as-of functions
+-- ============================================================
+CREATE VIEW dbo.department_history
+AS
+SELECT dept_hist_id, dept_id, dept_name, location, valid_from, valid_to, tran_from, tran_to
+FROM dbo.department
+UNION ALL
+SELECT dept_hist_id, dept_id, dept_name, location, valid_from, valid_to, tran_from, tran_to
+FROM dbo.department_archive;
+GO
+
+CREATE VIEW dbo.employee_history
+AS
+SELECT emp_hist_id, emp_id, dept_id, first_name, last_name, job_title, hire_date, term_date,
+       valid_from, valid_to, tran_from, tran_to
+FROM dbo.employee
+UNION ALL
+SELECT emp_hist_id, emp_id, dept_id, first_name, last_name, job_title, hire_date, term_date,
+       valid_from, valid_to, tran_from, tran_to
+FROM dbo.employee_archive;
+GO
+
 -- ============================================================
 -- Current Department View
 -- ============================================================
@@ -97,6 +203,46 @@ AS
 BEGIN
     SET NOCOUNT ON;
 
+    -- Batch corrections close versions directly, set-based: only tran_to of an open version may change
+    IF CAST(SESSION_CONTEXT(N'bitemporal_batch') AS INT) = 1
+    BEGIN
+        IF EXISTS (
+            SELECT 
+                1
+            FROM 
+                inserted i
+            JOIN 
+                deleted d 
+            ON 
+                d.dept_hist_id = i.dept_hist_id
+            WHERE 
+                d.tran_to <> dbo.fn_infinity()
+            OR 
+                EXISTS (
+                    SELECT i.dept_id, i.dept_name, i.location, i.valid_from, i.valid_to, i.tran_from
+                    EXCEPT
+                    SELECT d.dept_id, d.dept_name, d.location, d.valid_from, d.valid_to, d.tran_from
+                )
+        )
+        BEGIN
+            THROW 50003, 'Batch updates may only close an open version.', 1;
+            ROLLBACK TRANSACTION;
+            RETURN;
+        END;
+
+        UPDATE 
+		    t
+        SET 
+		    tran_to = i.tran_to
+        FROM 
+		    dbo.department t
+        JOIN 
+		    inserted i 
+	    ON 
+		    t.dept_hist_id = i.dept_hist_id;
+        RETURN;
+    END;
+
     IF (UPDATE(dept_id) OR UPDATE(tran_from) OR UPDATE(tran_to) OR UPDATE(valid_to))
     BEGIN
         THROW 50001, 'Updates to dept_id, tran_from, tran_to or valid_to are not allowed.', 1;
@@ -208,6 +354,46 @@ AS
 BEGIN
     SET NOCOUNT ON;
 
+    -- Batch corrections close versions directly, set-based: only tran_to of an open version may change
+    IF CAST(SESSION_CONTEXT(N'bitemporal_batch') AS INT) = 1
+    BEGIN
+        IF EXISTS (
+            SELECT 
+                1
+            FROM 
+                inserted i
+            JOIN 
+                deleted d 
+            ON 
+                d.emp_hist_id = i.emp_hist_id
+            WHERE 
+                d.tran_to <> dbo.fn_infinity()
+            OR 
+                EXISTS (
+                    SELECT i.emp_id, i.dept_id, i.first_name, i.last_name, i.job_title, i.hire_date, i.term_date, i.valid_from, i.valid_to, i.tran_from
+                    EXCEPT
+                    SELECT d.emp_id, d.dept_id, d.first_name, d.last_name, d.job_title, d.hire_date, d.term_date, d.valid_from, d.valid_to, d.tran_from
+                )
+        )
+        BEGIN
+            THROW 50003, 'Batch updates may only close an open version.', 1;
+            ROLLBACK TRANSACTION;
+            RETURN;
+        END;
+
+        UPDATE 
+		    t
+        SET 
+		    tran_to = i.tran_to
+        FROM 
+		    dbo.employee t
+        JOIN 
+		    inserted i 
+	    ON 
+		    t.emp_hist_id = i.emp_hist_id;
+        RETURN;
+    END;
+
     IF (UPDATE(emp_id) OR UPDATE(tran_from) OR UPDATE(tran_to) OR UPDATE(valid_to))
     BEGIN
         THROW 50003, 'Updates to emp_id, tran_from, tran_to or valid_to are not allowed.', 1;
@@ -323,6 +509,346 @@ BEGIN
 END;
 GO
 
+-- ============================================================
+-- Department Batch Corrections
+-- Applies every correction staged under @batch_id in one pass with a
+-- single transaction timestamp: backfill, close old version, insert new
+-- ============================================================
+CREATE OR ALTER PROCEDURE 
+	dbo.apply_department_corrections
+    @batch_id VARCHAR(36)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @now DATETIME2(7) = SYSUTCDATETIME();
+
+    -- 1. Only the first correction per department in a batch is applied
+    UPDATE 
+		s
+    SET 
+		outcome = 'duplicate'
+    FROM 
+		dbo.department_staging s
+    WHERE 
+		s.batch_id = @batch_id
+    AND EXISTS (
+        SELECT 1 
+        FROM dbo.department_staging f 
+        WHERE f.batch_id = s.batch_id AND f.dept_id = s.dept_id AND f.row_no < s.row_no
+    );
+
+    -- 2. Find the current version each correction affects
+    UPDATE 
+		s
+    SET 
+		affect_hist_id = d.dept_hist_id
+    FROM 
+		dbo.department_staging s
+    JOIN 
+		dbo.department d 
+	ON 
+		d.dept_id = s.dept_id
+    AND 
+		s.valid_from >= d.valid_from 
+	AND 
+		s.valid_from < d.valid_to
+    AND 
+		d.tran_to = dbo.fn_infinity()
+    WHERE 
+		s.batch_id = @batch_id
+    AND 
+		s.outcome IS NULL;
+
+    UPDATE 
+		dbo.department_staging
+    SET 
+		outcome = 'no_current_version'
+    WHERE 
+		batch_id = @batch_id
+    AND 
+		outcome IS NULL
+    AND 
+		affect_hist_id IS NULL;
+
+    -- 3. Backfill records
+    INSERT INTO 
+		dbo.department 
+	(
+        dept_id, 
+		dept_name, 
+		location,
+        valid_from, 
+		valid_to, 
+		tran_from, 
+		tran_to
+    )
+    SELECT
+        d.dept_id,
+        d.dept_name,
+        d.location,
+        d.valid_from,
+        s.valid_from,
+        @now,
+        dbo.fn_infinity()
+    FROM 
+		dbo.department_staging s
+    JOIN 
+		dbo.department d 
+	ON 
+		d.dept_hist_id = s.affect_hist_id
+    WHERE 
+		s.batch_id = @batch_id
+    AND 
+		s.outcome IS NULL
+    AND 
+		d.valid_from != s.valid_from;
+
+    -- 4. Close old versions; the flag must not outlive this statement on a pooled connection
+    EXEC sp_set_session_context N'bitemporal_batch', 1;
+
+    BEGIN TRY
+        UPDATE 
+		    d
+        SET 
+		    tran_to = @now
+        FROM 
+		    dbo.department d
+        JOIN 
+		    dbo.department_staging s 
+	    ON 
+		    d.dept_hist_id = s.affect_hist_id
+        WHERE 
+		    s.batch_id = @batch_id
+        AND 
+		    s.outcome IS NULL;
+    END TRY
+    BEGIN CATCH
+        EXEC sp_set_session_context N'bitemporal_batch', NULL;
+        THROW;
+    END CATCH;
+
+    EXEC sp_set_session_context N'bitemporal_batch', NULL;
+
+    -- 5. Insert new versions
+    INSERT INTO 
+		dbo.department 
+	(
+        dept_id, 
+		dept_name, 
+		location,
+        valid_from, 
+		valid_to, 
+		tran_from, 
+		tran_to
+    )
+    SELECT
+        s.dept_id,
+        COALESCE(s.dept_name, d.dept_name),
+        COALESCE(s.location, d.location),
+        s.valid_from,
+        d.valid_to,
+        @now,
+        dbo.fn_infinity()
+    FROM 
+		dbo.department_staging s
+    JOIN 
+		dbo.department d 
+	ON 
+		d.dept_hist_id = s.affect_hist_id
+    WHERE 
+		s.batch_id = @batch_id
+    AND 
+		s.outcome IS NULL;
+
+    UPDATE 
+		dbo.department_staging
+    SET 
+		outcome = 'applied'
+    WHERE 
+		batch_id = @batch_id
+    AND 
+		outcome IS NULL;
+END;
+GO
+
+-- ============================================================
+-- Employee Batch Corrections
+-- ============================================================
+CREATE OR ALTER PROCEDURE 
+	dbo.apply_employee_corrections
+    @batch_id VARCHAR(36)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @now DATETIME2(7) = SYSUTCDATETIME();
+
+    -- 1. Only the first correction per employee in a batch is applied
+    UPDATE 
+		s
+    SET 
+		outcome = 'duplicate'
+    FROM 
+		dbo.employee_staging s
+    WHERE 
+		s.batch_id = @batch_id
+    AND EXISTS (
+        SELECT 1 
+        FROM dbo.employee_staging f 
+        WHERE f.batch_id = s.batch_id AND f.emp_id = s.emp_id AND f.row_no < s.row_no
+    );
+
+    -- 2. Find the current version each correction affects
+    UPDATE 
+		s
+    SET 
+		affect_hist_id = e.emp_hist_id
+    FROM 
+		dbo.employee_staging s
+    JOIN 
+		dbo.employee e 
+	ON 
+		e.emp_id = s.emp_id
+    AND 
+		s.valid_from >= e.valid_from 
+	AND 
+		s.valid_from < e.valid_to
+    AND 
+		e.tran_to = dbo.fn_infinity()
+    WHERE 
+		s.batch_id = @batch_id
+    AND 
+		s.outcome IS NULL;
+
+    UPDATE 
+		dbo.employee_staging
+    SET 
+		outcome = 'no_current_version'
+    WHERE 
+		batch_id = @batch_id
+    AND 
+		outcome IS NULL
+    AND 
+		affect_hist_id IS NULL;
+
+    -- 3. Backfill records
+    INSERT INTO 
+		dbo.employee 
+	(
+	    emp_id, 
+		dept_id,
+		first_name,
+		last_name,
+		job_title, 
+		hire_date,
+		term_date,
+	    valid_from, 
+		valid_to, 
+		tran_from, 
+		tran_to
+    )
+    SELECT
+        e.emp_id,
+		e.dept_id,
+		e.first_name,
+		e.last_name,
+		e.job_title, 
+		e.hire_date,
+		e.term_date,
+        e.valid_from,
+        s.valid_from,
+        @now,
+        dbo.fn_infinity()
+    FROM 
+		dbo.employee_staging s
+    JOIN 
+		dbo.employee e 
+	ON 
+		e.emp_hist_id = s.affect_hist_id
+    WHERE 
+		s.batch_id = @batch_id
+    AND 
+		s.outcome IS NULL
+    AND 
+		e.valid_from != s.valid_from;
+
+    -- 4. Close old versions; the flag must not outlive this statement on a pooled connection
+    EXEC sp_set_session_context N'bitemporal_batch', 1;
+
+    BEGIN TRY
+        UPDATE 
+		    e
+        SET 
+		    tran_to = @now
+        FROM 
+		    dbo.employee e
+        JOIN 
+		    dbo.employee_staging s 
+	    ON 
+		    e.emp_hist_id = s.affect_hist_id
+        WHERE 
+		    s.batch_id = @batch_id
+        AND 
+		    s.outcome IS NULL;
+    END TRY
+    BEGIN CATCH
+        EXEC sp_set_session_context N'bitemporal_batch', NULL;
+        THROW;
+    END CATCH;
+
+    EXEC sp_set_session_context N'bitemporal_batch', NULL;
+
+    -- 5. Insert new versions
+    INSERT INTO 
+		dbo.employee 
+	(
+	    emp_id, 
+		dept_id,
+		first_name,
+		last_name,
+		job_title, 
+		hire_date,
+		term_date,
+	    valid_from, 
+		valid_to, 
+		tran_from, 
+		tran_to
+    )
+    SELECT
+        s.emp_id,
+		e.dept_id,
+		COALESCE(s.first_name, e.first_name),
+		COALESCE(s.last_name, e.last_name),
+		COALESCE(s.job_title, e.job_title), 
+		COALESCE(s.hire_date, e.hire_date),
+		COALESCE(s.term_date, e.term_date),
+        s.valid_from,
+        e.valid_to,
+        @now,
+        dbo.fn_infinity()
+    FROM 
+		dbo.employee_staging s
+    JOIN 
+		dbo.employee e 
+	ON 
+		e.emp_hist_id = s.affect_hist_id
+    WHERE 
+		s.batch_id = @batch_id
+    AND 
+		s.outcome IS NULL;
+
+    UPDATE 
+		dbo.employee_staging
+    SET 
+		outcome = 'applied'
+    WHERE 
+		batch_id = @batch_id
+    AND 
+		outcome IS NULL;
+END;
+GO
+
 -- ============================================================
 -- Department Getter Procedure
 -- ============================================================
@@ -341,7 +867,7 @@ BEGIN
         @valid_date AS valid_date,
         d.*
     FROM 
-		dbo.department d
+		dbo.department_history d
     WHERE 
 		d.dept_id = @dept_id
     AND 
@@ -364,6 +890,8 @@ AS
 BEGIN
     SET NOCOUNT ON;
 
+    DELETE FROM dbo.employee_archive;
+    DELETE FROM dbo.department_archive;
     DELETE FROM dbo.employee;
     DELETE FROM dbo.department;
     DELETE FROM dbo.department_master;
@@ -436,7 +964,7 @@ AS
 RETURN
 (
     SELECT *
-    FROM dbo.employee
+    FROM dbo.employee_history
     WHERE @valid_date >= valid_from
       AND @valid_date < valid_to
       AND @tran_date >= tran_from
@@ -454,7 +982,7 @@ AS
 RETURN
 (
     SELECT *
-    FROM dbo.department
+    FROM dbo.department_history
     WHERE @valid_date >= valid_from
       AND @valid_date < valid_to
       AND @tran_date >= tran_from
@@ -0,0 +1,27 @@
+import argparse
+import sys
+
+import pandas as pd
+
+from BiTemporal import DataEngine, HistoryTable, CONNECTION_STRING
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coalesce old bi-temporal history and move closed versions to the archive tables")
+    parser.add_argument("--before", help="compact versions recorded before this date, default a year ago")
+    parser.add_argument("--table", choices=[t.name.lower() for t in HistoryTable], action="append",
+                        help="history table to compact, default both")
+    args = parser.parse_args()
+
+    before = pd.Timestamp(args.before) if args.before else pd.Timestamp.now(tz="UTC") - pd.DateOffset(years=1)
+    tables = [HistoryTable[name.upper()] for name in args.table] if args.table else list(HistoryTable)
+
+    engine = DataEngine(CONNECTION_STRING)
+    for table in tables:
+        try:
+            stats = engine.compact_history(table, before)
+        except Exception as e:
+            print(f"{table.name.title()}: compaction failed, nothing changed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{table.name.title()}: {stats['rows']} versions recorded before {before:%Y-%m-%d} coalesced to "
+              f"{stats['coalesced']} ({stats['reduction']:.0%} fewer), {stats['archived']} archived, "
+              f"in {stats['seconds']:.1f}s")
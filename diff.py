@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from BiTemporal import DataEngine, HistoryTable, CONNECTION_STRING, DEPT_ID, from_naive_ns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report what changed in departments' known history between two transaction dates")
+    parser.add_argument("before", help="earlier transaction date")
+    parser.add_argument("after", nargs="?", help="later transaction date, default now")
+    parser.add_argument("--dept-ids", help="comma separated dept_ids, default the app's department")
+    parser.add_argument("--table", choices=[t.name.lower() for t in HistoryTable], action="append",
+                        help="history table to diff, default both")
+    parser.add_argument("--out-dir", help="write <table>_diff.csv files here instead of printing the spans")
+    args = parser.parse_args()
+
+    before = pd.Timestamp(args.before)
+    after = pd.Timestamp(args.after) if args.after else pd.Timestamp.now(tz="UTC").tz_localize(None)
+    dept_ids = [int(d) for d in args.dept_ids.split(",")] if args.dept_ids else [DEPT_ID]
+    tables = [HistoryTable[name.upper()] for name in args.table] if args.table else list(HistoryTable)
+
+    engine = DataEngine(CONNECTION_STRING)
+    for table in tables:
+        diff = engine.diff(table, dept_ids, before, after)
+        counts = diff["change"].value_counts()
+        print(f"{table.name.title()}: {counts['added']} added, {counts['removed']} removed, "
+              f"{counts['changed']} changed spans between {before:%Y-%m-%d} and {after:%Y-%m-%d}", file=sys.stderr)
+
+        diff = diff.assign(valid_from=from_naive_ns(diff["valid_from"]), valid_to=from_naive_ns(diff["valid_to"]))
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+            diff.to_csv(os.path.join(args.out_dir, f"{table.name.lower()}_diff.csv"), index=False)
+        else:
+            print(diff.to_string(index=False))
@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import matplotlib
+matplotlib.use("Agg")  # no Tk: workers only ever render to files
+
+from BiTemporal import (Chart, CsvWriter, DataEngine, HistoryTable, SqlCommands, CONNECTION_STRING,
+                        bitemporal_join, pipeline)
+
+# Chart title, key and label columns per chart file; the first two are as shown by the app
+CHARTS = {
+    "department": ("Department", HistoryTable.DEPARTMENT.key, ["dept_hist_id", "dept_name"]),
+    "employee": ("Employee", HistoryTable.EMPLOYEE.key, ["emp_hist_id", "last_name", "job_title"]),
+    # Employee versions clipped to the department version they were recorded under
+    "combined": ("Department and employee", "emp_hist_id", ["dept_name", "last_name", "job_title"]),
+}
+
+FORMATS = ("png", "svg", "pdf")
+BATCH_SIZE = 100  # departments fetched per round trip
+
+# --- Worker side ---
+_charts = {}  # one reusable headless chart per table in each worker process
+
+def render(dept_id, frames, out_dir, fmt, combined=False):
+    """Render one department's charts to out_dir and return (dept_id, written paths)
+
+    frames is [(name, df)] for the department and employee charts; combined adds the chart of
+    their bitemporal join, which is computed here so it runs in the worker.
+    """
+    if combined:
+        named = dict(frames)
+        frames = [*frames, ("combined", bitemporal_join(named["department"], named["employee"]))]
+    paths = []
+    for name, df in frames:
+        if df.empty:
+            continue
+        title, key, labels = CHARTS[name]
+        chart = _charts.get(name)
+        if chart is None:
+            chart = _charts[name] = Chart(None, None, title, key, labels)
+        chart.title = f"{title} {dept_id}"
+        chart.display_chart(df, draw=False)
+
+        # Write under a temporary name so a killed job never leaves a truncated chart
+        path = os.path.join(out_dir, f"dept_{dept_id}_{name}.{fmt}")
+        partial = f"{path}.partial"
+        chart.canvas.figure.savefig(partial, format=fmt)
+        os.replace(partial, path)
+        chart.ax.clear()  # drop this department's artists before the next one
+        paths.append(path)
+    return dept_id, paths
+
+# --- Driver side ---
+def department_ids(engine):
+    """Return every dept_id with history"""
+    return engine.sql_fetch(SqlCommands.DEPT_IDS.value)["dept_id"].tolist()
+
+def split(frame, dept_ids):
+    """Split a multi-department frame into one positionally indexed frame per dept_id"""
+    groups = {dept_id: group.reset_index(drop=True) for dept_id, group in frame.groupby("dept_id", sort=False)}
+    empty = frame.iloc[0:0]
+    return {dept_id: groups.get(dept_id, empty) for dept_id in dept_ids}
+
+def export_charts(engine, dept_ids, out_dir, fmt="png", workers=None, batch_size=BATCH_SIZE, combined=False):
+    """Render department and employee charts for dept_ids to out_dir across a process pool
+
+    combined also renders each department's joined department and employee history.
+
+    Histories are fetched batch_size departments at a time, and no more than two renders per
+    worker are queued, so memory stays bounded however many departments are exported.
+    Yields (dept_id, paths) as each department's files are written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    limit = 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for start in range(0, len(dept_ids), batch_size):
+            batch = dept_ids[start:start + batch_size]
+            depts = split(engine.fetch_entities(HistoryTable.DEPARTMENT, "dept_id", batch), batch)
+            emps = split(engine.fetch_entities(HistoryTable.EMPLOYEE, "dept_id", batch), batch)
+
+            for dept_id in batch:
+                while len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                frames = [("department", depts.pop(dept_id)), ("employee", emps.pop(dept_id))]
+                pending.add(pool.submit(render, dept_id, frames, out_dir, fmt, combined))
+
+        for future in wait(pending).done:
+            yield future.result()
+
+def export_history(engine, dept_ids, out_dir):
+    """Stream each table's history of dept_ids to <table>_history.csv in out_dir and return the paths
+
+    dept_ids None exports every department. Rows are written chunk by chunk as they are read.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    wanted = None if dept_ids is None else set(dept_ids)
+    paths = []
+    for table in HistoryTable:
+        chunks = engine.stream(table.select.format(filter="1 = 1"))
+        if wanted is not None:
+            chunks = (chunk[chunk["dept_id"].isin(wanted)] for chunk in chunks)
+        path = os.path.join(out_dir, f"{table.name.lower()}_history.csv")
+        partial = f"{path}.partial"
+        pipeline(chunks, CsvWriter(partial))
+        os.replace(partial, path)
+        paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export bi-temporal charts for many departments without the app")
+    parser.add_argument("out_dir", help="directory the chart files are written to")
+    parser.add_argument("--dept-ids", help="comma separated dept_ids, default every department")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--workers", type=int, help="render processes, default one per core")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="departments fetched per query")
+    parser.add_argument("--combined", action="store_true",
+                        help="also chart each department's employees joined to its department versions")
+    parser.add_argument("--csv", action="store_true",
+                        help="also write the exported departments' department and employee history as CSV")
+    args = parser.parse_args()
+
+    engine = DataEngine(CONNECTION_STRING)
+    if args.dept_ids:
+        dept_ids = [int(d) for d in args.dept_ids.split(",")]
+    else:
+        dept_ids = department_ids(engine)
+
+    started = time.perf_counter()
+    files = 0
+    for count, (dept_id, paths) in enumerate(export_charts(engine, dept_ids, args.out_dir, args.format,
+                                                           args.workers, args.batch_size, args.combined), 1):
+        files += len(paths)
+        if not paths:
+            print(f"Department {dept_id}: no history", file=sys.stderr)
+        if count % 100 == 0:
+            print(f"{count}/{len(dept_ids)} departments", file=sys.stderr)
+    if args.csv:
+        files += len(export_history(engine, dept_ids if args.dept_ids else None, args.out_dir))
+    elapsed = time.perf_counter() - started
+    print(f"{files} files for {len(dept_ids)} departments written to {args.out_dir} in {elapsed:.1f}s")
@@ -0,0 +1,292 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import matplotlib
+import numpy as np
+import pandas as pd
+import tkinter as tk
+
+import BiTemporal as bt
+import synthetic
+
+matplotlib.use("Agg")  # charts here never open a window
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+HOVER_POINTS = 200  # select_row calls timed per size
+RTREE_QUERIES = 50  # as-of points and viewports timed per size, indexed and predicate
+PLAYBACK_STEPS = 200  # playback positions timed per size, first to last transaction
+
+# Run in a fresh interpreter, so nothing is imported yet
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import BiTemporal; print(time.perf_counter() - started)"
+
+def measure(fn, repeat, memory):
+    """Return (best seconds, peak traced MB or None, result); memory is traced in a separate run"""
+    best, result = None, None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return best, peak, result
+
+def hover_points(df, count, seed=0):
+    """Random (tran, valid) points inside the charted area, as naive nanoseconds"""
+    rng = np.random.default_rng(seed)
+    tran = bt.to_naive_ns(df["tran_from"])
+    valid = bt.to_naive_ns(df["valid_from"])
+    return list(zip(rng.integers(tran.min(), tran.max() + 1, count).tolist(),
+                    rng.integers(valid.min(), valid.max() + 1, count).tolist()))
+
+def import_seconds(repeat):
+    """Best time to import BiTemporal in a new process, as the app does on launch"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return min(float(subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=here, capture_output=True,
+                                    text=True, check=True).stdout) for _ in range(repeat))
+
+def startup(engine, repeat):
+    """Time a cold start after the import: connect, first fetch of both views, first render of both charts"""
+    def connect():
+        engine.dispose()  # a new pool, so the first round trip opens a connection
+        return bt.DataEngine(engine).sql_fetch(bt.SqlCommands.DEPT_IDS.value)
+
+    def fetch():
+        cold = bt.DataEngine(engine)  # nothing cached
+        params = {"dept_id": bt.DEPT_ID}
+        return [cold.fetch_history(sql.value, table.key, params)
+                for sql, table in ((bt.SqlCommands.FETCH_DEPT, bt.HistoryTable.DEPARTMENT),
+                                   (bt.SqlCommands.FETCH_EMP, bt.HistoryTable.EMPLOYEE))]
+
+    frames = fetch()
+
+    def render():
+        for table, df in zip(bt.HistoryTable, frames):
+            chart = bt.Chart(None, None, table.name.title(), table.key, [table.key])
+            chart.display_chart(df)
+
+    return [(name, *measure(fn, repeat, False)[:1]) for name, fn in
+            (("startup_connect", connect), ("startup_fetch", fetch), ("startup_render", render))], frames
+
+def viewports(df, count, seed=0):
+    """Random (valid_from, valid_to, tran_from, tran_to) windows, each a tenth of the charted extent a side"""
+    rng = np.random.default_rng(seed)
+    valid = df["valid_from"].to_numpy()
+    tran = df["tran_from"].to_numpy()
+    width = (valid.max() - valid.min()) // 10
+    height = (tran.max() - tran.min()) // 10
+    x0 = rng.integers(valid.min(), valid.max() + 1, count)
+    y0 = rng.integers(tran.min(), tran.max() + 1, count)
+    return list(zip(x0.tolist(), (x0 + width).tolist(), y0.tolist(), (y0 + height).tolist()))
+
+def run(sizes, repeat=1, memory=True, corrections=4, retro_ratio=0.3, open_ratio=0.8, workdir=None, rtree=True):
+    """Benchmark each hot path at each history size and return the result records"""
+    launch = import_seconds(repeat)
+    print(f"startup_import: {launch:.4f}s", file=sys.stderr)
+
+    try:
+        root = tk.Tk()
+        root.withdraw()
+    except tk.TclError as e:
+        print(f"Tk unavailable, table paths skipped: {e}", file=sys.stderr)
+        root = None
+
+    results = []
+    workdir = workdir or tempfile.mkdtemp(prefix="bitemporal-bench-")
+    for size in sizes:
+        path = os.path.join(workdir, f"synthetic_{size}.db")
+        started = time.perf_counter()
+        engine = synthetic.build(path, size, corrections=corrections, retro_ratio=retro_ratio, open_ratio=open_ratio)
+        print(f"[{size}] generated in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        def record(name, seconds, peak, rows, calls=1, **extra):
+            results.append({"path": name, "versions": size, "rows": rows, "calls": calls,
+                            "seconds": seconds, "peak_mb": peak, **extra})
+            memory_note = f", peak {peak:.1f} MB" if peak is not None else ""
+            print(f"[{size}] {name}: {seconds:.4f}s{memory_note}", file=sys.stderr)
+
+        # Launch to first chart: the import is the same at every size
+        phases, frames = startup(engine, repeat)
+        record("startup_import", launch, None, 0)
+        for name, seconds in phases:
+            record(name, seconds, None, sum(len(f) for f in frames))
+        del frames
+
+        engine_under_test = bt.DataEngine(engine)
+        params = {"dept_id": bt.DEPT_ID}
+        seconds, peak, df = measure(lambda: engine_under_test.sql_fetch(bt.SqlCommands.FETCH_EMP.value, params),
+                                    repeat, memory)
+        record("sql_fetch", seconds, peak, len(df))
+
+        # A refresh that finds nothing new hands back the cached frame, which the app does not redraw
+        refresh = lambda: engine_under_test.fetch_history(bt.SqlCommands.FETCH_EMP.value, "emp_hist_id", params)
+        cached = refresh()
+        seconds, peak, refreshed = measure(refresh, repeat, memory)
+        record("refresh_unchanged", seconds, peak, len(refreshed), same=refreshed is cached)
+        if refreshed is not cached:
+            print(f"[{size}] refresh_unchanged: a new frame came back, the app would redraw", file=sys.stderr)
+        del cached, refreshed
+
+        raw = df
+        seconds, peak, df = measure(lambda: bt.ingest(raw), repeat, memory)
+        record("ingest", seconds, peak, len(df),
+               fetched_mb=bt.memory_bytes(raw) / 2**20, ingested_mb=bt.memory_bytes(df) / 2**20)
+        del raw
+
+        stream = lambda: engine_under_test.fetch_streamed(bt.SqlCommands.FETCH_EMP.value, params)
+        seconds, peak, streamed = measure(stream, repeat, memory)
+        record("fetch_streamed", seconds, peak, len(streamed))
+        del streamed
+
+        chart = bt.Chart(None, None, "Employee", "emp_hist_id", ["emp_hist_id", "last_name", "job_title"])
+        seconds, peak, _ = measure(lambda: chart.display_chart(df), repeat, memory)
+        record("display_chart", seconds, peak, len(df))
+
+        # Playback: the events are sorted once, then each step only blits the overlay
+        chart.canvas.mpl_connect("draw_event", chart.on_draw)
+        def restart():
+            chart.stop_playback()
+            chart.start_playback()
+        seconds, peak, _ = measure(restart, repeat, memory)
+        record("playback_start", seconds, peak, len(df))
+        steps = np.linspace(chart.extents[2].min(), chart.extents[2].max(), PLAYBACK_STEPS)
+        def play():
+            for y in steps:
+                chart.seek(y)
+        seconds, peak, _ = measure(play, repeat, memory)
+        record("playback_seek", seconds / len(steps), peak, len(df), len(steps))
+        chart.canvas.figure.clear()
+
+        if rtree:
+            # Same queries through the R*Tree and as the plain range predicates, on one local store
+            store = bt.RTreeStore(os.path.join(workdir, f"rtree_{size}.db"))
+            seconds, peak, _ = measure(lambda: store.load(bt.HistoryTable.EMPLOYEE, df, replace=True), repeat, memory)
+            record("rtree_load", seconds, peak, len(df))
+
+            points = hover_points(df, RTREE_QUERIES)
+            windows = viewports(df, RTREE_QUERIES)
+            for indexed, suffix in ((True, "rtree"), (False, "predicate")):
+                def point_queries():
+                    return sum(len(store.as_of(bt.HistoryTable.EMPLOYEE, tran_ns, valid_ns, indexed=indexed))
+                               for tran_ns, valid_ns in points)
+                seconds, peak, found = measure(point_queries, repeat, memory)
+                record(f"as_of_{suffix}", seconds / len(points), peak, len(df), len(points), found=found)
+
+                def window_queries():
+                    return sum(len(store.window(bt.HistoryTable.EMPLOYEE, view, indexed=indexed))
+                               for view in windows)
+                seconds, peak, found = measure(window_queries, repeat, memory)
+                record(f"window_{suffix}", seconds / len(windows), peak, len(df), len(windows), found=found)
+
+                # The search alone: open-ended versions meet most windows, so reading them dominates above
+                def window_counts():
+                    return sum(store.window(bt.HistoryTable.EMPLOYEE, view, indexed=indexed, count=True)
+                               for view in windows)
+                seconds, peak, found = measure(window_counts, repeat, memory)
+                record(f"window_count_{suffix}", seconds / len(windows), peak, len(df), len(windows), found=found)
+            store.close()
+            os.remove(store.path)
+
+            # End to end through DataEngine: the region cache, then the R*Tree, the watermark checked per tick
+            rtree_path = os.path.join(workdir, f"engine_rtree_{size}.db")
+            synced = bt.DataEngine(engine, rtree_path=rtree_path)
+            seconds, peak, _ = measure(synced.sync_rtree, 1, False)
+            record("engine_rtree_sync", seconds, peak, len(df))
+            seconds, peak, found = measure(lambda: sum(len(synced.as_of(tran_ns, valid_ns, [bt.DEPT_ID]))
+                                                       for tran_ns, valid_ns in points), repeat, memory)
+            record("engine_as_of", seconds / len(points), peak, len(df), len(points), found=found)
+            seconds, peak, found = measure(lambda: sum(len(synced.window(bt.HistoryTable.EMPLOYEE, view))
+                                                       for view in windows), repeat, memory)
+            record("engine_window", seconds / len(windows), peak, len(df), len(windows), found=found)
+            synced._rtree.close()
+            os.remove(rtree_path)
+
+        if root is not None:
+            frame = tk.Frame(root)
+            table = bt.TableTreeview(frame, bt.EMP_COLUMNS, virtual=True, show="headings")
+            seconds, peak, _ = measure(lambda: table.display_table(df[bt.EMP_COLUMNS], "emp_hist_id"),
+                                       repeat, memory)
+            record("display_table", seconds, peak, len(df))
+
+            points = hover_points(df, HOVER_POINTS)
+            def hover():
+                for tran_ns, valid_ns in points:
+                    table.select_row("emp_hist_id", tran_ns, valid_ns)
+            seconds, peak, _ = measure(hover, repeat, memory)
+            record("select_row", seconds / len(points), peak, len(df), len(points))
+            frame.destroy()
+
+        engine.dispose()
+        os.remove(path)
+
+    if root is not None:
+        root.destroy()
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print the ratio to a baseline for each matching measurement; return the regressions"""
+    previous = {(r["path"], r["versions"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        before = previous.get((r["path"], r["versions"]))
+        if before is None or not before["seconds"]:
+            continue
+        ratio = r["seconds"] / before["seconds"]
+        flag = "  REGRESSION" if ratio > tolerance else ""
+        print(f"{r['path']:>14} {r['versions']:>9}: {before['seconds']:.4f}s -> {r['seconds']:.4f}s ({ratio:.2f}x){flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bi-temporal hot paths on synthetic histories")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES), help="comma separated version counts")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per measurement, best is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak memory run")
+    parser.add_argument("--corrections", type=int, default=4)
+    parser.add_argument("--retro-ratio", type=float, default=0.3)
+    parser.add_argument("--open-ratio", type=float, default=0.8)
+    parser.add_argument("--no-rtree", action="store_true", help="skip the R*Tree and predicate query comparison")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.sizes.split(",")], args.repeat, not args.no_memory,
+                  args.corrections, args.retro_ratio, args.open_ratio, rtree=not args.no_rtree)
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "matplotlib": matplotlib.__version__,
+        "pandas": pd.__version__,
+        "options": {"corrections": args.corrections, "retro_ratio": args.retro_ratio,
+                    "open_ratio": args.open_ratio, "repeat": args.repeat},
+        "results": results,
+        "metrics": bt.METRICS.snapshot(),  # the app's own timers over the whole run
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
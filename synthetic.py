@@ -0,0 +1,220 @@
+﻿import argparse
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+
+from BiTemporal import DEPT_ID
+
+# Stored value of dbo.fn_infinity() in the SQLite database
+INFINITY = "9999-12-31 23:59:59.999999"
+SQLITE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+DEPT_NAMES = ["Sales", "Marketing", "Finance", "Engineering", "Operations", "Support", "Legal", "Research"]
+LOCATIONS = ["London", "New York", "Sydney", "Toronto", "Berlin", "Singapore", None]
+FIRST_NAMES = ["Alice", "Bob", "Carol", "David", "Erin", "Frank", "Grace", "Heidi", "Ivan", "Judy"]
+LAST_NAMES = ["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Johnson", "Davies", "Robinson", "Wright"]
+JOB_TITLES = ["Sales Rep", "Lead Sales Rep", "Account Manager", "Analyst", "Engineer", "Team Lead", "Director"]
+
+# Live and archive tables share a layout, as on the servers
+DEPARTMENT_DDL = """
+    CREATE TABLE dbo.{table} (
+        dept_hist_id INTEGER PRIMARY KEY,
+        dept_id      INTEGER NOT NULL,
+        dept_name    TEXT NOT NULL,
+        location     TEXT,
+        valid_from   TEXT NOT NULL,
+        valid_to     TEXT NOT NULL,
+        tran_from    TEXT NOT NULL,
+        tran_to      TEXT NOT NULL
+    )
+    """
+
+EMPLOYEE_DDL = """
+    CREATE TABLE dbo.{table} (
+        emp_hist_id  INTEGER PRIMARY KEY,
+        emp_id       INTEGER NOT NULL,
+        dept_id      INTEGER NOT NULL,
+        first_name   TEXT NOT NULL,
+        last_name    TEXT NOT NULL,
+        job_title    TEXT,
+        hire_date    TEXT,
+        term_date    TEXT,
+        valid_from   TEXT NOT NULL,
+        valid_to     TEXT NOT NULL,
+        tran_from    TEXT NOT NULL,
+        tran_to      TEXT NOT NULL
+    )
+    """
+
+# Views resolve unqualified names in their own (attached) schema
+VIEW_DDL = [
+    "CREATE VIEW dbo.department_history AS SELECT * FROM department UNION ALL SELECT * FROM department_archive",
+    "CREATE VIEW dbo.employee_history AS SELECT * FROM employee UNION ALL SELECT * FROM employee_archive",
+]
+
+INDEX_DDL = [
+    "CREATE INDEX dbo.ix_department_dept_id ON department (dept_id, dept_hist_id)",
+    "CREATE INDEX dbo.ix_employee_dept_id ON employee (dept_id, emp_hist_id)",
+    "CREATE INDEX dbo.ix_employee_emp_id ON employee (emp_id, emp_hist_id)",
+]
+
+# --- History generation ---
+def versions_per_entity(corrections):
+    """Expected rows per entity: the original version plus a backfill and a new version per correction"""
+    return 1 + 2 * corrections
+
+def simulate(count, corrections, retro_ratio, open_ratio, rng, start, end):
+    """Replay the update trigger's backfill/close/insert for count entities
+
+    Returns (entity, version, valid_from, valid_to, tran_from, tran_to) arrays as int64 nanoseconds
+    with -1 marking infinity. Each correction is recorded at a later transaction time; a retroactive one
+    takes effect somewhere in the entity's past, otherwise it takes effect when recorded.
+    """
+    start_ns, end_ns = pd.Timestamp(start).value, pd.Timestamp(end).value
+    span = end_ns - start_ns
+    rows = []
+    for entity in range(count):
+        t = start_ns + int(rng.integers(0, span // 2))
+        first = t - int(rng.integers(0, 365)) * 86_400_000_000_000
+        last = -1 if rng.random() < open_ratio else end_ns + int(rng.integers(0, 3 * 365)) * 86_400_000_000_000
+
+        # Current versions only; closed ones go straight to rows
+        current = [[0, first, last, t]]  # version, valid_from, valid_to, tran_from
+        version = 0
+        gap = (end_ns - t) // (corrections + 1)
+        for _ in range(corrections):
+            t += int(rng.integers(1, max(2, gap)))
+            if rng.random() < retro_ratio:
+                effective = first + int(rng.integers(0, max(1, t - first)))
+            else:
+                effective = max(t, current[-1][1] + 1)
+            affected = next((c for c in current if c[1] <= effective and (c[2] == -1 or effective < c[2])), None)
+            if affected is None:
+                continue  # effective after the final valid_to: the trigger rejects it
+            current.remove(affected)
+            rows.append((entity, affected[0], affected[1], affected[2], affected[3], t))
+            if affected[1] != effective:
+                current.append([affected[0], affected[1], effective, t])  # backfill, same attributes
+            version += 1
+            current.append([version, effective, affected[2], t])
+            current.sort(key=lambda c: c[1])
+        rows.extend((entity, c[0], c[1], c[2], c[3], -1) for c in current)
+
+    rows.sort(key=lambda r: (r[4], r[0], r[2]))  # insertion order: by transaction time
+    return tuple(np.array(col, dtype=np.int64) for col in zip(*rows)) if rows else (np.empty(0, np.int64),) * 6
+
+def to_sqlite_text(ns):
+    """Render int64 nanoseconds as SQLite datetime text, -1 -> fn_infinity()"""
+    text_values = pd.to_datetime(np.where(ns == -1, 0, ns)).strftime(SQLITE_FORMAT).to_numpy(dtype=object)
+    text_values[ns == -1] = INFINITY
+    return text_values
+
+def pick(pool, entity, version, salt):
+    """Deterministic attribute value for an (entity, version) pair"""
+    return np.asarray(pool, dtype=object)[(entity * 31 + version * salt) % len(pool)]
+
+def generate(entities=100, corrections=4, retro_ratio=0.3, open_ratio=0.8, departments=1,
+             seed=0, start="2015-01-01", end="2025-01-01"):
+    """Return synthetic (department, employee) history frames in the dbo table layout
+
+    entities employees are spread across departments (dept_id 10, 20, ...); every department and
+    employee receives corrections changes, retro_ratio of them retroactive, and open_ratio of
+    entities have an open-ended valid_to.
+    """
+    rng = np.random.default_rng(seed)
+
+    entity, version, vf, vt, tf, tt = simulate(departments, corrections, retro_ratio, open_ratio, rng, start, end)
+    dept = pd.DataFrame({
+        "dept_hist_id": np.arange(1, len(entity) + 1),
+        "dept_id": DEPT_ID * (entity + 1),
+        "dept_name": pick(DEPT_NAMES, entity, version, 3),
+        "location": pick(LOCATIONS, entity, version, 5),
+        "valid_from": to_sqlite_text(vf),
+        "valid_to": to_sqlite_text(vt),
+        "tran_from": to_sqlite_text(tf),
+        "tran_to": to_sqlite_text(tt),
+    })
+
+    entity, version, vf, vt, tf, tt = simulate(entities, corrections, retro_ratio, open_ratio, rng, start, end)
+    first = pd.Series(vf).groupby(entity).transform("min").to_numpy()
+    hire = pd.to_datetime(first - 30 * 86_400_000_000_000).strftime("%Y-%m-%d").to_numpy(dtype=object)
+    emp = pd.DataFrame({
+        "emp_hist_id": np.arange(1, len(entity) + 1),
+        "emp_id": 100 + entity,
+        "dept_id": DEPT_ID * (entity % departments + 1),
+        "first_name": pick(FIRST_NAMES, entity, 0, 1),
+        "last_name": pick(LAST_NAMES, entity, version // 3, 11),
+        "job_title": pick(JOB_TITLES, entity, version, 13),
+        "hire_date": hire,
+        "term_date": None,
+        "valid_from": to_sqlite_text(vf),
+        "valid_to": to_sqlite_text(vt),
+        "tran_from": to_sqlite_text(tf),
+        "tran_to": to_sqlite_text(tt),
+    })
+    return dept, emp
+
+# --- SQLite database ---
+def connect(path):
+    """Return a SQLAlchemy engine for the synthetic database, usable by DataEngine unchanged
+
+    The file is attached as schema dbo and fn_infinity() is provided as a SQL function, so the
+    app's dbo.* queries run as written.
+    """
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def attach(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ? AS dbo", (os.path.abspath(path),))
+        dbapi_connection.create_function("fn_infinity", 0, lambda: INFINITY, deterministic=True)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def unqualify(conn, cursor, statement, parameters, context, executemany):
+        # SQLite functions are not schema-qualified
+        return statement.replace("dbo.fn_infinity()", "fn_infinity()"), parameters
+
+    return engine
+
+def load(path, dept, emp, chunksize=50_000):
+    """(Re)create the synthetic database at path and bulk-load the frames through SQLAlchemy"""
+    if os.path.exists(path):
+        os.remove(path)
+    engine = connect(path)
+    with engine.begin() as conn:
+        for table in ("department", "department_archive"):
+            conn.execute(text(DEPARTMENT_DDL.format(table=table)))
+        for table in ("employee", "employee_archive"):
+            conn.execute(text(EMPLOYEE_DDL.format(table=table)))
+        for ddl in VIEW_DDL:
+            conn.execute(text(ddl))
+        dept.to_sql("department", conn, schema="dbo", if_exists="append", index=False, chunksize=chunksize)
+        emp.to_sql("employee", conn, schema="dbo", if_exists="append", index=False, chunksize=chunksize)
+        for ddl in INDEX_DDL:
+            conn.execute(text(ddl))
+    return engine
+
+def build(path, versions, **options):
+    """Generate and load a database holding roughly versions employee history rows"""
+    corrections = options.setdefault("corrections", 4)
+    options.setdefault("entities", max(1, -(-versions // versions_per_entity(corrections))))
+    dept, emp = generate(**options)
+    return load(path, dept, emp)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic bi-temporal SQLite database")
+    parser.add_argument("path", nargs="?", default="synthetic.db")
+    parser.add_argument("--versions", type=int, default=10_000, help="approximate employee history rows")
+    parser.add_argument("--corrections", type=int, default=4, help="corrections per entity")
+    parser.add_argument("--retro-ratio", type=float, default=0.3, help="share of retroactive corrections")
+    parser.add_argument("--open-ratio", type=float, default=0.8, help="share of entities with no end date")
+    parser.add_argument("--departments", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = build(args.path, args.versions, corrections=args.corrections, retro_ratio=args.retro_ratio,
+                   open_ratio=args.open_ratio, departments=args.departments, seed=args.seed)
+    with engine.connect() as conn:
+        for table in ("department", "employee"):
+            count = conn.execute(text(f"SELECT COUNT(*) FROM dbo.{table}")).scalar()
+            print(f"{table}: {count} rows")
@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import BiTemporal as bt
+import synthetic
+
+# Small enough to brute-force: every answer below is checked against the plain range predicates
+VERSIONS = 2000
+DEPARTMENTS = 3
+PROBES = 60
+
+def full_sql(table):
+    return table.select.format(filter="1 = 1")
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("synthetic") / "synthetic.db")
+    synthetic.build(path, VERSIONS, departments=DEPARTMENTS)
+    return path
+
+@pytest.fixture(scope="module")
+def histories(database):
+    """Full department and employee history read straight from the database, without the engine's caches"""
+    engine = bt.DataEngine(synthetic.connect(database))
+    return {table: bt.ingest(engine.sql_fetch(full_sql(table))) for table in bt.HistoryTable}
+
+@pytest.fixture(scope="module")
+def points(histories):
+    """(tran_ns, valid_ns) probes on and just inside version edges, where off-by-one errors show"""
+    emp = histories[bt.HistoryTable.EMPLOYEE]
+    rng = np.random.default_rng(7)
+    rows = emp.iloc[rng.choice(len(emp), PROBES, replace=False)]
+    probes = []
+    for tran_from, tran_to, valid_from, valid_to in rows[["tran_from", "tran_to", "valid_from", "valid_to"]].itertuples(index=False):
+        probes.append((tran_from, valid_from))
+        probes.append((tran_from + 1, valid_from + 1))
+        if tran_to != bt.INFINITY_NS:
+            probes.append((tran_to, valid_from))  # tran_to is exclusive
+        if valid_to != bt.INFINITY_NS:
+            probes.append((tran_from, valid_to - 1))
+    return probes
+
+def known_at(df, tran_ns, valid_ns):
+    """The brute-force as-of predicate of fn_as_of_*"""
+    return df[(df["tran_from"] <= tran_ns) & (df["tran_to"] > tran_ns) &
+              (df["valid_from"] <= valid_ns) & (df["valid_to"] > valid_ns)]
+
+def pairs(snapshot):
+    return sorted(snapshot[["dept_hist_id", "emp_hist_id"]].astype("Int64").itertuples(index=False, name=None))
+
+def brute_as_of(histories, tran_ns, valid_ns, dept_ids):
+    dept, emp = histories[bt.HistoryTable.DEPARTMENT], histories[bt.HistoryTable.EMPLOYEE]
+    return bt.as_of_join(known_at(dept[dept["dept_id"].isin(dept_ids)], tran_ns, valid_ns),
+                         known_at(emp[emp["dept_id"].isin(dept_ids)], tran_ns, valid_ns))
+
+# --- As-of engines ---
+def test_index_matches_predicate(histories, points):
+    emp = histories[bt.HistoryTable.EMPLOYEE]
+    index = bt.BiTemporalIndex.from_frame(emp, "emp_hist_id")
+    for tran_ns, valid_ns in points:
+        assert index.lookup(tran_ns, valid_ns) == set(known_at(emp, tran_ns, valid_ns)["emp_hist_id"])
+
+def test_regions_match_predicate(histories, points):
+    regions = bt.VersionRegions(histories[bt.HistoryTable.DEPARTMENT], histories[bt.HistoryTable.EMPLOYEE])
+    dept_ids = histories[bt.HistoryTable.DEPARTMENT]["dept_id"].unique()
+    for tran_ns, valid_ns in points:
+        assert pairs(regions.evaluate(tran_ns, valid_ns)) == pairs(brute_as_of(histories, tran_ns, valid_ns, dept_ids))
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_rtree_matches_predicate(histories, points, tmp_path, indexed):
+    store = bt.RTreeStore(str(tmp_path / "rtree.db"))
+    try:
+        for table, df in histories.items():
+            store.load(table, df)
+        emp = histories[bt.HistoryTable.EMPLOYEE]
+        for tran_ns, valid_ns in points:
+            found = store.as_of(bt.HistoryTable.EMPLOYEE, tran_ns, valid_ns, indexed=indexed)
+            assert found["emp_hist_id"].tolist() == sorted(known_at(emp, tran_ns, valid_ns)["emp_hist_id"])
+
+            # A window around the probe: every version whose rectangle meets it
+            day = 86_400 * 10**9
+            view = (valid_ns - 30 * day, valid_ns + 30 * day, tran_ns - 30 * day, tran_ns + 30 * day)
+            expected = emp[(emp["valid_from"] < view[1]) & (emp["valid_to"] > view[0]) &
+                           (emp["tran_from"] < view[3]) & (emp["tran_to"] > view[2])]
+            found = store.window(bt.HistoryTable.EMPLOYEE, view, indexed=indexed)
+            assert found["emp_hist_id"].tolist() == sorted(expected["emp_hist_id"])
+            assert store.window(bt.HistoryTable.EMPLOYEE, view, indexed=indexed, count=True) == len(expected)
+    finally:
+        store.close()
+
+@pytest.mark.parametrize("rtree", [False, True])
+def test_engine_as_of_matches_predicate(database, histories, points, tmp_path, rtree):
+    engine = bt.DataEngine(synthetic.connect(database), rtree_path=str(tmp_path / "rtree.db") if rtree else None)
+    for i, (tran_ns, valid_ns) in enumerate(points):
+        dept_ids = [bt.DEPT_ID] if i % 2 else [bt.DEPT_ID, 2 * bt.DEPT_ID]
+        snapshot = engine.as_of(tran_ns, valid_ns, dept_ids)
+        assert pairs(snapshot) == pairs(brute_as_of(histories, tran_ns, valid_ns, dept_ids))
+        assert (snapshot["tran_date"] == pd.Timestamp(tran_ns)).all()
+
+# --- History transforms ---
+def test_coalesce_keeps_as_of_answers(histories, points):
+    emp = histories[bt.HistoryTable.EMPLOYEE]
+
+    # Split every other version in two along valid time; coalescing has to merge them back
+    split = emp.iloc[::2]
+    split = split[(split["valid_to"] != bt.INFINITY_NS) & (split["valid_to"] - split["valid_from"] > 1)]
+    middle = split["valid_from"] + (split["valid_to"] - split["valid_from"]) // 2
+    pieces = pd.concat([emp.drop(split.index), split.assign(valid_to=middle),
+                        split.assign(valid_from=middle, emp_hist_id=split["emp_hist_id"] + 10**9)],
+                       ignore_index=True)
+
+    merged, stats = bt.coalesce(pieces, "emp_hist_id")
+    assert stats["removed"] >= len(split)
+    values = [c for c in emp.columns if c not in ("emp_hist_id", "record_status", *bt.INTERVAL_COLUMNS)]
+    for tran_ns, valid_ns in points:
+        before = known_at(pieces, tran_ns, valid_ns)[values].astype(str).sort_values(values)
+        after = known_at(merged, tran_ns, valid_ns)[values].astype(str).sort_values(values)
+        assert before.to_numpy().tolist() == after.to_numpy().tolist()
+
+def test_history_diff_matches_slices(histories):
+    emp = histories[bt.HistoryTable.EMPLOYEE]
+    before, after = bt.point_to_ns("2018-01-01"), bt.point_to_ns("2022-01-01")
+    diff = bt.history_diff(emp, "emp_hist_id", "emp_id", before, after)
+    values = [c for c in emp.columns if c not in ("emp_hist_id", "emp_id", "record_status", *bt.INTERVAL_COLUMNS)]
+
+    by_emp = dict(tuple(emp.groupby("emp_id")))
+
+    def version(tran_ns, emp_id, valid_ns):
+        rows = known_at(by_emp[emp_id], tran_ns, valid_ns)
+        assert len(rows) <= 1
+        return None if rows.empty else rows.iloc[0]
+
+    # Every span reported is a real disagreement, by the versions it names
+    for span in diff.itertuples(index=False):
+        valid_ns = span.valid_from
+        old, new = version(before, span.emp_id, valid_ns), version(after, span.emp_id, valid_ns)
+        if span.change == "added":
+            assert old is None and new["emp_hist_id"] == span.emp_hist_id_after
+        elif span.change == "removed":
+            assert new is None and old["emp_hist_id"] == span.emp_hist_id_before
+        else:
+            assert old[values].astype(str).tolist() != new[values].astype(str).tolist()
+
+    # And every disagreement at a version's start is inside a reported span
+    covered = diff.groupby("emp_id")
+    for row in emp.sample(PROBES * 5, random_state=7).itertuples(index=False):
+        old, new = version(before, row.emp_id, row.valid_from), version(after, row.emp_id, row.valid_from)
+        same = (old is None and new is None) or (
+            old is not None and new is not None and old[values].astype(str).tolist() == new[values].astype(str).tolist())
+        if not same:
+            spans = covered.get_group(row.emp_id)
+            assert ((spans["valid_from"] <= row.valid_from) & (spans["valid_to"] > row.valid_from)).any()
+
+def test_bitemporal_join_matches_brute_force(histories):
+    dept, emp = histories[bt.HistoryTable.DEPARTMENT], histories[bt.HistoryTable.EMPLOYEE]
+    joined = bt.bitemporal_join(dept, emp)
+
+    # Every same-department pair whose rectangles overlap, clipped to the overlap
+    both = dept[["dept_id", "dept_hist_id", *bt.INTERVAL_COLUMNS]].merge(
+        emp[["dept_id", "emp_hist_id", *bt.INTERVAL_COLUMNS]], on="dept_id", suffixes=("_d", "_e"))
+    clipped = pd.DataFrame({
+        "dept_hist_id": both["dept_hist_id"],
+        "emp_hist_id": both["emp_hist_id"],
+        "valid_from": np.maximum(both["valid_from_d"], both["valid_from_e"]),
+        "valid_to": np.minimum(both["valid_to_d"], both["valid_to_e"]),
+        "tran_from": np.maximum(both["tran_from_d"], both["tran_from_e"]),
+        "tran_to": np.minimum(both["tran_to_d"], both["tran_to_e"]),
+    })
+    expected = clipped[(clipped["valid_from"] < clipped["valid_to"]) & (clipped["tran_from"] < clipped["tran_to"])]
+
+    columns = ["dept_hist_id", "emp_hist_id", *bt.INTERVAL_COLUMNS]
+    assert sorted(joined[columns].itertuples(index=False, name=None)) == \
+        sorted(expected[columns].itertuples(index=False, name=None))
+
+# --- Round trips through the engine's caches ---
+@pytest.mark.parametrize("table", list(bt.HistoryTable))
+def test_snapshot_round_trip(database, tmp_path, table):
+    sql = full_sql(table)
+    engine = bt.DataEngine(synthetic.connect(database), snapshot_dir=str(tmp_path))
+    fetched = engine.fetch_history(sql, table.key)
+
+    restarted = bt.DataEngine(synthetic.connect(database), snapshot_dir=str(tmp_path))
+    loaded = restarted.load_snapshot(sql, table.key)
+    assert loaded.dtypes.to_dict() == fetched.dtypes.to_dict()
+    assert loaded.equals(fetched)
+    # Nothing changed on the server, so the snapshot is validated, not replaced
+    assert restarted.fetch_history(sql, table.key) is loaded
+
+@pytest.mark.parametrize("preallocate", [True, False])
+@pytest.mark.parametrize("table", list(bt.HistoryTable))
+def test_stream_round_trip(database, table, preallocate):
+    sql = full_sql(table)
+    fetched = bt.DataEngine(synthetic.connect(database)).fetch_history(sql, table.key)
+    streamed = bt.DataEngine(synthetic.connect(database)).fetch_streamed(sql, preallocate=preallocate, chunk_rows=128)
+    pd.testing.assert_frame_equal(streamed, fetched)
+
+    reloaded = bt.DataEngine(synthetic.connect(database), stream=True).fetch_history(sql, table.key)
+    pd.testing.assert_frame_equal(reloaded, fetched)
+
+def test_playback_returns_changed_rows(histories):
+    _, _, y_start, y_end = bt.chart_extents(histories[bt.HistoryTable.EMPLOYEE])
+    playback = bt.Playback(y_start, y_end)
+    rng = np.random.default_rng(0)
+    before = playback.known.copy()
+    for y in rng.uniform(y_start.min() - 1, y_end.max() + 1, PROBES):
+        rows = playback.seek(y)
+        known = (y_start <= y) & (y < y_end)
+        np.testing.assert_array_equal(playback.known, known)
+        np.testing.assert_array_equal(rows, np.flatnonzero(known != before))
+        before = known
+
+def test_pipeline_matches_fetch(database, tmp_path):
+    table = bt.HistoryTable.EMPLOYEE
+    sql = full_sql(table)
+    engine = bt.DataEngine(synthetic.connect(database))
+    fetched = engine.fetch_history(sql, table.key)
+    builder, streamed = bt.pipeline(engine.stream(sql, chunk_rows=128), bt.FrameBuilder(),
+                                    bt.CsvWriter(str(tmp_path / "streamed.csv")))
+    pd.testing.assert_frame_equal(builder.frame(), fetched)
+
+    whole = bt.CsvWriter(str(tmp_path / "whole.csv"))
+    whole.add(fetched)
+    assert streamed.rows == whole.rows == len(fetched)
+    assert (tmp_path / "streamed.csv").read_bytes() == (tmp_path / "whole.csv").read_bytes()
+
+def test_incremental_fetch_matches_reload(database, tmp_path):
+    # A private copy: this test writes
+    path = str(tmp_path / "writable.db")
+    with open(database, "rb") as source, open(path, "wb") as target:
+        target.write(source.read())
+    sql, key = full_sql(bt.HistoryTable.EMPLOYEE), "emp_hist_id"
+    engine = bt.DataEngine(synthetic.connect(path))
+    cached = engine.fetch_history(sql, key)
+    assert engine.fetch_history(sql, key) is cached
+
+    # Close some open versions and record new ones, as the update trigger would
+    with engine._engine.begin() as conn:
+        conn.execute(text(f"UPDATE dbo.employee SET tran_to = '2026-01-01 00:00:00' "
+                          f"WHERE tran_to = '{synthetic.INFINITY}' AND emp_id % 7 = 0"))
+        conn.execute(text("INSERT INTO dbo.employee SELECT emp_hist_id + 100000, emp_id, dept_id, first_name, "
+                          "last_name, 'Director', hire_date, term_date, valid_from, valid_to, "
+                          "'2026-01-01 00:00:00', tran_to FROM dbo.employee WHERE emp_id % 7 = 0 AND emp_hist_id < 50"))
+    refreshed = engine.fetch_history(sql, key)
+    assert refreshed is not cached
+    pd.testing.assert_frame_equal(refreshed, bt.DataEngine(synthetic.connect(path)).fetch_history(sql, key))